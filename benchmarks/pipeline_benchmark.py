@@ -0,0 +1,343 @@
+"""Benchmark suite for the inference and fairness pipelines.
+
+Runs the hot paths on reproducible fixtures: the bundled X-rays in images/
+(or generated arrays with --synthetic-images) and seeded synthetic metadata
+and results at 1k/100k/1M rows. Each case reports the median and minimum of a
+few repeats. Results are written as JSON and compared against a stored
+baseline; cases slower than the baseline by more than the tolerance are
+reported as regressions and make the run exit with status 1.
+
+Models are built with random weights, so no downloads are needed and the
+timings only depend on the architecture.
+
+Usage:
+    python benchmarks/pipeline_benchmark.py [--sizes 1k,100k,1m] [--repeats 3] [--output results.json]
+    python benchmarks/pipeline_benchmark.py --save-baseline     # record benchmarks/baseline.json
+    python benchmarks/pipeline_benchmark.py --startup           # include startup_benchmark metrics
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+# Spellings the upload page has to normalize, roughly as they appear in public metadata files
+GENDER_SPELLINGS = ["M", "F", "Male", "Female", "male", "female", "m ", " f", "MALE", "FEMALE", "unknown", None]
+DISEASE_SPELLINGS = ["No Finding", "Effusion", "Cardiomegaly", "Atelectasis", "Pleural_Thickening", "normal",
+                     "Infiltration", "Mass", "Nodule", "none", "Pneumothorax", "Edema"]
+
+# ------------------------- FIXTURES -------------------------
+def synthetic_xray(seed, size=(1024, 1024)):
+    """Grayscale chest-X-ray-like image: two dark lung fields on a bright body, plus noise"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size[0], 0:size[1]] / np.array(size).reshape(2, 1, 1)
+    body = 0.75 - 0.35 * ((x - 0.5) ** 2 + (y - 0.55) ** 2)
+    lungs = sum(np.exp(-(((x - cx) / 0.13) ** 2 + ((y - 0.5) / 0.25) ** 2)) for cx in (0.32, 0.68))
+    pixels = np.clip(body - 0.45 * lungs + rng.normal(0, 0.03, size), 0, 1)
+    from PIL import Image
+    return Image.fromarray((pixels * 255).astype(np.uint8), mode="L")
+
+def load_images(n, synthetic=False):
+    """`n` grayscale PIL images, cycling through the bundled X-rays (or generated ones)"""
+    from PIL import Image
+
+    paths = [os.path.join(REPO_ROOT, "images", f"{i}.png") for i in range(1, 6)]
+    if synthetic or not all(os.path.exists(path) for path in paths):
+        base = [synthetic_xray(seed) for seed in range(5)]
+    else:
+        base = [Image.open(path).convert("L") for path in paths]
+    # Copies, so per-image caches keyed on the pixels see distinct objects with realistic hashing cost
+    return [base[i % len(base)].copy() for i in range(n)]
+
+def synthetic_metadata(n, seed=0):
+    """Dataset metadata with messy gender/disease spellings and ids like "00000001_000.png" """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Image Index": [f"{i:08d}_000.png" for i in range(n)],
+        "Patient Gender": rng.choice(np.array(GENDER_SPELLINGS, dtype=object), n),
+        "Finding Labels": rng.choice(np.array(DISEASE_SPELLINGS, dtype=object), n),
+        "Patient Age": rng.integers(1, 95, n),
+    })
+
+def synthetic_results(n, seed=0):
+    """Binary prediction results with a gender-dependent score shift.
+
+    Like the app's results table, "Probability" is the confidence in the shown
+    "Prediction" label (1 - score for "No Disease" rows).
+    """
+    rng = np.random.default_rng(seed)
+    gender = rng.choice(np.array(["M", "F"], dtype=object), n)
+    actual = rng.random(n) < 0.3
+    score = np.clip(0.35 + 0.3 * actual + 0.05 * (gender == "M") + rng.normal(0, 0.2, n), 0, 1)
+    predicted = score >= 0.5
+    return pd.DataFrame({
+        "Image_ID": [f"{i:08d}_000.png" for i in range(n)],
+        "Gender": gender,
+        "Actual_Binary": actual.astype(int),
+        "Prediction": np.where(predicted, "Effusion", "No Disease"),
+        "Probability": np.where(predicted, score, 1.0 - score),
+        "Predicted_Binary": predicted.astype(int),
+    })
+
+class BenchmarkSession(dict):
+    """Attribute-style dict used in place of st.session_state, which only persists inside `streamlit run`"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+# ------------------------- CASES -------------------------
+def time_case(func, repeats, setup=None):
+    """Median/min wall time of `func()` over `repeats` runs (after one untimed warm-up)"""
+    if setup is not None:
+        setup()
+    func()
+    timings = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {"median_s": statistics.median(timings), "min_s": min(timings), "repeats": repeats}
+
+def model_cases(session, model_name, images):
+    """Preprocessing and single-image vs batched prediction for one loaded model"""
+    import ml_pages
+    from embeddings import FeatureCache
+    from inference import forward_probabilities, get_preprocessing_family, preprocess_batch
+
+    model = session.models_loaded[model_name]
+    family = get_preprocessing_family(ml_pages.MODELS[model_name]["source"])
+    threshold = ml_pages.get_model_calibrated_threshold(model_name)
+    label_names = ml_pages.get_model_label_names(model_name)
+
+    def clear_features():
+        session.feature_cache = FeatureCache()
+
+    def preprocess():
+        for image in images:
+            ml_pages.preprocess_image(image, model_name)
+
+    def single():
+        for image in images:
+            ml_pages.predict_disease(image, model_name, threshold)
+
+    def batch():
+        probs = forward_probabilities(model, preprocess_batch(images, family), session.device)
+        aligned_labels, aligned = ml_pages.align_probabilities(label_names, probs)
+        ml_pages.top_labels(aligned_labels, aligned, threshold)
+
+    key, n = model_name.lower(), len(images)
+    return {
+        f"preprocess_image.{key}.{n}img": (preprocess, None),
+        f"predict_disease.single.{key}.{n}img": (single, clear_features),
+        f"predict_disease.cached.{key}.{n}img": (single, None),
+        f"predict_disease.batch.{key}.{n}img": (batch, None),
+    }
+
+def inference_cases(n_images=8, synthetic=False):
+    """Prediction cases for one TorchXRayVision and one torchvision model"""
+    import streamlit as st
+    import torch
+    import torchvision
+    import torchxrayvision as xrv
+
+    from embeddings import FeatureCache
+
+    torch.manual_seed(0)
+    session = BenchmarkSession(
+        models_loaded={"CheXpert": xrv.models.DenseNet(weights=None).eval(),
+                       "DenseNet121": torchvision.models.densenet121(num_classes=14).eval()},
+        device=torch.device("cpu"), debug_mode=False, disease_classes=["No Disease", "cardiomegaly", "effusion"],
+        feature_cache=FeatureCache(), calibrations={}, apply_calibration=False,
+    )
+    st.session_state = session
+
+    images = load_images(n_images, synthetic)
+    cases = {}
+    for model_name in ["CheXpert", "DenseNet121"]:
+        cases.update(model_cases(session, model_name, images))
+    return cases
+
+def tabular_cases(size_name, n):
+    """Fairness metrics, mitigation, label normalization and ID matching on `n` synthetic rows"""
+    import ml_pages
+    from data_pages import unify_disease_label, unify_gender_label
+    from data_profile import DemographicIndex
+    from label_alignment import LabelAlignment
+
+    metadata = synthetic_metadata(n)
+    results = synthetic_results(n)
+
+    # Uploaded batch: 1000 exact ids plus a few names that need the substring fallback
+    rng = np.random.default_rng(1)
+    uploads = list(metadata["Image Index"].to_numpy()[rng.integers(0, n, 1000)])
+    uploads += [f"scan_{name}" for name in uploads[:5]]
+    index = DemographicIndex(metadata, "Image Index", "Finding Labels", "Patient Gender", "Patient Age")
+
+    dataset_labels = pd.unique(metadata["Finding Labels"].map(unify_disease_label))
+    model_labels = ["Atelectasis", "Consolidation", "Infiltration", "Pneumothorax", "Edema", "Emphysema",
+                    "Fibrosis", "Effusion", "Pneumonia", "Pleural_Thickening", "Cardiomegaly", "Nodule", "Mass",
+                    "Hernia", "Lung Lesion", "Fracture", "Lung Opacity", "Enlarged Cardiomediastinum"]
+    probabilities = np.random.default_rng(2).random((n, len(model_labels)), dtype=np.float32)
+
+    return {
+        f"compute_fairness_metrics.{size_name}": (lambda: ml_pages.compute_fairness_metrics(
+            results, "Gender", "Actual_Binary", "Predicted_Binary", score="Probability"), None),
+        f"apply_bias_mitigation.threshold_adjustment.{size_name}": (lambda: ml_pages.apply_bias_mitigation(
+            results, "Gender", "Predicted_Binary", "Probability", method="threshold_adjustment"), None),
+        f"apply_bias_mitigation.equalized_odds.{size_name}": (lambda: ml_pages.apply_bias_mitigation(
+            results, "Gender", "Predicted_Binary", "Probability", method="equalized_odds",
+            target_col="Actual_Binary"), None),
+        f"label_normalization.gender.{size_name}": (
+            lambda: metadata["Patient Gender"].apply(unify_gender_label), None),
+        f"label_normalization.disease.{size_name}": (
+            lambda: metadata["Finding Labels"].apply(unify_disease_label), None),
+        f"label_alignment.apply.{size_name}": (
+            lambda: LabelAlignment(model_labels, dataset_labels).apply(probabilities), None),
+        f"id_matching.build_index.{size_name}": (
+            lambda: DemographicIndex(metadata, "Image Index", "Finding Labels", "Patient Gender", "Patient Age"),
+            None),
+        f"id_matching.lookup_1005.{size_name}": (lambda: index.lookup(uploads), None),
+    }
+
+def run(sizes=("1k", "100k", "1m"), repeats=3, n_images=8, synthetic_images=False, only=None, startup=False):
+    """Run the suite and return a JSON-serializable results dict"""
+    results = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "repeats": repeats,
+        },
+        "cases": {},
+    }
+
+    groups = [lambda: inference_cases(n_images, synthetic_images)]
+    groups += [lambda size_name=size_name: tabular_cases(size_name, SIZES[size_name]) for size_name in sizes]
+    for build in groups:
+        for name, (func, setup) in build().items():
+            if only and only not in name:
+                continue
+            results["cases"][name] = time_case(func, repeats, setup)
+            print(f"{name:60s} {results['cases'][name]['median_s'] * 1000:10.2f} ms", file=sys.stderr)
+
+    if startup:
+        import startup_benchmark
+        for name, value in startup_benchmark.run(reruns=repeats).items():
+            if isinstance(value, float):
+                results["cases"][f"startup.{name}"] = {"median_s": value, "min_s": value, "repeats": repeats}
+            else:
+                results["meta"][f"startup.{name}"] = value
+
+    import torch
+    results["meta"]["torch"] = torch.__version__
+    return results
+
+# ------------------------- BASELINE COMPARISON -------------------------
+def compare(results, baseline, tolerance=0.25, min_seconds=0.01):
+    """Compare median times case by case; returns a list of row dicts.
+
+    A case regresses when it is more than `tolerance` slower than the baseline.
+    Cases faster than `min_seconds` in both runs are too noisy to judge.
+    """
+    rows = []
+    for name, current in results["cases"].items():
+        previous = baseline.get("cases", {}).get(name)
+        if previous is None:
+            rows.append({"case": name, "baseline_s": None, "current_s": current["median_s"], "ratio": None,
+                         "status": "new"})
+            continue
+
+        ratio = current["median_s"] / previous["median_s"] if previous["median_s"] > 0 else float("inf")
+        if max(current["median_s"], previous["median_s"]) < min_seconds:
+            status = "ok"
+        elif ratio > 1 + tolerance:
+            status = "regression"
+        elif ratio < 1 / (1 + tolerance):
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append({"case": name, "baseline_s": previous["median_s"], "current_s": current["median_s"],
+                     "ratio": ratio, "status": status})
+    return rows
+
+def print_comparison(rows):
+    print(f"{'case':60s} {'baseline ms':>12s} {'current ms':>12s} {'ratio':>7s}  status")
+    for row in rows:
+        baseline = f"{row['baseline_s'] * 1000:12.2f}" if row["baseline_s"] is not None else f"{'-':>12s}"
+        ratio = f"{row['ratio']:7.2f}" if row["ratio"] is not None else f"{'-':>7s}"
+        print(f"{row['case']:60s} {baseline} {row['current_s'] * 1000:12.2f} {ratio}  {row['status']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1k,100k,1m", help="Comma-separated metadata sizes: " + ", ".join(SIZES))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--images", type=int, default=8, help="Images per prediction case")
+    parser.add_argument("--synthetic-images", action="store_true", help="Use generated arrays instead of images/")
+    parser.add_argument("--only", help="Run only cases whose name contains this text")
+    parser.add_argument("--startup", action="store_true", help="Also run the startup benchmark")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before a regression")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results to --baseline")
+    args = parser.parse_args()
+
+    sizes = [size.strip().lower() for size in args.sizes.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"Unknown sizes: {', '.join(unknown)}")
+
+    # Streamlit warns about the missing script context on every cached call
+    from streamlit import logger as streamlit_logger
+    streamlit_logger.set_log_level("error")
+
+    sys.path.insert(0, BENCHMARK_DIR)
+    results = run(sizes, args.repeats, args.images, args.synthetic_images, args.only, args.startup)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+        return
+    with open(args.baseline) as f:
+        rows = compare(results, json.load(f), args.tolerance)
+    print_comparison(rows)
+
+    regressions = [row["case"] for row in rows if row["status"] == "regression"]
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
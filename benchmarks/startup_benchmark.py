@@ -0,0 +1,87 @@
+"""Startup-time benchmark for the Streamlit app.
+
+Each scenario runs in a fresh Python process (so imports are really cold) and
+drives app.py through Streamlit's AppTest harness. It reports the cold start
+of a static page, the per-rerun script time of static and ML pages, the one-off
+cost of opening the first ML page, and which heavy libraries a static page
+pulled in (there should be none).
+
+Usage: python benchmarks/startup_benchmark.py [--reruns 5] [--output startup.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries a static page must not import
+HEAVY_MODULES = ["torch", "torchvision", "torchxrayvision", "sklearn", "scipy", "matplotlib"]
+
+STATIC_PAGE = "📈 Project Overview"
+DATA_PAGE = "📂 Upload Data"
+ML_PAGE = "🤖 Model Prediction"
+
+def timed_run(app_test, page=None):
+    start = time.perf_counter()
+    if page is None:
+        app_test.run()
+    else:
+        app_test.sidebar.radio[0].set_value(page).run()
+    elapsed = time.perf_counter() - start
+    if app_test.exception:
+        raise RuntimeError(f"App raised: {app_test.exception[0].value}")
+    return elapsed
+
+def measure(reruns):
+    """Run all scenarios in this process; must be called in a fresh interpreter"""
+    sys.path.insert(0, REPO_ROOT)
+    from streamlit.testing.v1 import AppTest
+
+    # AppTest itself imports some libraries (e.g. matplotlib); only count what the app adds
+    preloaded = set(sys.modules)
+
+    app_test = AppTest.from_file(os.path.join(REPO_ROOT, "app.py"), default_timeout=600)
+    results = {"cold_start_s": timed_run(app_test)}
+    results["rerun_static_s"] = statistics.median(timed_run(app_test, STATIC_PAGE) for _ in range(reruns))
+    results["rerun_data_s"] = statistics.median(timed_run(app_test, DATA_PAGE) for _ in range(reruns))
+    results["heavy_modules_before_ml"] = [name for name in HEAVY_MODULES
+                                          if name in sys.modules and name not in preloaded]
+
+    results["first_ml_page_s"] = timed_run(app_test, ML_PAGE)
+    results["rerun_ml_s"] = statistics.median(timed_run(app_test, ML_PAGE) for _ in range(reruns))
+    results["rerun_static_after_ml_s"] = statistics.median(timed_run(app_test, STATIC_PAGE) for _ in range(reruns))
+    return results
+
+def run(reruns=5):
+    """Measure in a child interpreter and return the results dict"""
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", "--reruns", str(reruns)],
+        capture_output=True, text=True, cwd=REPO_ROOT, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.reruns)))
+        return
+
+    results = run(args.reruns)
+    for name, value in results.items():
+        print(f"{name:28s} {value:.4f}" if isinstance(value, float) else f"{name:28s} {value}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
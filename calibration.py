@@ -0,0 +1,249 @@
+"""Per-group probability calibration: isotonic (PAV), Platt and temperature scaling.
+
+Calibrators are fitted per (model, pathology, gender) from labeled results,
+persisted as JSON and applied column-wise to whole probability matrices.
+"""
+
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+CALIBRATION_METHODS = ["isotonic", "platt", "temperature"]
+
+# Group key used for the calibrator pooled over all genders
+POOLED_GROUP = "All"
+
+EPS = 1e-6
+
+def logit(p):
+    p = np.clip(np.asarray(p, dtype=np.float64), EPS, 1 - EPS)
+    return np.log(p) - np.log1p(-p)
+
+def sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+# ------------------------- FITTING -------------------------
+def fit_isotonic(scores, labels):
+    """Fit a non-decreasing step function with pool-adjacent-violators.
+
+    Tied scores are pooled first, so the PAV loop runs over unique scores.
+    Returns (x, y) knots for `np.interp`: each block contributes its lowest and
+    highest score at the block's mean label.
+    """
+    x, inverse = np.unique(np.asarray(scores, dtype=np.float64), return_inverse=True)
+    weights = np.bincount(inverse).astype(np.float64)
+    sums = np.bincount(inverse, weights=np.asarray(labels, dtype=np.float64))
+
+    # Blocks are kept as parallel stacks of (sum, weight, first index)
+    block_sum, block_weight, block_start = [], [], []
+    for i in range(len(x)):
+        block_sum.append(sums[i])
+        block_weight.append(weights[i])
+        block_start.append(i)
+        while len(block_sum) > 1 and block_sum[-2] / block_weight[-2] >= block_sum[-1] / block_weight[-1]:
+            merged_sum, merged_weight = block_sum.pop(), block_weight.pop()
+            block_sum[-1] += merged_sum
+            block_weight[-1] += merged_weight
+            block_start.pop()
+
+    starts = np.asarray(block_start)
+    ends = np.append(starts[1:], len(x)) - 1
+    means = np.asarray(block_sum) / np.asarray(block_weight)
+    knots_x = np.column_stack([x[starts], x[ends]]).ravel()
+    knots_y = np.repeat(means, 2)
+    return knots_x, knots_y
+
+def fit_platt(scores, labels, n_iter=50):
+    """Fit p = sigmoid(a * logit(score) + b) by Newton's method with Platt's smoothed targets"""
+    z = logit(scores)
+    y = np.asarray(labels, dtype=np.float64)
+    n_pos, n_neg = y.sum(), len(y) - y.sum()
+    targets = np.where(y > 0, (n_pos + 1) / (n_pos + 2), 1 / (n_neg + 2))
+
+    a, b = 1.0, 0.0
+    for _ in range(n_iter):
+        p = sigmoid(a * z + b)
+        w = p * (1 - p) + 1e-12
+        gradient = np.array([np.dot(p - targets, z), np.sum(p - targets)])
+        hessian = np.array([[np.dot(w, z * z), np.dot(w, z)], [np.dot(w, z), w.sum()]]) + 1e-9 * np.eye(2)
+        step = np.linalg.solve(hessian, gradient)
+        a, b = a - step[0], b - step[1]
+        if np.abs(step).max() < 1e-8:
+            break
+    return float(a), float(b)
+
+def fit_temperature(scores, labels, n_iter=50):
+    """Fit p = sigmoid(logit(score) / T) by Newton's method on 1 / T"""
+    z = logit(scores)
+    y = np.asarray(labels, dtype=np.float64)
+
+    inverse_t = 1.0
+    for _ in range(n_iter):
+        p = sigmoid(inverse_t * z)
+        gradient = np.dot(p - y, z)
+        hessian = np.dot(p * (1 - p), z * z) + 1e-12
+        inverse_t = max(inverse_t - gradient / hessian, 1e-3)
+        if abs(gradient / hessian) < 1e-8:
+            break
+    return float(1.0 / inverse_t)
+
+class Calibrator:
+    """A fitted probability map for one (model, pathology, group)"""
+
+    def __init__(self, method, params, n_samples=0):
+        self.method = method
+        self.params = params
+        self.n_samples = n_samples
+
+    @classmethod
+    def fit(cls, method, scores, labels):
+        if method == "isotonic":
+            knots_x, knots_y = fit_isotonic(scores, labels)
+            params = {"x": knots_x.tolist(), "y": knots_y.tolist()}
+        elif method == "platt":
+            a, b = fit_platt(scores, labels)
+            params = {"a": a, "b": b}
+        elif method == "temperature":
+            params = {"temperature": fit_temperature(scores, labels)}
+        else:
+            raise ValueError(f"Unknown calibration method: {method}")
+        return cls(method, params, n_samples=len(scores))
+
+    def apply(self, scores):
+        scores = np.asarray(scores, dtype=np.float64)
+        if self.method == "isotonic":
+            return np.interp(scores, self.params["x"], self.params["y"])
+        if self.method == "platt":
+            return sigmoid(self.params["a"] * logit(scores) + self.params["b"])
+        return sigmoid(logit(scores) / self.params["temperature"])
+
+    def to_dict(self):
+        return {"method": self.method, "params": self.params, "n_samples": self.n_samples}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["method"], data["params"], data.get("n_samples", 0))
+
+# ------------------------- CALIBRATOR SETS -------------------------
+class CalibrationSet:
+    """Calibrators keyed by (pathology, group) for one model, persisted as JSON"""
+
+    def __init__(self, model_name, method="isotonic"):
+        self.model_name = model_name
+        self.method = method
+        self.calibrators = {}
+
+    def __len__(self):
+        return len(self.calibrators)
+
+    def fit(self, label_names, probabilities, truth, groups, min_samples=30, min_positives=5):
+        """Fit one calibrator per (pathology, group) plus a pooled one per pathology.
+
+        Groups without enough samples or positives are skipped and fall back
+        to the pooled calibrator when the set is applied.
+        """
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        truth = np.asarray(truth, dtype=bool)
+        groups = np.asarray(groups, dtype=object)
+        self.calibrators = {}
+
+        group_masks = {POOLED_GROUP: np.ones(len(groups), dtype=bool)}
+        group_masks.update({group: groups == group for group in pd.unique(groups)})
+
+        for j, pathology in enumerate(label_names):
+            for group, mask in group_masks.items():
+                y = truth[mask, j]
+                n_positive = int(y.sum())
+                if mask.sum() < min_samples or n_positive < min_positives or n_positive == len(y):
+                    continue
+                self.calibrators[(pathology, group)] = Calibrator.fit(self.method, probabilities[mask, j], y)
+
+        logging.info(f"Fitted {len(self.calibrators)} {self.method} calibrators for {self.model_name}")
+        return self
+
+    def apply(self, label_names, probabilities, groups):
+        """Calibrate a [N, C] probability matrix column by column, per group"""
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        groups = np.asarray(groups, dtype=object)
+        calibrated = probabilities.copy()
+
+        for j, pathology in enumerate(label_names):
+            pooled = self.calibrators.get((pathology, POOLED_GROUP))
+            for group in pd.unique(groups):
+                calibrator = self.calibrators.get((pathology, group), pooled)
+                if calibrator is not None:
+                    mask = groups == group
+                    calibrated[mask, j] = calibrator.apply(probabilities[mask, j])
+        return calibrated
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.model_name}.json")
+        data = {
+            "model_name": self.model_name,
+            "method": self.method,
+            "calibrators": [
+                {"pathology": pathology, "group": group, **calibrator.to_dict()}
+                for (pathology, group), calibrator in self.calibrators.items()
+            ]
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, directory, model_name):
+        """Load a persisted calibration set, or return None if there is none"""
+        path = os.path.join(directory, f"{model_name}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        calibration = cls(data["model_name"], data["method"])
+        calibration.calibrators = {
+            (entry["pathology"], entry["group"]): Calibrator.from_dict(entry) for entry in data["calibrators"]
+        }
+        return calibration
+
+# ------------------------- RELIABILITY -------------------------
+def reliability_table(probabilities, truth, groups, n_bins=10):
+    """Binned reliability counts per group over all (row, pathology) probabilities.
+
+    Returns one row per (group, bin) with the bin's count, mean predicted
+    probability and observed positive fraction, all from bincounts.
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    truth = np.asarray(truth, dtype=np.float64)
+    groups = np.asarray(groups, dtype=object)
+    if probabilities.ndim == 2:
+        groups = np.repeat(groups, probabilities.shape[1])
+        probabilities, truth = probabilities.ravel(), truth.ravel()
+
+    group_codes, group_labels = pd.factorize(groups, sort=True)
+    bins = np.minimum((probabilities * n_bins).astype(np.int64), n_bins - 1)
+    flat = group_codes * n_bins + bins
+    size = len(group_labels) * n_bins
+
+    counts = np.bincount(flat, minlength=size)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_predicted = np.bincount(flat, weights=probabilities, minlength=size) / counts
+        fraction_positive = np.bincount(flat, weights=truth, minlength=size) / counts
+
+    return pd.DataFrame({
+        "Group": np.repeat(np.asarray(group_labels, dtype=object), n_bins),
+        "Bin": np.tile(np.arange(n_bins), len(group_labels)),
+        "Bin_Center": np.tile((np.arange(n_bins) + 0.5) / n_bins, len(group_labels)),
+        "Count": counts,
+        "Mean_Predicted": mean_predicted,
+        "Fraction_Positive": fraction_positive,
+    })
+
+def expected_calibration_error(table):
+    """ECE per group from a `reliability_table`"""
+    table = table[table["Count"] > 0]
+    gap = (table["Mean_Predicted"] - table["Fraction_Positive"]).abs() * table["Count"]
+    return gap.groupby(table["Group"]).sum() / table.groupby("Group")["Count"].sum()
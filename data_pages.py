@@ -0,0 +1,276 @@
+"""Dataset upload and exploration pages.
+
+These pages only need pandas and the charting libraries, so they render
+without importing torch; ml_pages builds on the session state set up here.
+"""
+
+import logging
+import uuid
+
+import altair as alt
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import streamlit as st
+
+from data_profile import histogram_bins, category_counts, DatasetProfile
+
+# ------------------------- SESSION STATE -------------------------
+def new_results_version():
+    """Token for one state of a session's results; unique across sessions, so it can key process-wide caches"""
+    return uuid.uuid4().hex
+
+def init_data_state():
+    """Create the dataset and results session-state entries (once per session)"""
+    if "df" not in st.session_state:
+        st.session_state.df = None
+    if "disease_col" not in st.session_state:
+        st.session_state.disease_col = None
+    if "gender_col" not in st.session_state:
+        st.session_state.gender_col = None
+    if "image_id_col" not in st.session_state:
+        st.session_state.image_id_col = None
+    if "age_col" not in st.session_state:
+        st.session_state.age_col = None
+    if "df_results" not in st.session_state:
+        st.session_state.df_results = pd.DataFrame(columns=["Image_ID", "Gender", "Actual", "Prediction", "Probability", "Model",
+                                                            "Age", "Age_Group", "Image_Hash"])
+    if "df_version" not in st.session_state:
+        st.session_state.df_version = None
+    if "results_version" not in st.session_state:
+        st.session_state.results_version = new_results_version()
+    if "disease_classes" not in st.session_state:
+        st.session_state.disease_classes = []
+
+# ------------------------- HELPERS -------------------------
+def unify_gender_label(label):
+    """Convert various gender labels to standardized format"""
+    text = str(label).strip().lower()
+    male_keywords = ["m", "male", "man", "masculin"]
+    female_keywords = ["f", "female", "woman", "femme"]
+
+    if any(kw in text for kw in male_keywords):
+        return "M"
+    if any(kw in text for kw in female_keywords):
+        return "F"
+    return "Unknown"
+
+def unify_disease_label(label):
+    """Convert various disease labels to standardized format"""
+    text = str(label).strip().lower()
+    no_disease_keywords = ["no finding", "none", "negative", "normal", "0", "false", "no disease"]
+
+    if any(kw in text for kw in no_disease_keywords):
+        return "No Disease"
+    return text
+
+@st.cache_data(max_entries=16)
+def get_dataset_profile(df_version, disease_col, gender_col, age_col, _df):
+    """Profile the dataset once per (dataset version, column selection)"""
+    return DatasetProfile(_df, disease_col, gender_col, age_col)
+
+def box_plot_figure(box_stats, outliers, group_col, value_col, title):
+    """Build a plotly box plot from precomputed per-group statistics"""
+    colors = {"F": "pink", "M": "blue", "Unknown": "gray"}
+    fig = go.Figure()
+
+    for _, row in box_stats.iterrows():
+        group = row[group_col]
+        fig.add_trace(go.Box(
+            name=str(group),
+            q1=[row["q1"]], median=[row["median"]], q3=[row["q3"]],
+            lowerfence=[row["lowerfence"]], upperfence=[row["upperfence"]], mean=[row["mean"]],
+            marker_color=colors.get(group, "gray"),
+            boxpoints=False
+        ))
+
+        group_outliers = outliers[outliers[group_col] == group]
+        if not group_outliers.empty:
+            fig.add_trace(go.Scatter(
+                x=[str(group)] * len(group_outliers), y=group_outliers[value_col],
+                mode="markers", marker_color=colors.get(group, "gray"), showlegend=False
+            ))
+
+    fig.update_layout(title=title, xaxis_title=group_col, yaxis_title=value_col)
+    return fig
+
+# ------------------------- PAGE FUNCTIONS -------------------------
+def upload_data_page():
+    st.title("📂 Upload Data")
+    uploaded_file = st.file_uploader("Upload your dataset (CSV/XLSX)", type=["csv", "xlsx"],
+                                     help="Upload a CSV or Excel file containing your data.")
+    if uploaded_file:
+        try:
+            df = pd.read_csv(uploaded_file) if uploaded_file.name.endswith(".csv") else pd.read_excel(uploaded_file)
+            # Remove duplicate columns if any
+            df = df.loc[:, ~df.columns.duplicated()]
+
+            st.session_state.df = df
+            st.write("**Preview of Uploaded Data:**")
+            st.dataframe(df.head())
+
+            # Let user select important columns
+            st.markdown("### Select Key Columns")
+            st.markdown("Please identify the columns that contain the following information:")
+
+            # Columns for identification, gender, disease, and optional age
+            st.session_state.image_id_col = st.selectbox("Image ID Column:", df.columns.tolist(),
+                                                        help="Column containing unique identifiers for each image")
+
+            st.session_state.gender_col = st.selectbox("Gender Column:", df.columns.tolist(),
+                                                      help="Column containing gender information (M/F)")
+
+            st.session_state.disease_col = st.selectbox("Disease Column:", df.columns.tolist(),
+                                                       help="Column containing disease information")
+
+            st.session_state.age_col = st.selectbox("Age Column (optional):", [None] + df.columns.tolist(),
+                                                   help="Optional column containing patient age")
+
+            # Extract and standardize gender values
+            df[st.session_state.gender_col] = df[st.session_state.gender_col].apply(unify_gender_label)
+
+            # Extract and standardize disease values
+            df[st.session_state.disease_col] = df[st.session_state.disease_col].apply(unify_disease_label)
+
+            # Extract unique disease values
+            disease_classes = df[st.session_state.disease_col].dropna().unique().tolist()
+            st.session_state.disease_classes = sorted(disease_classes)
+
+            if not disease_classes:
+                st.warning("⚠️ No diseases detected in the selected column.")
+            else:
+                st.success(f"✅ Detected {len(disease_classes)} diseases/conditions: {', '.join(st.session_state.disease_classes)}")
+
+            # Show gender distribution
+            gender_counts = df[st.session_state.gender_col].value_counts()
+            st.markdown("### Gender Distribution")
+            st.bar_chart(gender_counts)
+
+            # Save processed dataframe; the version keys every cached profile of it
+            st.session_state.df = df
+            st.session_state.df_version = f"{uploaded_file.name}:{uploaded_file.size}:{getattr(uploaded_file, 'file_id', '')}"
+
+        except Exception as e:
+            logging.error("Error loading uploaded file", exc_info=True)
+            st.error(f"Error loading file: {e}")
+    else:
+        st.info("Please upload a dataset to continue.")
+
+def explore_data_page():
+    st.title("📊 Explore Data & Prepare")
+    df = st.session_state.df
+    if df is not None:
+        st.subheader("Select Columns for Visualization")
+        selected_cols = st.multiselect("Choose one or more columns to visualize:", df.columns.tolist())
+        if selected_cols:
+            for col in selected_cols:
+                st.markdown(f"### Visualization for **{col}**")
+                if pd.api.types.is_numeric_dtype(df[col]):
+                    # Pre-bin on the server so the chart carries one row per bin, not per record
+                    bins = histogram_bins(df[col], max_bins=20)
+                    chart = alt.Chart(bins).mark_bar().encode(
+                        alt.X("bin_start:Q", bin="binned", title=col),
+                        alt.X2("bin_end:Q"),
+                        alt.Y("Count:Q", title="Count"),
+                        tooltip=["bin_start", "bin_end", "Count"]
+                    ).properties(width=600, height=400, title=f"Histogram of {col}")
+                    st.altair_chart(chart, use_container_width=True)
+                else:
+                    counts = category_counts(df[col]).reset_index()
+                    counts.columns = [col, 'Count']
+                    chart = alt.Chart(counts).mark_bar().encode(
+                        alt.X(f"{col}:N", sort='-y', title=col),
+                        alt.Y("Count:Q", title="Count"),
+                        tooltip=[col, "Count"]
+                    ).properties(width=600, height=400, title=f"Bar Chart of {col}")
+                    st.altair_chart(chart, use_container_width=True)
+        else:
+            st.info("Please select at least one column for visualization.")
+
+        # Show disease and gender relationship
+        if st.session_state.disease_col and st.session_state.gender_col:
+            disease_col = st.session_state.disease_col
+            gender_col = st.session_state.gender_col
+            age_col = st.session_state.age_col
+
+            # One profile per dataset version and column selection serves every table below
+            profile = get_dataset_profile(st.session_state.df_version, disease_col, gender_col, age_col, df)
+
+            st.markdown("### Missing Values Summary")
+            st.dataframe(profile.missing_summary())
+
+            st.markdown("### Disease and Gender Visualization")
+            selected_disease = st.selectbox("Select Disease Category:",
+                                           options=profile.diseases())
+
+            gender_counts = profile.gender_counts(selected_disease) if selected_disease is not None else pd.Series(dtype=int)
+            if gender_counts.sum() == 0:
+                st.info("No records found for the selected disease category.")
+            else:
+                # Pre-aggregated gender counts for the pie chart
+                gender_counts = gender_counts.reset_index()
+                gender_counts.columns = [gender_col, "Count"]
+
+                pie_chart = px.pie(
+                    gender_counts,
+                    names=gender_col,
+                    values="Count",
+                    title=f"Gender Distribution for {selected_disease}",
+                    color=gender_col,
+                    color_discrete_map={"F": "pink", "M": "blue", "Unknown": "gray"},
+                    hover_data=["Count"]
+                )
+
+                # Update trace to show percentage
+                pie_chart.update_traces(texttemplate='%{percent:.1%}', textposition='inside')
+                st.plotly_chart(pie_chart, use_container_width=True)
+
+                # Show age distribution if age column is available
+                if age_col:
+                    try:
+                        # Age distribution by gender for the selected disease
+                        st.markdown(f"### Age Distribution for {selected_disease} by Gender")
+
+                        # Box statistics are precomputed so only quartiles and a capped outlier sample are sent
+                        box_stats, outliers = profile.age_box(selected_disease)
+                        if box_stats.empty:
+                            st.info("No numeric age values for the selected disease category.")
+                        else:
+                            fig = box_plot_figure(box_stats, outliers, gender_col, age_col,
+                                                  f"Age Distribution for {selected_disease} by Gender")
+                            st.plotly_chart(fig, use_container_width=True)
+                    except Exception as e:
+                        st.warning(f"Could not process age data: {e}")
+
+            # Disease distribution across genders
+            st.markdown("### Disease Distribution Across Genders")
+
+            # Disease x gender counts from the profile's count cube
+            pivot_df = profile.disease_gender_counts()
+
+            # Add percentages
+            total_counts = pivot_df.sum(axis=1)
+            for col in list(pivot_df.columns):
+                pivot_df[f"{col}_pct"] = (pivot_df[col] / total_counts * 100).round(1)
+
+            # Sort by total counts
+            pivot_df = pivot_df.loc[total_counts.sort_values(ascending=False).index]
+
+            # Display the table
+            st.dataframe(pivot_df)
+
+            # Visualize disease distribution
+            disease_counts = profile.disease_counts().head(10)
+            st.markdown("### Top 10 Diseases/Conditions")
+            st.bar_chart(disease_counts)
+
+        else:
+            st.markdown("### Missing Values Summary")
+            missing = df.isnull().sum().reset_index()
+            missing.columns = ['Column', 'Missing Values']
+            missing['Percentage'] = (missing['Missing Values'] / len(df) * 100).round(2)
+            st.dataframe(missing.sort_values('Missing Values', ascending=False))
+
+            st.info("Please select disease and gender columns in the Upload Data page.")
+    else:
+        st.info("No data uploaded. Please use the Upload Data page.")
@@ -0,0 +1,217 @@
+"""Dataset profiling helpers: server-side aggregation for the data exploration charts."""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# Categorical bar charts show at most this many categories; the rest are folded into "Other"
+MAX_CATEGORIES = 50
+
+def histogram_bins(values, max_bins=20):
+    """Pre-bin a numeric column with NumPy so charts only receive one row per bin"""
+    values = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if values.size == 0:
+        return pd.DataFrame(columns=["bin_start", "bin_end", "Count"])
+
+    counts, edges = np.histogram(values, bins=max_bins)
+    return pd.DataFrame({"bin_start": edges[:-1], "bin_end": edges[1:], "Count": counts})
+
+def category_counts(values, max_categories=MAX_CATEGORIES):
+    """Value counts limited to the most frequent categories plus an "Other" bucket"""
+    counts = pd.Series(values).value_counts()
+    if len(counts) > max_categories:
+        other = counts.iloc[max_categories:].sum()
+        counts = pd.concat([counts.iloc[:max_categories], pd.Series({"Other": other})])
+    return counts
+
+def box_plot_stats(df, group_col, value_col, max_outliers=100, seed=0):
+    """Precompute Tukey box-plot statistics per group.
+
+    `group_col` may be a column name or a list of column names. Returns
+    (stats, outliers): one row of quartiles/fences per group and at most
+    `max_outliers` sampled outlier points per group, so the chart payload does
+    not grow with the number of rows.
+    """
+    group_cols = [group_col] if isinstance(group_col, str) else list(group_col)
+    data = df[group_cols].copy()
+    data["value"] = pd.to_numeric(df[value_col], errors="coerce")
+    data = data.dropna()
+    if data.empty:
+        return pd.DataFrame(), pd.DataFrame(columns=group_cols + [value_col])
+
+    grouped = data.groupby(group_cols, observed=True)["value"]
+    stats = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    stats.columns = ["q1", "median", "q3"]
+    stats["mean"] = grouped.mean()
+    stats["n"] = grouped.size()
+    stats["min"] = grouped.min()
+    stats["max"] = grouped.max()
+
+    iqr = stats["q3"] - stats["q1"]
+    limits = pd.DataFrame({"low_limit": stats["q1"] - 1.5 * iqr, "high_limit": stats["q3"] + 1.5 * iqr})
+
+    # Whiskers end at the most extreme data points inside the Tukey limits
+    data = data.join(limits, on=group_cols)
+    inside = data[(data["value"] >= data["low_limit"]) & (data["value"] <= data["high_limit"])]
+    stats["lowerfence"] = inside.groupby(group_cols, observed=True)["value"].min()
+    stats["upperfence"] = inside.groupby(group_cols, observed=True)["value"].max()
+
+    outliers = data[(data["value"] < data["low_limit"]) | (data["value"] > data["high_limit"])]
+    if len(outliers):
+        # Shuffle once, then keep the first `max_outliers` rows of each group
+        outliers = outliers.sample(frac=1, random_state=seed).groupby(group_cols, observed=True).head(max_outliers)
+    outliers = outliers[group_cols + ["value"]].rename(columns={"value": value_col})
+
+    return stats.reset_index(), outliers
+
+# ------------------------- DATASET PROFILE -------------------------
+AGE_BINS = [0, 18, 40, 60, 80, 120]
+AGE_LABELS = ["0-18", "19-40", "41-60", "61-80", "81+"]
+
+AGE_GROUP_DTYPE = pd.CategoricalDtype(AGE_LABELS, ordered=True)
+
+def age_groups(ages):
+    """Bin ages into the app's standard age groups (categorical)"""
+    # include_lowest keeps age 0 (infants) in the first group
+    return pd.cut(pd.to_numeric(pd.Series(ages), errors="coerce"), bins=AGE_BINS, labels=AGE_LABELS, include_lowest=True)
+
+class DatasetProfile:
+    """Counts computed in one scan of the dataset for a given column selection.
+
+    Holds the disease x gender x age-group count cube, null counts and
+    cardinalities, so pages can answer their tables from the profile instead
+    of rescanning the full dataframe on every rerun.
+    """
+
+    def __init__(self, df, disease_col, gender_col, age_col=None):
+        self.n_rows = len(df)
+        self.disease_col = disease_col
+        self.gender_col = gender_col
+        self.age_col = age_col
+
+        self.null_counts = df.isnull().sum()
+        self.cardinalities = df.nunique(dropna=True)
+
+        keys = {
+            "Disease": df[disease_col].astype("object").fillna("Unknown"),
+            "Gender": df[gender_col].astype("object").fillna("Unknown"),
+        }
+        if age_col:
+            keys["Age_Group"] = age_groups(df[age_col]).cat.add_categories("Unknown").fillna("Unknown")
+        else:
+            keys["Age_Group"] = pd.Series("Unknown", index=df.index)
+
+        self.cube = pd.DataFrame(keys).groupby(["Disease", "Gender", "Age_Group"], observed=True).size()
+
+        # Age box-plot statistics for every (disease, gender) pair
+        self.age_box_stats, self.age_outliers = None, None
+        if age_col:
+            self.age_box_stats, self.age_outliers = box_plot_stats(df, [disease_col, gender_col], age_col)
+
+    def missing_summary(self):
+        """Missing values per column with percentages"""
+        missing = self.null_counts.reset_index()
+        missing.columns = ['Column', 'Missing Values']
+        missing['Percentage'] = (missing['Missing Values'] / max(self.n_rows, 1) * 100).round(2)
+        return missing.sort_values('Missing Values', ascending=False)
+
+    def disease_gender_counts(self):
+        """Disease x gender count table"""
+        return self.cube.groupby(level=["Disease", "Gender"], observed=True).sum().unstack(fill_value=0)
+
+    def gender_counts(self, disease=None):
+        """Gender counts, optionally for a single disease"""
+        cube = self.cube if disease is None else self.cube.xs(disease, level="Disease")
+        return cube.groupby(level="Gender", observed=True).sum().sort_values(ascending=False)
+
+    def disease_counts(self):
+        """Disease counts in descending order"""
+        return self.cube.groupby(level="Disease", observed=True).sum().sort_values(ascending=False)
+
+    def age_box(self, disease):
+        """Age box-plot statistics and outliers by gender for one disease"""
+        if self.age_box_stats is None or self.age_box_stats.empty:
+            return pd.DataFrame(), pd.DataFrame()
+        stats = self.age_box_stats[self.age_box_stats[self.disease_col] == disease]
+        outliers = self.age_outliers[self.age_outliers[self.disease_col] == disease]
+        return stats.drop(columns=self.disease_col), outliers.drop(columns=self.disease_col)
+
+    def diseases(self):
+        """Sorted disease categories present in the dataset"""
+        return sorted(self.cube.index.get_level_values("Disease").unique())
+
+# ------------------------- DEMOGRAPHIC JOIN INDEX -------------------------
+def normalize_image_key(values):
+    """Normalize image ids/file names to a join key: basename, no extension, lower case"""
+    keys = pd.Series(values, dtype="object").astype(str).str.strip().str.lower()
+    keys = keys.str.replace("\\", "/", regex=False).str.rsplit("/", n=1).str[-1]
+    return keys.str.replace(r"\.(png|jpe?g|dcm|tiff?|bmp)$", "", regex=True)
+
+# Image names that are not an exact id may match an id cut at one of these delimiters
+KEY_DELIMITERS = re.compile(r"[_\-\s.]")
+
+class DemographicIndex:
+    """Join index from normalized image key to the dataset's label and demographics.
+
+    Built once per dataset version and column selection; `lookup` attaches
+    Actual, Gender, Age and a pre-binned Age_Group to any batch of image names
+    with a single hash join instead of a merge per page render.
+    """
+
+    def __init__(self, df, id_col, disease_col, gender_col, age_col=None):
+        self.keys = normalize_image_key(df[id_col]).to_numpy()
+
+        table = pd.DataFrame({
+            "Actual": df[disease_col].astype("object").fillna("Unknown").to_numpy() if disease_col else "Unknown",
+            "Gender": df[gender_col].astype("object").fillna("Unknown").to_numpy() if gender_col else "Unknown",
+            "Age": pd.to_numeric(df[age_col], errors="coerce").to_numpy() if age_col else np.nan,
+        }, index=pd.Index(self.keys, name="key"))
+        table["Age_Group"] = pd.Categorical(age_groups(table["Age"].to_numpy()), dtype=AGE_GROUP_DTYPE)
+
+        # Duplicate ids keep their first row, like the old first-match lookup
+        self.table = table[~table.index.duplicated(keep="first")]
+        self._partials = None
+
+    def __len__(self):
+        return len(self.table)
+
+    def partial_keys(self):
+        """Map every delimiter-aligned prefix and suffix of an id to that id (None when several ids share it)"""
+        if self._partials is None:
+            partials = {}
+            for key in self.table.index:
+                for cut in KEY_DELIMITERS.finditer(key):
+                    for part in (key[:cut.start()], key[cut.end():]):
+                        if part:
+                            partials[part] = key if partials.get(part, key) == key else None
+            self._partials = partials
+        return self._partials
+
+    def lookup(self, image_names):
+        """Return Actual/Gender/Age/Age_Group rows aligned with `image_names`"""
+        keys = normalize_image_key(image_names)
+        matched = keys.where(keys.isin(self.table.index))
+
+        # Other names only match an id they are an unambiguous prefix or suffix of; the rest stay Unknown
+        misses = (matched.isna() & (keys != "")).to_numpy()
+        if misses.any():
+            matched[misses] = keys[misses].map(self.partial_keys())
+
+        rows = self.table.reindex(matched.to_numpy()).reset_index(drop=True)
+        rows[["Actual", "Gender"]] = rows[["Actual", "Gender"]].fillna("Unknown")
+        return rows
+
+# ------------------------- RESULTS PROFILE -------------------------
+def error_type_counts(df_results):
+    """Gender x error-type counts for binarized predictions (one scan of the results)"""
+    binary_actual = df_results["Actual"] != "No Disease"
+    binary_prediction = df_results["Prediction"] != "No Disease"
+
+    error_type = np.select(
+        [binary_actual & ~binary_prediction, ~binary_actual & binary_prediction],
+        ["False Negative", "False Positive"],
+        default="Correct"
+    )
+    return pd.crosstab(df_results["Gender"], pd.Series(error_type, index=df_results.index, name="Error_Type"))
@@ -0,0 +1,425 @@
+"""Pooled backbone features and a per-image embedding cache.
+
+Every model in the app is a convolutional trunk followed by a single linear
+head, so caching the pooled trunk features per (image, model) lets us re-score,
+refit calibrations or train linear probes without running the trunk again.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torchxrayvision.models import op_norm
+
+from inference import get_preprocessing_family, image_hash, preprocess_batch
+from instrumentation import span
+
+def extract_feature_maps(model, tensor_batch):
+    """Return the last convolutional block's feature maps for a batch ([N, D, h, w] tensor)"""
+    # DenseNet (TorchXRayVision and torchvision): dense blocks ending in norm5
+    if hasattr(model, "features"):
+        return model.features(tensor_batch)
+
+    # torchvision ResNet50: stem -> residual stages
+    x = model.maxpool(model.relu(model.bn1(model.conv1(tensor_batch))))
+    return model.layer4(model.layer3(model.layer2(model.layer1(x))))
+
+def pool_feature_maps(feature_maps):
+    """ReLU + global average pool feature maps into pooled features ([N, D] tensor)"""
+    # ResNet blocks already end in a ReLU, so this matches both architectures
+    return torch.flatten(F.adaptive_avg_pool2d(F.relu(feature_maps), (1, 1)), 1)
+
+def extract_pooled_features(model, tensor_batch):
+    """Return the pooled penultimate features for a batch ([N, D] tensor)"""
+    return pool_feature_maps(extract_feature_maps(model, tensor_batch))
+
+def get_classifier_head(model):
+    """Return the final nn.Linear of a model"""
+    return model.fc if hasattr(model, "fc") else model.classifier
+
+def head_fingerprint(model):
+    """Short content hash of a model's classifier head weights"""
+    digest = hashlib.sha1()
+    for name, tensor in get_classifier_head(model).state_dict().items():
+        digest.update(name.encode())
+        digest.update(tensor.detach().cpu().numpy().tobytes())
+    return digest.hexdigest()[:12]
+
+# Trunk hashes are memoized per model object; a reloaded model is hashed again
+_TRUNK_FINGERPRINTS = weakref.WeakKeyDictionary()
+
+def trunk_fingerprint(model):
+    """Short content hash of a model's weights outside the classifier head"""
+    fingerprint = _TRUNK_FINGERPRINTS.get(model)
+    if fingerprint is None:
+        head_tensors = {tensor.data_ptr() for tensor in get_classifier_head(model).state_dict().values()}
+        digest = hashlib.sha1()
+        for name, tensor in model.state_dict().items():
+            if tensor.data_ptr() not in head_tensors:
+                digest.update(name.encode())
+                digest.update(tensor.detach().cpu().numpy().tobytes())
+        fingerprint = _TRUNK_FINGERPRINTS[model] = digest.hexdigest()[:12]
+    return fingerprint
+
+def feature_cache_key(model_name, model):
+    """FeatureCache model key: pooled features depend on the trunk weights, not on the head"""
+    return f"{model_name}@{trunk_fingerprint(model)}"
+
+def head_forward(model, features):
+    """Apply a model's head to pooled features, matching model(x) exactly"""
+    out = get_classifier_head(model)(features)
+
+    # TorchXRayVision models calibrate their outputs with operating-point thresholds
+    if getattr(model, "op_threshs", None) is not None:
+        out = op_norm(torch.sigmoid(out), model.op_threshs)
+    elif getattr(model, "apply_sigmoid", False):
+        out = torch.sigmoid(out)
+    return out
+
+def probabilities_from_features(model, features, device):
+    """Score cached features with a model head and return sigmoid probabilities ([N, C] array)"""
+    with torch.no_grad():
+        features = torch.as_tensor(np.asarray(features, dtype=np.float32), device=device)
+        return torch.sigmoid(head_forward(model, features)).cpu().numpy()
+
+def train_linear_head(head, features, targets, sample_weights=None, epochs=200, lr=1e-2, weight_decay=1e-4,
+                      device="cpu"):
+    """Fine-tune a copy of an nn.Linear head on cached pooled features.
+
+    Uses full-batch Adam on a weighted multi-label BCE loss; no backbone passes
+    are needed, so a head retrains in seconds on CPU. Returns (head, losses).
+    """
+    head = copy.deepcopy(head).to(device).train()
+    x = torch.as_tensor(np.asarray(features, dtype=np.float32), device=device)
+    y = torch.as_tensor(np.asarray(targets, dtype=np.float32), device=device)
+    if sample_weights is None:
+        w = torch.ones(len(x), device=device)
+    else:
+        w = torch.as_tensor(np.asarray(sample_weights, dtype=np.float32), device=device)
+    w = w / w.mean()
+
+    optimizer = torch.optim.Adam(head.parameters(), lr=lr, weight_decay=weight_decay)
+    losses = []
+    for _ in range(epochs):
+        optimizer.zero_grad()
+        loss = (F.binary_cross_entropy_with_logits(head(x), y, reduction="none").mean(dim=1) * w).mean()
+        loss.backward()
+        optimizer.step()
+        losses.append(loss.item())
+
+    return head.eval(), losses
+
+class FeatureCache:
+    """LRU cache of pooled features keyed by (image hash, feature_cache_key of the model).
+
+    Ensemble members read and fill the cache from worker threads, so every
+    access to the underlying OrderedDict holds a lock.
+    """
+
+    def __init__(self, max_entries=20000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            return sum(features.nbytes for features in self._entries.values())
+
+    def get(self, key_hash, model_name):
+        key = (key_hash, model_name)
+        with self._lock:
+            features = self._entries.get(key)
+            if features is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return features
+
+    def put(self, key_hash, model_name, features):
+        key = (key_hash, model_name)
+        features = np.asarray(features, dtype=np.float32)
+        with self._lock:
+            self._entries[key] = features
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self, model_name=None):
+        with self._lock:
+            if model_name is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[1] == model_name]:
+                    del self._entries[key]
+
+    def items(self, model_name):
+        """Yield (image hash, features) pairs cached for one model"""
+        with self._lock:
+            entries = [(key_hash, features) for (key_hash, name), features in self._entries.items() if name == model_name]
+        yield from entries
+
+def get_features(images, model_name, model, source, device, cache, hashes=None, tensor_batch=None, batch_size=16):
+    """Return pooled features for images, running the trunk only for cache misses.
+
+    `tensor_batch` may hold the already preprocessed images (e.g. shared across
+    an ensemble) so misses do not need to be preprocessed again.
+    """
+    if hashes is None:
+        hashes = [image_hash(image) for image in images]
+
+    cache_key = feature_cache_key(model_name, model)
+    cached = [cache.get(key_hash, cache_key) for key_hash in hashes]
+    missing = [i for i, features in enumerate(cached) if features is None]
+
+    if missing:
+        if tensor_batch is None:
+            tensor_batch = preprocess_batch([images[i] for i in missing], get_preprocessing_family(source))
+        else:
+            tensor_batch = tensor_batch[missing]
+
+        with torch.no_grad(), span("model_forward.trunk"):
+            for start in range(0, len(missing), batch_size):
+                chunk = tensor_batch[start:start + batch_size].to(device)
+                features = extract_pooled_features(model, chunk).cpu().numpy()
+                for offset, row in enumerate(features):
+                    i = missing[start + offset]
+                    cache.put(hashes[i], cache_key, row)
+                    cached[i] = row
+
+        logging.info(f"Extracted {len(missing)} new feature vectors for {model_name} ({len(images) - len(missing)} cached)")
+
+    return np.stack(cached, axis=0)
+
+# ------------------------- PERSISTENT EMBEDDING STORE -------------------------
+class EmbeddingStore:
+    """Append-only, memory-mapped float16 embedding matrix with nearest-neighbour search.
+
+    Vectors are L2-normalised on insert so the dot product is the cosine
+    similarity. Small stores are searched brute force; larger ones can build an
+    inverted-file (IVF) index of k-means lists and only scan the closest lists.
+    """
+
+    dtype = np.float16
+    vectors_file = "vectors.f16"
+    normalize = True
+
+    def __init__(self, path, dim=None, initial_capacity=1024):
+        self.path = path
+        self._lock = threading.Lock()
+
+        self._vectors_path = os.path.join(path, self.vectors_file)
+        self._meta_path = os.path.join(path, "meta.json")
+        self._ivf_path = os.path.join(path, "ivf.npz")
+
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+            if dim is not None and meta["dim"] != dim:
+                raise ValueError(f"Embedding store at {path} has dim {meta['dim']}, expected {dim}")
+            self.meta = meta
+        elif dim is None:
+            raise FileNotFoundError(f"No embedding store at {path}")
+        else:
+            self.meta = {"dim": dim, "count": 0, "image_id": [], "gender": [], "hash": [], "label": []}
+
+        self.dim = self.meta["dim"]
+        self.meta.setdefault("label", [""] * self.meta["count"])
+        os.makedirs(path, exist_ok=True)
+
+        capacity = max(initial_capacity, self.meta["count"])
+        if not os.path.exists(self._vectors_path):
+            self._resize_file(capacity)
+        self._open_vectors()
+
+        self._hash_index = {key_hash: i for i, key_hash in enumerate(self.meta["hash"])}
+        self.centroids = None
+        self.assignments = None
+        if os.path.exists(self._ivf_path):
+            ivf = np.load(self._ivf_path)
+            self.centroids = ivf["centroids"]
+            self.assignments = ivf["assignments"]
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def _resize_file(self, capacity):
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(capacity * self.dim * np.dtype(self.dtype).itemsize)
+
+    def _open_vectors(self):
+        capacity = os.path.getsize(self._vectors_path) // (self.dim * np.dtype(self.dtype).itemsize)
+        self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+
+    def _save_meta(self):
+        tmp_path = self._meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def _save_ivf(self):
+        np.savez(self._ivf_path, centroids=self.centroids, assignments=self.assignments)
+
+    @property
+    def vectors(self):
+        """Read-only view of the stored vectors"""
+        return self._vectors[:self.meta["count"]]
+
+    def contains(self, key_hash):
+        return key_hash in self._hash_index
+
+    def add(self, features, image_ids, genders, hashes, labels=None):
+        """Append feature vectors, skipping images that are already stored"""
+        features = np.asarray(features, dtype=np.float32)
+        with self._lock:
+            keep = []
+            seen = set()
+            for i, key_hash in enumerate(hashes):
+                if key_hash not in self._hash_index and key_hash not in seen:
+                    keep.append(i)
+                    seen.add(key_hash)
+            if not keep:
+                return 0
+
+            new = features[keep]
+            if self.normalize:
+                new /= np.linalg.norm(new, axis=1, keepdims=True) + 1e-12
+
+            start = self.meta["count"]
+            end = start + len(keep)
+            if end > self._vectors.shape[0]:
+                # Grow geometrically so appends stay amortised O(1)
+                capacity = self._vectors.shape[0]
+                self._vectors.flush()
+                del self._vectors
+                self._resize_file(max(end, 2 * capacity))
+                self._open_vectors()
+
+            self._vectors[start:end] = new.astype(self.dtype)
+            self._vectors.flush()
+
+            for i in keep:
+                self._hash_index[hashes[i]] = len(self.meta["hash"])
+                self.meta["image_id"].append(str(image_ids[i]))
+                self.meta["gender"].append(str(genders[i]))
+                self.meta["hash"].append(hashes[i])
+                self.meta["label"].append("" if labels is None else str(labels[i]))
+            self.meta["count"] = end
+            self._save_meta()
+
+            # Keep an existing IVF index current by assigning new vectors to their nearest list
+            if self.centroids is not None:
+                new_assignments = np.argmax(new @ self.centroids.T, axis=1).astype(np.int32)
+                self.assignments = np.concatenate([self.assignments, new_assignments])
+                self._save_ivf()
+
+            return len(keep)
+
+    def build_ivf(self, n_lists=None, n_iter=10, sample_size=50000, seed=0):
+        """Cluster the stored vectors into IVF lists with spherical k-means"""
+        with self._lock:
+            count = self.meta["count"]
+            if count == 0:
+                return
+            n_lists = n_lists or max(1, int(np.sqrt(count)))
+            rng = np.random.default_rng(seed)
+
+            sample_idx = rng.choice(count, size=min(count, sample_size), replace=False)
+            sample = np.asarray(self.vectors[np.sort(sample_idx)], dtype=np.float32)
+            centroids = sample[rng.choice(len(sample), size=min(n_lists, len(sample)), replace=False)]
+
+            for _ in range(n_iter):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                for c in range(len(centroids)):
+                    members = sample[labels == c]
+                    if len(members):
+                        centroid = members.sum(axis=0)
+                        centroids[c] = centroid / (np.linalg.norm(centroid) + 1e-12)
+
+            self.centroids = centroids
+            self.assignments = np.concatenate([
+                np.argmax(np.asarray(self.vectors[start:start + 65536], dtype=np.float32) @ centroids.T, axis=1)
+                for start in range(0, count, 65536)
+            ]).astype(np.int32)
+            self._save_ivf()
+            logging.info(f"Built IVF index with {len(centroids)} lists over {count} embeddings")
+
+    def search(self, query, k=5, mask=None, nprobe=8, use_ivf=None):
+        """Return (indices, similarities) of the k stored vectors most similar to `query`"""
+        count = self.meta["count"]
+        if count == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+        query = np.asarray(query, dtype=np.float32).ravel()
+        query = query / (np.linalg.norm(query) + 1e-12)
+
+        if use_ivf is None:
+            use_ivf = self.centroids is not None and count >= 20000
+
+        if use_ivf and self.centroids is not None:
+            lists = np.argsort(-(self.centroids @ query))[:nprobe]
+            candidates = np.flatnonzero(np.isin(self.assignments, lists))
+        else:
+            candidates = np.arange(count)
+
+        if mask is not None:
+            candidates = candidates[np.asarray(mask, dtype=bool)[candidates]]
+        if len(candidates) == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+        # Scan in chunks so float16 -> float32 conversion stays bounded in memory
+        sims = np.empty(len(candidates), dtype=np.float32)
+        for start in range(0, len(candidates), 65536):
+            idx = candidates[start:start + 65536]
+            sims[start:start + len(idx)] = np.asarray(self._vectors[idx], dtype=np.float32) @ query
+
+        k = min(k, len(candidates))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return candidates[top], sims[top]
+
+    def similar_by_gender(self, index, k=5, genders=("F", "M")):
+        """Return the k most similar stored studies per gender to stored row `index`"""
+        query = np.asarray(self._vectors[index], dtype=np.float32)
+        stored_genders = np.asarray(self.meta["gender"])
+        results = {}
+        for gender in genders:
+            mask = stored_genders == gender
+            mask[index] = False
+            results[gender] = self.search(query, k=k, mask=mask)
+        return results
+
+class FeatureStore(EmbeddingStore):
+    """Append-only, memory-mapped float32 store of raw pooled features with their labels.
+
+    Same layout as EmbeddingStore, but vectors are kept unnormalised at full
+    precision so classifier heads can be trained on them.
+    """
+
+    dtype = np.float32
+    vectors_file = "features.f32"
+    normalize = False
+
+    def update_labels(self, hashes, labels, genders):
+        """Refresh stored labels and genders (e.g. after the dataset changed)"""
+        with self._lock:
+            for key_hash, label, gender in zip(hashes, labels, genders):
+                i = self._hash_index.get(key_hash)
+                if i is not None:
+                    self.meta["label"][i] = str(label)
+                    self.meta["gender"][i] = str(gender)
+            self._save_meta()
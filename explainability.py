@@ -0,0 +1,495 @@
+"""Image-level explanations: batched Grad-CAM saliency maps and LIME/KernelSHAP attributions."""
+
+import copy
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeout
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+import matplotlib
+
+from inference import center_crop_square, get_preprocessing_family, image_hash, preprocess_batch
+from embeddings import extract_feature_maps, pool_feature_maps, head_forward, head_fingerprint, trunk_fingerprint
+
+SALIENCY_METHODS = ["gradcam", "gradcam++"]
+
+def compute_cams(model, tensor_batch, device, class_indices=None, method="gradcam"):
+    """Compute Grad-CAM maps for a batch with one backward pass.
+
+    The maps are taken at the last DenseNet/ResNet block. Everything after that
+    block is ReLU, global average pooling and the linear head, so the backward
+    pass only runs through the head and never through the convolutional trunk.
+    Returns (cams [N, h, w] in [0, 1], class indices, probabilities [N, C]).
+    """
+    with torch.no_grad():
+        feature_maps = extract_feature_maps(model, tensor_batch.to(device))
+
+    feature_maps = feature_maps.detach().requires_grad_(True)
+    with torch.enable_grad():
+        outputs = head_forward(model, pool_feature_maps(feature_maps))
+        probs = torch.sigmoid(outputs)
+
+        if class_indices is None:
+            class_indices = outputs.argmax(dim=1)
+        else:
+            class_indices = torch.as_tensor(class_indices, device=outputs.device).long()
+
+        # Samples are independent in eval mode, so one backward of the summed
+        # target scores yields every sample's own gradient
+        scores = outputs.gather(1, class_indices.view(-1, 1)).sum()
+        grads, = torch.autograd.grad(scores, feature_maps)
+
+    activations = feature_maps.detach()
+    if method == "gradcam++":
+        grads_2 = grads ** 2
+        grads_3 = grads_2 * grads
+        sum_activations = activations.sum(dim=(2, 3), keepdim=True)
+        alpha = grads_2 / (2 * grads_2 + sum_activations * grads_3 + 1e-7)
+        alpha = torch.where(grads != 0, alpha, torch.zeros_like(alpha))
+        weights = (alpha * F.relu(grads)).sum(dim=(2, 3), keepdim=True)
+    else:
+        weights = grads.mean(dim=(2, 3), keepdim=True)
+
+    cams = F.relu((weights * activations).sum(dim=1))
+
+    # Normalise every map to [0, 1] independently
+    flat = cams.view(cams.shape[0], -1)
+    minimum = flat.min(dim=1, keepdim=True).values
+    maximum = flat.max(dim=1, keepdim=True).values
+    cams = ((flat - minimum) / (maximum - minimum + 1e-7)).view_as(cams)
+
+    return cams.cpu().numpy().astype(np.float32), class_indices.cpu().numpy(), probs.detach().cpu().numpy()
+
+class SaliencyCache:
+    """LRU cache of raw (block-resolution) saliency maps keyed by (image hash, model, head fingerprint, class, method)"""
+
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return sum(cam.nbytes for cam in self._entries.values())
+
+    def get(self, key):
+        cam = self._entries.get(key)
+        if cam is not None:
+            self._entries.move_to_end(key)
+        return cam
+
+    def put(self, key, cam):
+        self._entries[key] = cam
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+def get_saliency_maps(images, model_name, model, source, device, cache, class_index=None,
+                      method="gradcam", batch_size=16):
+    """Return (cams, class indices) for images, computing only uncached maps.
+
+    With `class_index=None` each image is explained for its own top-scoring class.
+    Maps are cached at block resolution (7x7) and upsampled only for display.
+    """
+    hashes = [image_hash(image) for image in images]
+    cams = [None] * len(images)
+    classes = [class_index] * len(images)
+
+    # Maps depend on the classifier head, so a retrained head never reuses older maps
+    model_key = (model_name, head_fingerprint(model))
+
+    if class_index is not None:
+        for i, key_hash in enumerate(hashes):
+            cams[i] = cache.get((key_hash, *model_key, class_index, method))
+
+    # "Top class" lookups are cached under a per-image alias of the resolved class
+    else:
+        for i, key_hash in enumerate(hashes):
+            resolved = cache.get((key_hash, *model_key, "top", method))
+            if resolved is not None:
+                classes[i] = int(resolved[0])
+                cams[i] = cache.get((key_hash, *model_key, classes[i], method))
+
+    missing = [i for i, cam in enumerate(cams) if cam is None]
+    if missing:
+        tensor_batch = preprocess_batch([images[i] for i in missing], get_preprocessing_family(source))
+        for start in range(0, len(missing), batch_size):
+            chunk_idx = missing[start:start + batch_size]
+            chunk_classes = None if class_index is None else [class_index] * len(chunk_idx)
+            chunk_cams, chunk_resolved, _ = compute_cams(
+                model, tensor_batch[start:start + batch_size], device, chunk_classes, method
+            )
+            for i, cam, resolved in zip(chunk_idx, chunk_cams, chunk_resolved):
+                resolved = int(resolved)
+                cache.put((hashes[i], *model_key, resolved, method), cam)
+                if class_index is None:
+                    cache.put((hashes[i], *model_key, "top", method), np.array([resolved]))
+                cams[i] = cam
+                classes[i] = resolved
+
+        logging.info(f"Computed {len(missing)} {method} maps for {model_name} ({len(images) - len(missing)} cached)")
+
+    return np.stack(cams, axis=0), classes
+
+def render_overlay(image, cam, alpha=0.4, size=224, colormap="jet"):
+    """Blend an upsampled saliency map over the (square, resized) X-ray as an RGB PIL image"""
+    base = center_crop_square(image).resize((size, size)).convert("RGB")
+
+    heatmap = Image.fromarray(np.uint8(255 * cam)).resize((size, size), Image.BILINEAR)
+    colored = matplotlib.colormaps[colormap](np.asarray(heatmap) / 255.0)[:, :, :3]
+    colored = Image.fromarray(np.uint8(255 * colored))
+
+    return Image.blend(base, colored, alpha)
+
+# ------------------------- LIME / KERNEL SHAP -------------------------
+PERTURBATION_METHODS = ["lime", "kernelshap"]
+
+# Model held by each explanation worker process (set once by the pool initializer)
+_WORKER_MODEL = None
+
+def _init_worker(model):
+    """Process pool initializer: keep one CPU copy of the model per worker"""
+    global _WORKER_MODEL
+    torch.set_num_threads(1)
+    _WORKER_MODEL = model.cpu().eval()
+
+def grid_segments(size=224, grid_size=8):
+    """Label map assigning every pixel of a size x size image to one of grid_size**2 square segments"""
+    cell = int(np.ceil(size / grid_size))
+    rows = np.arange(size) // cell
+    return (rows[:, None] * grid_size + rows[None, :]).astype(np.int64)
+
+def evaluate_masks(model, base, labels, masks, class_index, device, batch_size=64, deadline=None):
+    """Score segment masks in large batches; masked segments are set to the normalised zero baseline.
+
+    Returns the scores of the masks evaluated before `deadline` (may be fewer than all masks).
+    """
+    labels = torch.as_tensor(labels)
+    scores = []
+    with torch.no_grad():
+        for start in range(0, len(masks), batch_size):
+            if deadline is not None and time.time() > deadline:
+                break
+            chunk = torch.as_tensor(masks[start:start + batch_size], dtype=base.dtype)
+            pixel_masks = chunk[:, labels].unsqueeze(1)  # [B, 1, H, W]
+            outputs = torch.sigmoid(model((base * pixel_masks).to(device)))
+            scores.append(outputs[:, class_index].cpu().numpy())
+    return np.concatenate(scores) if scores else np.empty(0, dtype=np.float32)
+
+def _worker_evaluate_masks(base, labels, masks, class_index, batch_size):
+    """Process pool task: score a chunk of masks with the worker's model"""
+    return evaluate_masks(_WORKER_MODEL, base, labels, masks, class_index, torch.device("cpu"), batch_size)
+
+def sample_masks(method, num_segments, num_samples, rng):
+    """Draw binary segment masks; the first row is always the unperturbed image"""
+    if method == "kernelshap":
+        # Sample coalition sizes from the Shapley kernel so samples can be weighted uniformly
+        sizes = np.arange(1, num_segments)
+        size_probs = (num_segments - 1) / (sizes * (num_segments - sizes))
+        drawn_sizes = rng.choice(sizes, size=num_samples - 2, p=size_probs / size_probs.sum())
+        order = np.argsort(rng.random((num_samples - 2, num_segments)), axis=1)
+        masks = (order < drawn_sizes[:, None]).astype(np.uint8)
+        return np.vstack([np.ones((1, num_segments), np.uint8), np.zeros((1, num_segments), np.uint8), masks])
+
+    masks = rng.integers(0, 2, size=(num_samples, num_segments), dtype=np.uint8)
+    masks[0] = 1
+    return masks
+
+def weighted_linear_fit(masks, scores, weights, ridge=0.0):
+    """Weighted (ridge) least squares with intercept; returns (intercept, coefficients)"""
+    X = masks.astype(np.float64)
+    x_mean = weights @ X / weights.sum()
+    y_mean = weights @ scores / weights.sum()
+    Xc = X - x_mean
+    yc = scores - y_mean
+    A = Xc.T @ (Xc * weights[:, None]) + ridge * np.eye(X.shape[1])
+    coef = np.linalg.lstsq(A, Xc.T @ (weights * yc), rcond=None)[0]
+    return float(y_mean - x_mean @ coef), coef
+
+def fit_explanation(method, masks, scores):
+    """Fit LIME or KernelSHAP segment attributions from evaluated masks"""
+    num_segments = masks.shape[1]
+    if method == "kernelshap":
+        # Sizes were drawn from the Shapley kernel, so only the empty and full
+        # coalitions need (large) extra weight to pin the efficiency constraint
+        weights = np.ones(len(masks))
+        sizes = masks.sum(axis=1)
+        weights[(sizes == 0) | (sizes == num_segments)] = 1e6
+        return weighted_linear_fit(masks, scores, weights)
+
+    # LIME: exponential kernel on the cosine distance to the unperturbed image
+    distances = 1 - masks.sum(axis=1) / (np.sqrt(np.maximum(masks.sum(axis=1), 1)) * np.sqrt(num_segments))
+    weights = np.sqrt(np.exp(-(distances ** 2) / 0.25 ** 2))
+    return weighted_linear_fit(masks, scores, weights, ridge=1.0)
+
+class ExplanationService:
+    """Budgeted, persisted LIME/KernelSHAP explanations over batched model evaluations.
+
+    Perturbations are applied to the preprocessed tensor, so every model
+    evaluation is a slice of one large batch. With `n_workers > 0` mask chunks
+    are spread over a process pool per model that holds one copy of it. The
+    service is shared by all sessions: a pool another explanation is still
+    using is only shut down once that explanation has finished with it.
+    """
+
+    def __init__(self, cache_dir="explanation_cache", n_workers=0):
+        self.cache_dir = cache_dir
+        self.n_workers = n_workers
+        self._pools = {}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.npz")
+
+    def _acquire_pool(self, model_name, model, n_workers):
+        """Pool of `n_workers` processes holding a copy of `model`, in use until `_release_pool`.
+
+        Pools are matched on the model's weights, not its identity, since probe
+        heads are swapped into loaded models in place. Other weights or another
+        worker count replace the model's pool; the replaced pool is retired and
+        shut down when its last user releases it.
+        """
+        fingerprint = (trunk_fingerprint(model), head_fingerprint(model))
+        with self._lock:
+            entry = self._pools.get(model_name)
+            if entry is None or entry["fingerprint"] != fingerprint or entry["n_workers"] != n_workers:
+                if entry is not None:
+                    self._retire(entry)
+                # Spawned workers avoid inheriting torch's thread pools through fork
+                pool = ProcessPoolExecutor(
+                    max_workers=n_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(copy.deepcopy(model).cpu(),)
+                )
+                entry = {"fingerprint": fingerprint, "n_workers": n_workers, "pool": pool, "users": 0,
+                         "retired": False}
+                self._pools[model_name] = entry
+            entry["users"] += 1
+            return entry
+
+    def _release_pool(self, entry):
+        with self._lock:
+            entry["users"] -= 1
+            if entry["retired"] and not entry["users"]:
+                entry["pool"].shutdown(wait=False, cancel_futures=True)
+
+    def _retire(self, entry):
+        """Shut a pool down now if idle, otherwise when its last user releases it (caller holds the lock)"""
+        entry["retired"] = True
+        if not entry["users"]:
+            entry["pool"].shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            for entry in self._pools.values():
+                self._retire(entry)
+            self._pools.clear()
+
+    def _evaluate(self, model_name, model, base, labels, masks, class_index, device, batch_size, deadline, n_workers):
+        """Evaluate masks in-process or on the pool; returns (evaluated masks, scores)"""
+        if n_workers <= 0:
+            scores = evaluate_masks(model, base, labels, masks, class_index, device, batch_size, deadline)
+            return masks[:len(scores)], scores
+
+        entry = self._acquire_pool(model_name, model, n_workers)
+        # Several small chunks per worker keep workers busy and let the budget cut in early
+        chunk_size = int(max(8, min(batch_size, np.ceil(len(masks) / (n_workers * 4)))))
+        done_masks, done_scores = [], []
+        try:
+            futures = {
+                entry["pool"].submit(_worker_evaluate_masks, base, labels, masks[start:start + chunk_size],
+                                     class_index, batch_size): start
+                for start in range(0, len(masks), chunk_size)
+            }
+            try:
+                for future in as_completed(futures, timeout=max(deadline - time.time(), 0)):
+                    if future.cancelled():
+                        continue
+                    start = futures[future]
+                    done_masks.append(masks[start:start + chunk_size])
+                    done_scores.append(future.result())
+            except FuturesTimeout:
+                for future in futures:
+                    future.cancel()
+        finally:
+            self._release_pool(entry)
+
+        if not done_scores:
+            return masks[:0], np.empty(0, dtype=np.float32)
+        return np.vstack(done_masks), np.concatenate(done_scores)
+
+    def explain(self, image, model_name, model, source, device, class_index=None, method="lime",
+                max_samples=1000, time_budget=30.0, grid_size=8, batch_size=64, seed=0, n_workers=None):
+        """Explain one image; repeated calls with the same settings load the persisted result"""
+        start_time = time.time()
+        base = preprocess_batch([image], get_preprocessing_family(source))
+
+        if class_index is None:
+            with torch.no_grad():
+                class_index = int(torch.sigmoid(model(base.to(device))).argmax(dim=1).item())
+
+        # Only complete runs are persisted, so the time budget is not part of the key
+        key = (image_hash(image), model_name, head_fingerprint(model), class_index, method, grid_size, max_samples, seed)
+        path = self._cache_path(key)
+        if os.path.exists(path):
+            stored = np.load(path)
+            return {
+                "values": stored["values"], "intercept": float(stored["intercept"]),
+                "class_index": class_index, "grid_size": grid_size,
+                "samples": int(stored["samples"]), "elapsed": float(stored["elapsed"]), "cached": True
+            }
+
+        labels = grid_segments(base.shape[-1], grid_size)
+        masks = sample_masks(method, grid_size ** 2, max_samples, np.random.default_rng(seed))
+
+        # The unperturbed (and for KernelSHAP the empty) coalition anchors the fit, so it is scored
+        # in-process before the budgeted perturbations
+        anchors = 2 if method == "kernelshap" else 1
+        anchor_scores = evaluate_masks(model, base, labels, masks[:anchors], class_index, device, batch_size)
+        deadline = start_time + time_budget
+        n_workers = self.n_workers if n_workers is None else n_workers
+        sampled_masks, sampled_scores = self._evaluate(model_name, model, base, labels, masks[anchors:], class_index,
+                                                       device, batch_size, deadline, n_workers)
+        if not len(sampled_scores):
+            raise TimeoutError(f"Time budget of {time_budget}s too small to evaluate any perturbations")
+        masks = np.vstack([masks[:anchors], sampled_masks])
+        scores = np.concatenate([anchor_scores, sampled_scores])
+
+        intercept, values = fit_explanation(method, masks, scores)
+        elapsed = time.time() - start_time
+        # A run cut short by the time budget is returned but not reused for later requests
+        if len(scores) == max_samples:
+            np.savez(path, values=values, intercept=intercept, samples=len(scores), elapsed=elapsed)
+        logging.info(f"{method} explanation for {model_name} used {len(scores)} samples in {elapsed:.1f}s")
+
+        return {
+            "values": values, "intercept": intercept, "class_index": class_index, "grid_size": grid_size,
+            "samples": len(scores), "elapsed": elapsed, "cached": False
+        }
+
+def render_heatmap(values, size=224, colormap="jet"):
+    """Render a [0, 1] map on its own as an RGB PIL image"""
+    heatmap = Image.fromarray(np.uint8(255 * np.clip(values, 0, 1))).resize((size, size), Image.BILINEAR)
+    return Image.fromarray(np.uint8(255 * matplotlib.colormaps[colormap](np.asarray(heatmap) / 255.0)[:, :, :3]))
+
+def render_attribution(image, values, grid_size, alpha=0.5, size=224):
+    """Overlay signed segment attributions (red = supports the class, blue = against it)"""
+    values = np.asarray(values, dtype=np.float64).reshape(grid_size, grid_size)
+    scale = np.abs(values).max() or 1.0
+    return render_overlay(image, 0.5 + 0.5 * values / scale, alpha=alpha, size=size, colormap="bwr")
+
+# ------------------------- FAIRNESS-AWARE SALIENCY AGGREGATION -------------------------
+def classify_outcome(actual_positive, predicted_positive):
+    """Return the error type name for binary ground truth and prediction (None = unlabeled)"""
+    if actual_positive is None:
+        return "Unlabeled"
+    if actual_positive:
+        return "True Positive" if predicted_positive else "False Negative"
+    return "False Positive" if predicted_positive else "True Negative"
+
+class SaliencyAggregator:
+    """Streaming per-cell mean and variance of saliency maps.
+
+    Cells are arbitrary hashable keys such as (gender, error type, pathology).
+    Each cell keeps only (count, mean, M2), updated with Welford/Chan merges,
+    so memory stays constant per cell however many images are streamed.
+    """
+
+    def __init__(self, shape=(7, 7)):
+        self.shape = tuple(shape)
+        self.cells = {}
+
+    def __len__(self):
+        return len(self.cells)
+
+    def _merge_stats(self, key, count, mean, m2):
+        if key not in self.cells:
+            self.cells[key] = [count, mean.copy(), m2.copy()]
+            return
+        cell = self.cells[key]
+        total = cell[0] + count
+        delta = mean - cell[1]
+        cell[1] += delta * (count / total)
+        cell[2] += m2 + delta ** 2 * (cell[0] * count / total)
+        cell[0] = total
+
+    def update(self, key, cam):
+        """Add a single map to a cell (classic Welford step)"""
+        cam = np.asarray(cam, dtype=np.float64)
+        self._merge_stats(key, 1, cam, np.zeros_like(cam))
+
+    def update_batch(self, keys, cams):
+        """Add a batch of maps, merging each cell's batch statistics in one step"""
+        cams = np.asarray(cams, dtype=np.float64)
+        groups = {}
+        for i, key in enumerate(keys):
+            groups.setdefault(key, []).append(i)
+        for key, idx in groups.items():
+            batch = cams[idx]
+            mean = batch.mean(axis=0)
+            self._merge_stats(key, len(idx), mean, ((batch - mean) ** 2).sum(axis=0))
+
+    def merge(self, other):
+        """Fold another aggregator (e.g. from a parallel worker) into this one"""
+        for key, (count, mean, m2) in other.cells.items():
+            self._merge_stats(key, count, mean, m2)
+
+    def stats(self, keys):
+        """Return (count, mean, variance) pooled over one or more cells"""
+        pooled = SaliencyAggregator(self.shape)
+        for key in keys:
+            if key in self.cells:
+                pooled._merge_stats("pooled", *self.cells[key])
+        if "pooled" not in pooled.cells:
+            return 0, np.zeros(self.shape), np.zeros(self.shape)
+        count, mean, m2 = pooled.cells["pooled"]
+        return count, mean, m2 / max(count - 1, 1)
+
+    def matching_keys(self, **criteria):
+        """Keys whose positional fields match, e.g. matching_keys(gender="F", pathology="Edema")"""
+        fields = {"gender": 0, "error_type": 1, "pathology": 2}
+        return [key for key in self.cells
+                if all(value is None or key[fields[name]] == value for name, value in criteria.items())]
+
+    def compare(self, keys_a, keys_b):
+        """Mean difference map and Welch t-statistic map between two groups of cells"""
+        n_a, mean_a, var_a = self.stats(keys_a)
+        n_b, mean_b, var_b = self.stats(keys_b)
+        diff = mean_a - mean_b
+        if n_a < 2 or n_b < 2:
+            return diff, np.zeros(self.shape)
+        return diff, diff / np.sqrt(var_a / n_a + var_b / n_b + 1e-12)
+
+    def summary(self):
+        """List of (key, count) pairs for every cell"""
+        return [(key, cell[0]) for key, cell in self.cells.items()]
+
+def accumulate_saliency(aggregator, model, tensor_batch, device, genders, actual_positive,
+                        label_names, threshold, method="gradcam"):
+    """Compute top-class saliency for a batch and stream it into (gender, error type, pathology) cells"""
+    cams, classes, probs = compute_cams(model, tensor_batch, device, None, method)
+    top_probs = probs[np.arange(len(classes)), classes]
+
+    keys = [
+        (gender, classify_outcome(actual, prob >= threshold), label_names[cls])
+        for gender, actual, prob, cls in zip(genders, actual_positive, top_probs, classes)
+    ]
+    aggregator.update_batch(keys, cams)
+    return keys
@@ -0,0 +1,468 @@
+"""Vectorized fairness metrics over prediction results.
+
+Every metric here is derived from per-cell confusion counts, which are built
+with a handful of `np.bincount` calls over integer-coded columns. That keeps
+the cost linear in the number of predictions and independent of how many
+subgroups or pathologies are analysed.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# Labels that never count as a pathology for per-pathology metrics
+NON_PATHOLOGY_LABELS = {"No Disease", "Unknown"}
+
+# Dimensions an intersectional subgroup can be built from (pathology is always included)
+SUBGROUP_DIMENSIONS = ["Gender", "Age_Group", "Model"]
+
+# Metrics where a lower value means the subgroup is worse served
+HIGHER_IS_BETTER = {"TPR": True, "PPV": True, "Accuracy": True, "FPR": False, "FNR": False}
+
+def factorize_labels(values):
+    """Factorize values into (codes, labels), coding missing values as Unknown"""
+    codes, labels = pd.factorize(values, sort=True)
+    labels = list(np.asarray(labels, dtype=object))
+    if (codes < 0).any():
+        if "Unknown" not in labels:
+            labels.append("Unknown")
+        codes = np.where(codes < 0, labels.index("Unknown"), codes)
+    return codes.astype(np.int64), np.asarray(labels, dtype=object)
+
+def encode_columns(df, columns):
+    """Factorize columns into one integer cell code per row.
+
+    Returns (codes, levels): `codes` is an int64 array and `levels` is a
+    DataFrame with one row per cell code holding the column values.
+    """
+    if not columns:
+        return np.zeros(len(df), dtype=np.int64), pd.DataFrame(index=[0])
+
+    codes = np.zeros(len(df), dtype=np.int64)
+    uniques = []
+    for column in columns:
+        column_codes, column_uniques = factorize_labels(df[column])
+        codes = codes * len(column_uniques) + column_codes
+        uniques.append(column_uniques)
+
+    # Compact the mixed-radix codes to the cells that actually occur
+    codes, cells = pd.factorize(codes, sort=True)
+    levels = {}
+    for column, column_uniques in zip(reversed(columns), reversed(uniques)):
+        levels[column] = np.asarray(column_uniques, dtype=object)[cells % len(column_uniques)]
+        cells = cells // len(column_uniques)
+    return codes.astype(np.int64), pd.DataFrame({column: levels[column] for column in columns})
+
+def confusion_cells(df, dimensions, actual_col="Actual", prediction_col="Prediction"):
+    """One-vs-rest confusion counts for every (subgroup cell, pathology) pair.
+
+    A row with Actual == p is a positive for pathology p, and a row with
+    Prediction == p is a predicted positive for p. Counts come from three
+    bincounts over (cell, label) codes, so no rows x pathologies matrix is built.
+    """
+    # Factorize once per column and map the (few) unique labels onto the pathology list
+    actual_codes, actual_labels = factorize_labels(df[actual_col])
+    predicted_codes, predicted_labels = factorize_labels(df[prediction_col])
+
+    # Rows without ground truth carry no information for any pathology
+    known = actual_labels[actual_codes] != "Unknown"
+    cell_codes, levels = encode_columns(df[known], list(dimensions))
+
+    labels = sorted((set(actual_labels) | set(predicted_labels)) - NON_PATHOLOGY_LABELS, key=str)
+    label_index = pd.Index(labels, dtype=object)
+    actual = label_index.get_indexer(actual_labels)[actual_codes[known]]
+    predicted = label_index.get_indexer(predicted_labels)[predicted_codes[known]]
+
+    n_cells, n_labels = len(levels), len(labels)
+    size = n_cells * n_labels
+
+    def counts(mask, label_codes):
+        flat = cell_codes[mask] * n_labels + label_codes[mask]
+        return np.bincount(flat, minlength=size).reshape(n_cells, n_labels)
+
+    n = np.bincount(cell_codes, minlength=n_cells)
+    positives = counts(actual >= 0, actual)
+    predicted_positives = counts(predicted >= 0, predicted)
+    tp = counts((actual >= 0) & (actual == predicted), actual)
+
+    cells = levels.loc[np.repeat(np.arange(n_cells), n_labels)].reset_index(drop=True)
+    cells["Pathology"] = np.tile(np.asarray(labels, dtype=object), n_cells)
+    cells["n"] = np.repeat(n, n_labels)
+    cells["Positives"] = positives.ravel()
+    cells["TP"] = tp.ravel()
+    cells["FN"] = cells["Positives"] - cells["TP"]
+    cells["FP"] = predicted_positives.ravel() - cells["TP"]
+    cells["TN"] = cells["n"] - cells["Positives"] - cells["FP"]
+    return cells
+
+def add_rate_metrics(cells):
+    """Add TPR/FNR/FPR/PPV/Accuracy/Positive_Rate columns to confusion counts"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tp, fn, fp, tn = (cells[c].to_numpy(dtype=np.float64) for c in ("TP", "FN", "FP", "TN"))
+        cells["TPR"] = tp / (tp + fn)
+        cells["FNR"] = fn / (tp + fn)
+        cells["FPR"] = fp / (fp + tn)
+        cells["PPV"] = tp / (tp + fp)
+        cells["Accuracy"] = (tp + tn) / (tp + fn + fp + tn)
+        cells["Positive_Rate"] = (tp + fp) / (tp + fn + fp + tn)
+    return cells
+
+def intersectional_metrics(df, dimensions=SUBGROUP_DIMENSIONS, min_support=30, min_positives=5):
+    """Metrics for every (dimensions..., pathology) subgroup with minimum-support pruning.
+
+    Each cell is compared with the reference population sharing its model and
+    pathology (or just its pathology when Model is not a dimension), and the
+    `*_Gap` columns hold cell metric minus reference metric. Cells with fewer
+    than `min_support` rows or `min_positives` positives are dropped, since
+    their rates are too noisy to rank.
+    """
+    dimensions = [d for d in dimensions if d in df.columns]
+    cells = add_rate_metrics(confusion_cells(df, dimensions))
+
+    # Reference rates are pooled over the non-model dimensions
+    reference_keys = ["Model", "Pathology"] if "Model" in dimensions else ["Pathology"]
+    reference = cells.groupby(reference_keys, observed=True)[["TP", "FN", "FP", "TN"]].sum()
+    reference = add_rate_metrics(reference)[list(HIGHER_IS_BETTER)]
+    cells = cells.join(reference.add_prefix("Reference_"), on=reference_keys)
+    for metric in HIGHER_IS_BETTER:
+        cells[f"{metric}_Gap"] = cells[metric] - cells[f"Reference_{metric}"]
+
+    keep = (cells["n"] >= min_support) & (cells["Positives"] >= min_positives)
+    return cells[keep].reset_index(drop=True)
+
+def rank_worst_subgroups(cells, metric="TPR", top_k=20):
+    """Return the `top_k` subgroups that fall furthest short of their reference on `metric`"""
+    gap = cells[f"{metric}_Gap"]
+    deficit = -gap if HIGHER_IS_BETTER[metric] else gap
+    ranked = cells.assign(Deficit=deficit).dropna(subset=["Deficit"])
+    return ranked.sort_values("Deficit", ascending=False).head(top_k)
+
+# ------------------------- MULTI-LABEL PATHOLOGY RATES -------------------------
+def label_matrix(actual, labels, separators="|,;", key=str.lower):
+    """Multi-hot ground truth [N, C] from label strings such as "Effusion|Edema".
+
+    Label parts and `labels` are matched on `key` (case-insensitive by default;
+    `label_alignment.canonical_label` also resolves synonyms such as "pleural
+    effusion"). Each distinct label string is parsed once and the parsed rows
+    are gathered back onto all N results.
+    """
+    codes, uniques = factorize_labels(actual)
+    positions = {}
+    for j, label in enumerate(labels):
+        positions.setdefault(key(str(label)), []).append(j)
+    pattern = "[" + "".join("\\" + sep for sep in separators) + "]"
+
+    parsed = np.zeros((len(uniques), len(labels)), dtype=bool)
+    known = np.ones(len(uniques), dtype=bool)
+    for i, value in enumerate(uniques):
+        if str(value) == "Unknown":
+            known[i] = False
+            continue
+        for part in re.split(pattern, str(value)):
+            parsed[i, positions.get(key(part.strip()), [])] = True
+    return parsed[codes], known[codes]
+
+def label_vocabulary(actual, max_labels=14, separators="|,;"):
+    """The `max_labels` most frequent pathology names in label strings, most frequent first"""
+    codes, uniques = factorize_labels(actual)
+    counts = np.bincount(codes, minlength=len(uniques))
+    pattern = "[" + "".join("\\" + sep for sep in separators) + "]"
+
+    totals = {}
+    for value, count in zip(uniques, counts):
+        for part in re.split(pattern, str(value)):
+            part = part.strip()
+            if part and part not in NON_PATHOLOGY_LABELS:
+                totals[part] = totals.get(part, 0) + int(count)
+    return sorted(totals, key=lambda label: (-totals[label], label))[:max_labels]
+
+def pathology_group_rates(probabilities, truth, groups, thresholds=0.5, labels=None):
+    """Per-pathology TPR/FPR for every group as one [pathology x group] reduction.
+
+    `probabilities` and `truth` are [N, C]; `groups` holds one group label per
+    row. `thresholds` is a scalar or one threshold per pathology. Returns a
+    long DataFrame with one row per (pathology, group).
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float32)
+    truth = np.asarray(truth, dtype=bool)
+    group_codes, group_labels = factorize_labels(groups)
+
+    # One-hot group membership turns every count into a [C, N] @ [N, G] product
+    membership = np.zeros((len(group_codes), len(group_labels)), dtype=np.float32)
+    membership[np.arange(len(group_codes)), group_codes] = 1.0
+
+    predicted = probabilities >= np.asarray(thresholds, dtype=np.float32)
+    tp = (predicted & truth).T.astype(np.float32) @ membership
+    fp = (predicted & ~truth).T.astype(np.float32) @ membership
+    positives = truth.T.astype(np.float32) @ membership
+    negatives = membership.sum(axis=0)[None, :] - positives
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tpr = tp / positives
+        fpr = fp / negatives
+
+    n_labels = truth.shape[1]
+    labels = list(labels) if labels is not None else [f"Label_{j}" for j in range(n_labels)]
+    return pd.DataFrame({
+        "Pathology": np.repeat(np.asarray(labels, dtype=object), len(group_labels)),
+        "Group": np.tile(group_labels, n_labels),
+        "Positives": positives.ravel().astype(np.int64),
+        "Negatives": negatives.ravel().astype(np.int64),
+        "TPR": tpr.ravel(),
+        "FPR": fpr.ravel(),
+    })
+
+def pathology_gaps(rates, min_positives=1):
+    """Per-pathology TPR/FPR gaps (max - min over groups) from `pathology_group_rates` output"""
+    rates = rates.copy()
+    rates.loc[rates["Positives"] < min_positives, "TPR"] = np.nan
+    wide = rates.pivot(index="Pathology", columns="Group", values=["TPR", "FPR", "Positives"])
+    gaps = pd.DataFrame({
+        "TPR_Gap": wide["TPR"].max(axis=1) - wide["TPR"].min(axis=1),
+        "FPR_Gap": wide["FPR"].max(axis=1) - wide["FPR"].min(axis=1),
+        "Positives": wide["Positives"].sum(axis=1).astype(np.int64),
+    })
+    for metric in ("TPR", "FPR"):
+        for group in wide[metric].columns:
+            gaps[f"{metric}_{group}"] = wide[metric][group]
+    return gaps.sort_values("TPR_Gap", ascending=False)
+
+# ------------------------- ROC / PR CURVES -------------------------
+def disease_scores(df, prediction_col="Prediction", probability_col="Probability"):
+    """Top pathology probability per result row.
+
+    The results table stores confidence in the shown label, which is
+    1 - top probability for "No Disease" rows; this undoes that.
+    """
+    probability = df[probability_col].to_numpy(dtype=np.float64)
+    return np.where(df[prediction_col].to_numpy() == "No Disease", 1.0 - probability, probability)
+
+def binary_curves(scores, labels):
+    """ROC and PR curves at every distinct threshold from one sort and cumulative sums.
+
+    Returns a dict of arrays ordered by decreasing threshold, starting with an
+    (inf, 0, 0) point where nothing is predicted positive, plus "auc" and "ap".
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    labels = np.asarray(labels, dtype=bool)
+
+    order = np.argsort(-scores, kind="mergesort")
+    scores, labels = scores[order], labels[order]
+
+    # Last index of every run of tied scores
+    cut = np.r_[np.flatnonzero(np.diff(scores)), len(scores) - 1] if len(scores) else np.array([], dtype=np.int64)
+    tps = np.cumsum(labels)[cut].astype(np.float64)
+    fps = (cut + 1) - tps
+
+    tps, fps = np.r_[0.0, tps], np.r_[0.0, fps]
+    positives, negatives = tps[-1], fps[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tpr = tps / positives
+        fpr = fps / negatives
+        precision = np.where(tps + fps > 0, tps / (tps + fps), 1.0)
+
+    curves = {
+        "thresholds": np.r_[np.inf, scores[cut]],
+        "tpr": tpr,
+        "fpr": fpr,
+        "precision": precision,
+        "recall": tpr,
+        "positives": int(positives),
+        "negatives": int(negatives),
+    }
+    curves["auc"] = float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2)) if positives and negatives else float("nan")
+    curves["ap"] = float(np.sum(np.diff(tpr) * precision[1:])) if positives else float("nan")
+    return curves
+
+def group_curves(scores, labels, groups):
+    """`binary_curves` for every group (one sort per group)"""
+    scores = np.asarray(scores, dtype=np.float64)
+    labels = np.asarray(labels, dtype=bool)
+    groups = np.asarray(groups, dtype=object)
+    return {group: binary_curves(scores[groups == group], labels[groups == group]) for group in pd.unique(groups)}
+
+def operating_point(curves, threshold):
+    """TPR/FPR/precision when predicting positive for scores >= threshold (binary search)"""
+    i = np.searchsorted(-curves["thresholds"], -threshold, side="right") - 1
+    return {"threshold": threshold, "tpr": curves["tpr"][i], "fpr": curves["fpr"][i], "precision": curves["precision"][i]}
+
+# ------------------------- EQUALIZED-ODDS POST-PROCESSING -------------------------
+FAIRNESS_CONSTRAINTS = ["equalized_odds", "equal_opportunity"]
+
+def candidate_rates(curves, max_points=256):
+    """Thin a group's ROC curve to at most `max_points` (threshold, fpr, tpr) candidates, keeping both ends"""
+    n = len(curves["thresholds"])
+    keep = np.unique(np.linspace(0, n - 1, min(n, max_points)).round().astype(np.int64))
+    return curves["thresholds"][keep], curves["fpr"][keep], curves["tpr"][keep]
+
+class EqualizedOddsPostprocessor:
+    """Per-group randomized thresholds that equalize error rates (Hardt et al., 2016).
+
+    Each group's classifier is a mixture of its own score thresholds. A linear
+    program over the per-threshold (FPR, TPR) rates picks the mixture weights
+    that minimise the expected number of errors subject to equal TPR (equal
+    opportunity) or equal TPR and FPR (equalized odds) across groups.
+    """
+
+    def __init__(self, constraint="equalized_odds", max_points=256, default_threshold=0.5):
+        if constraint not in FAIRNESS_CONSTRAINTS:
+            raise ValueError(f"Unknown fairness constraint: {constraint}")
+        self.constraint = constraint
+        self.max_points = max_points
+        self.default_threshold = default_threshold
+        self.mixtures = {}
+        self.rates = {}
+
+    def fit(self, scores=None, labels=None, groups=None, curves=None):
+        """Solve for the mixtures from raw scores or from precomputed `group_curves` output"""
+        # Imported here so the rest of the module does not need scipy
+        from scipy.optimize import linprog
+
+        if curves is None:
+            curves = group_curves(scores, labels, groups)
+
+        # Only groups with both classes have defined TPR and FPR
+        curves = {group: c for group, c in curves.items() if c["positives"] and c["negatives"]}
+        if not curves:
+            raise ValueError("Post-processing needs at least one group with positive and negative labels")
+
+        group_names = list(curves)
+        candidates = [candidate_rates(curves[group], self.max_points) for group in group_names]
+        sizes = [len(thresholds) for thresholds, _, _ in candidates]
+        offsets = np.r_[0, np.cumsum(sizes)]
+        n_vars = offsets[-1]
+
+        # Expected errors: negatives * FPR + positives * (1 - TPR), dropping the constant
+        cost = np.concatenate([
+            curves[group]["negatives"] * fpr - curves[group]["positives"] * tpr
+            for group, (_, fpr, tpr) in zip(group_names, candidates)
+        ])
+
+        rows, rhs = [], []
+        for g in range(len(group_names)):
+            row = np.zeros(n_vars)
+            row[offsets[g]:offsets[g + 1]] = 1.0
+            rows.append(row)
+            rhs.append(1.0)
+
+        # Tie every group's mixed rates to the first group's
+        rate_indices = [2] if self.constraint == "equal_opportunity" else [1, 2]
+        for g in range(1, len(group_names)):
+            for r in rate_indices:
+                row = np.zeros(n_vars)
+                row[offsets[0]:offsets[1]] = -candidates[0][r]
+                row[offsets[g]:offsets[g + 1]] = candidates[g][r]
+                rows.append(row)
+                rhs.append(0.0)
+
+        result = linprog(cost, A_eq=np.vstack(rows), b_eq=np.asarray(rhs), bounds=(0, None), method="highs")
+        if not result.success:
+            raise ValueError(f"Post-processing LP failed: {result.message}")
+
+        self.mixtures, self.rates = {}, {}
+        for g, group in enumerate(group_names):
+            weights = np.clip(result.x[offsets[g]:offsets[g + 1]], 0, None)
+            used = weights > 1e-9
+            thresholds, fpr, tpr = (values[used] for values in candidates[g])
+            weights = weights[used] / weights[used].sum()
+            self.mixtures[group] = (thresholds, weights)
+            self.rates[group] = {"fpr": float(weights @ fpr), "tpr": float(weights @ tpr)}
+        return self
+
+    def predict(self, scores, groups, seed=0):
+        """Draw one threshold per row from its group's mixture and apply it"""
+        scores = np.asarray(scores, dtype=np.float64)
+        groups = np.asarray(groups, dtype=object)
+        thresholds = np.full(len(scores), self.default_threshold)
+        rng = np.random.default_rng(seed)
+
+        for group, (group_thresholds, weights) in self.mixtures.items():
+            mask = groups == group
+            draws = np.searchsorted(np.cumsum(weights), rng.random(mask.sum()), side="right")
+            thresholds[mask] = group_thresholds[np.minimum(draws, len(weights) - 1)]
+        return (scores >= thresholds).astype(int)
+
+    def summary(self):
+        """One row per group: mixed thresholds with their probabilities and the resulting rates"""
+        return pd.DataFrame([
+            {
+                "Group": group,
+                "Thresholds": ", ".join(f"{t:.3f}" if np.isfinite(t) else "none" for t in thresholds),
+                "Probabilities": ", ".join(f"{w:.3f}" for w in weights),
+                "TPR": self.rates[group]["tpr"],
+                "FPR": self.rates[group]["fpr"],
+            }
+            for group, (thresholds, weights) in self.mixtures.items()
+        ])
+
+# ------------------------- REWEIGHING -------------------------
+def reweighing_weights(groups, labels):
+    """Kamiran & Calders reweighing: w(g, y) = P(g) P(y) / P(g, y) for every row.
+
+    Weighted this way, group membership and label are statistically
+    independent in the training data, so a head trained on it cannot use the
+    group as a proxy for the label.
+    """
+    group_codes, group_labels = factorize_labels(groups)
+    label_codes, label_values = factorize_labels(labels)
+    n = len(group_codes)
+
+    joint = np.bincount(group_codes * len(label_values) + label_codes,
+                        minlength=len(group_labels) * len(label_values)).reshape(len(group_labels), len(label_values))
+    expected = np.outer(joint.sum(axis=1), joint.sum(axis=0)) / max(n, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cell_weights = np.where(joint > 0, expected / joint, 0.0)
+    return cell_weights[group_codes, label_codes]
+
+def group_balanced_weights(groups):
+    """Inverse-frequency weights that give every group the same total weight (mean weight 1)"""
+    codes, uniques = factorize_labels(groups)
+    counts = np.bincount(codes, minlength=len(uniques)).astype(np.float64)
+    return (len(codes) / (len(uniques) * counts))[codes]
+
+# ------------------------- STRATIFIED BOOTSTRAP -------------------------
+def rebalanced_bootstrap(groups, values, target_ratio=1.0, n_replicates=1000, sample_size=None, seed=0,
+                         max_chunk_elements=10_000_000):
+    """Bootstrap replicates resampled to a target female-to-male ratio.
+
+    Each replicate draws `sample_size` rows with replacement: a
+    target_ratio / (1 + target_ratio) share from the female rows and the rest
+    from the male rows. Draws are integer index matrices generated for many
+    replicates at once (chunked to bound memory). `values` maps a name to a
+    per-row numeric array; returns one row per replicate with the female,
+    male and overall mean of each value.
+    """
+    groups = np.asarray(groups, dtype=object)
+    female_idx = np.flatnonzero(groups == "F")
+    male_idx = np.flatnonzero(groups == "M")
+    if len(female_idx) == 0 or len(male_idx) == 0:
+        raise ValueError("Rebalancing needs rows for both genders")
+
+    sample_size = sample_size or len(female_idx) + len(male_idx)
+    n_female = int(np.clip(round(sample_size * target_ratio / (1 + target_ratio)), 1, sample_size - 1))
+    n_male = sample_size - n_female
+
+    values = {name: np.asarray(column, dtype=np.float64) for name, column in values.items()}
+    rng = np.random.default_rng(seed)
+    chunk = max(1, max_chunk_elements // sample_size)
+
+    parts = []
+    for start in range(0, n_replicates, chunk):
+        n = min(chunk, n_replicates - start)
+        female_draws = female_idx[rng.integers(0, len(female_idx), size=(n, n_female))]
+        male_draws = male_idx[rng.integers(0, len(male_idx), size=(n, n_male))]
+
+        part = {}
+        for name, column in values.items():
+            female_sum = column[female_draws].sum(axis=1)
+            male_sum = column[male_draws].sum(axis=1)
+            part[f"Female {name}"] = female_sum / n_female
+            part[f"Male {name}"] = male_sum / n_male
+            part[f"Overall {name}"] = (female_sum + male_sum) / sample_size
+        parts.append(pd.DataFrame(part))
+
+    replicates = pd.concat(parts, ignore_index=True)
+    for name in values:
+        replicates[f"{name} Disparity"] = replicates[f"Female {name}"] - replicates[f"Male {name}"]
+    return replicates
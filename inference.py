@@ -0,0 +1,213 @@
+"""Shared preprocessing and batched inference helpers for the chest X-ray models."""
+
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+import torchvision.transforms as transforms
+from PIL import Image
+import torchxrayvision as xrv
+
+from instrumentation import timed
+
+# ------------------------- PREPROCESSING FAMILIES -------------------------
+# Models in the same family consume exactly the same input tensor, so an image
+# only has to be preprocessed once per family no matter how many models use it.
+PREPROCESSING_FAMILIES = {
+    "torchxrayvision": "xrv_grayscale",
+    "pytorch_hub": "imagenet_rgb"
+}
+
+# Bumped whenever a family's preprocessing changes, so stored results are not reused across versions
+PREPROCESSING_VERSIONS = {
+    "xrv_grayscale": "xrv_grayscale-224-v1",
+    "imagenet_rgb": "imagenet_rgb-224-v1"
+}
+
+ENSEMBLE_METHODS = ["mean", "weighted", "max"]
+
+def get_preprocessing_family(source):
+    """Return the preprocessing family for a model source"""
+    return PREPROCESSING_FAMILIES.get(source, "imagenet_rgb")
+
+def get_preprocessing_version(source):
+    """Return the preprocessing version string for a model source"""
+    return PREPROCESSING_VERSIONS[get_preprocessing_family(source)]
+
+def image_hash(image):
+    """Return a stable content hash for a PIL image"""
+    digest = hashlib.sha1(f"{image.mode}:{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+def load_image(source):
+    """Decode an image file or upload into the grayscale PIL image every pipeline scores"""
+    return Image.open(source).convert("L")
+
+def load_image_and_hash(source):
+    """`load_image` plus its content hash, shared by interactive and batch predictions so their keys agree"""
+    image = load_image(source)
+    return image, image_hash(image)
+
+def center_crop_square(image):
+    """Center crop a PIL image to a square"""
+    width, height = image.size
+    if width != height:
+        new_size = min(width, height)
+        left = (width - new_size) // 2
+        top = (height - new_size) // 2
+        right = left + new_size
+        bottom = top + new_size
+        image = image.crop((left, top, right, bottom))
+    return image
+
+def preprocess_xrv(image):
+    """Preprocess image for TorchXRayVision models (CheXpert, MIMIC-CXR)"""
+    # Convert to grayscale
+    if image.mode != 'L':
+        image = image.convert('L')
+
+    # Make sure image is square by center cropping
+    image = center_crop_square(image)
+
+    # Resize to 224x224 using PIL
+    image = image.resize((224, 224), Image.LANCZOS)
+
+    # Convert PIL image to numpy array with float32 dtype
+    img_np = np.array(image).astype(np.float32)
+
+    # Pass the maxval parameter (255 for 8-bit images) directly to normalize
+    # but don't let it reshape - we'll handle that manually
+    img = xrv.datasets.normalize(img_np, maxval=255, reshape=False)
+
+    # Manually reshape to match expected dimensions
+    img = img.reshape(1, 1, 224, 224)
+
+    # Convert to tensor
+    return torch.from_numpy(img)
+
+# Standard preprocessing for RGB models
+IMAGENET_TRANSFORM = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])  # ImageNet normalization
+])
+
+def preprocess_imagenet(image):
+    """Preprocess image for PyTorch Hub models (DenseNet121, ResNet50)"""
+    # First make sure image is square by center cropping
+    image = center_crop_square(image)
+
+    # Convert to RGB if it's not already
+    if image.mode != 'RGB':
+        # If grayscale, convert to RGB by duplicating the channel
+        if image.mode == 'L':
+            image = Image.merge("RGB", (image, image, image))
+        else:
+            # For any other mode, convert to RGB normally
+            image = image.convert('RGB')
+
+    tensor_img = IMAGENET_TRANSFORM(image)
+
+    # Add batch dimension if needed
+    if len(tensor_img.shape) == 3:  # [C, H, W]
+        tensor_img = tensor_img.unsqueeze(0)  # Add batch dim -> [1, C, H, W]
+
+    return tensor_img
+
+def preprocess_for_family(image, family):
+    """Preprocess a single PIL image for the given preprocessing family"""
+    if family == "xrv_grayscale":
+        return preprocess_xrv(image)
+    return preprocess_imagenet(image)
+
+@timed("preprocess")
+def preprocess_batch(images, family):
+    """Preprocess a list of PIL images into one [N, C, 224, 224] tensor"""
+    return torch.cat([preprocess_for_family(image, family) for image in images], dim=0)
+
+@timed("model_forward")
+def forward_probabilities(model, tensor_batch, device, batch_size=16):
+    """Run a batched forward pass and return sigmoid probabilities as a [N, C] array"""
+    outputs = []
+    with torch.no_grad():
+        for start in range(0, tensor_batch.shape[0], batch_size):
+            chunk = tensor_batch[start:start + batch_size].to(device)
+            outputs.append(torch.sigmoid(model(chunk)).cpu())
+    return torch.cat(outputs, dim=0).numpy()
+
+# ------------------------- ENSEMBLE ENGINE -------------------------
+def run_ensemble(images, members, device, batch_size=16, max_workers=None, feature_cache=None):
+    """Score images with every ensemble member, preprocessing once per family.
+
+    `members` maps model name -> {"model": nn.Module, "source": MODELS source}.
+    When a `feature_cache` is given, members only run their trunk on images
+    they have not seen before and re-score cached features otherwise.
+    Returns a dict of model name -> [N, C] probability array.
+    """
+    # Preprocess each image once per family used by the selected members
+    families = {get_preprocessing_family(info["source"]) for info in members.values()}
+    tensors = {family: preprocess_batch(images, family) for family in families}
+    hashes = [image_hash(image) for image in images] if feature_cache is not None else None
+
+    def score_member(item):
+        name, info = item
+        family = get_preprocessing_family(info["source"])
+        if feature_cache is None:
+            return name, forward_probabilities(info["model"], tensors[family], device, batch_size)
+
+        # Imported here because embeddings builds on the preprocessing helpers above
+        from embeddings import get_features, probabilities_from_features
+        features = get_features(images, name, info["model"], info["source"], device, feature_cache,
+                                hashes=hashes, tensor_batch=tensors[family], batch_size=batch_size)
+        return name, probabilities_from_features(info["model"], features, device)
+
+    # Fan the shared tensors out to all members concurrently (torch releases the GIL)
+    member_probs = {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(members) or 1) as executor:
+        for name, probs in executor.map(score_member, members.items()):
+            member_probs[name] = probs
+
+    logging.info(f"Ensemble scored {len(images)} images with {len(members)} models over {len(families)} preprocessing families")
+    return member_probs
+
+def combine_probabilities(member_scores, method="mean", weights=None):
+    """Combine per-member score arrays of equal shape ([N] or [N, L]) into one ensemble array"""
+    names = list(member_scores.keys())
+    stacked = np.stack([np.asarray(member_scores[name], dtype=np.float64) for name in names], axis=0)
+
+    if method == "max":
+        return stacked.max(axis=0)
+
+    if method == "weighted":
+        w = np.array([float((weights or {}).get(name, 1.0)) for name in names])
+        if w.sum() <= 0:
+            w = np.ones(len(names))
+        w = w / w.sum()
+        return np.tensordot(w, stacked, axes=1)
+
+    return stacked.mean(axis=0)
+
+def ensemble_bias_report(member_scores, ensemble_scores, genders, member_thresholds, ensemble_threshold):
+    """Compare per-gender detection rates of the ensemble against each member"""
+    genders = np.asarray(genders)
+    is_female = genders == "F"
+    is_male = genders == "M"
+
+    def detection_rates(scores, threshold):
+        detected = np.asarray(scores) >= threshold
+        rate_F = detected[is_female].mean() if is_female.any() else 0.0
+        rate_M = detected[is_male].mean() if is_male.any() else 0.0
+        return rate_F, rate_M
+
+    rows = []
+    for name, scores in member_scores.items():
+        rate_F, rate_M = detection_rates(scores, member_thresholds.get(name, 0.5))
+        rows.append({"Model": name, "Female Rate": rate_F, "Male Rate": rate_M, "Bias Difference": abs(rate_F - rate_M)})
+
+    rate_F, rate_M = detection_rates(ensemble_scores, ensemble_threshold)
+    rows.append({"Model": "Ensemble", "Female Rate": rate_F, "Male Rate": rate_M, "Bias Difference": abs(rate_F - rate_M)})
+
+    return rows
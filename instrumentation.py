@@ -0,0 +1,143 @@
+"""Lightweight span timing for hot paths, with percentile summaries and exporters.
+
+Spans are recorded into fixed-size ring buffers, one per span name and shared
+by the whole process, so memory stays bounded under load and percentiles
+reflect the most recent calls. Summaries can be exported as JSON or as
+Prometheus text, and optionally served over a local HTTP endpoint.
+"""
+
+import functools
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+QUANTILES = [0.5, 0.95, 0.99]
+
+class LatencyHistogram:
+    """Ring buffer of the last `capacity` durations plus lifetime count, sum and max"""
+
+    def __init__(self, capacity=2048):
+        self._samples = np.zeros(capacity, dtype=np.float64)
+        self._next = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self._samples[self._next] = seconds
+        self._next = (self._next + 1) % len(self._samples)
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def samples(self):
+        return self._samples[:min(self.count, len(self._samples))]
+
+    def summary(self):
+        recent = self.samples()
+        quantiles = np.quantile(recent, QUANTILES) if len(recent) else [float("nan")] * len(QUANTILES)
+        return {
+            "count": self.count,
+            "total_s": self.total,
+            "mean_s": self.total / self.count if self.count else float("nan"),
+            "max_s": self.max,
+            **{f"p{int(q * 100)}_s": float(value) for q, value in zip(QUANTILES, quantiles)},
+        }
+
+class SpanRegistry:
+    """Thread-safe collection of latency histograms keyed by span name"""
+
+    def __init__(self, capacity=2048):
+        self.capacity = capacity
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram(self.capacity)
+            histogram.record(seconds)
+
+    @contextmanager
+    def span(self, name):
+        """Time the enclosed block (also when it raises)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name=None):
+        """Decorator recording every call of a function as a span"""
+        def decorator(func):
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self):
+        """{span name: summary dict}, sorted by name"""
+        with self._lock:
+            return {name: self._histograms[name].summary() for name in sorted(self._histograms)}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def to_json(self):
+        return json.dumps(self.summary(), indent=2)
+
+    def to_prometheus(self, metric="app_span_seconds"):
+        """Prometheus text exposition: one summary metric labeled by span"""
+        lines = [f"# HELP {metric} Duration of instrumented spans (quantiles over recent calls).",
+                 f"# TYPE {metric} summary"]
+        for name, stats in self.summary().items():
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            for q in QUANTILES:
+                lines.append(f'{metric}{{span="{label}",quantile="{q}"}} {stats[f"p{int(q * 100)}_s"]:.6f}')
+            lines.append(f'{metric}_sum{{span="{label}"}} {stats["total_s"]:.6f}')
+            lines.append(f'{metric}_count{{span="{label}"}} {stats["count"]}')
+        return "\n".join(lines) + "\n"
+
+# Process-wide registry used by the app
+REGISTRY = SpanRegistry()
+span = REGISTRY.span
+timed = REGISTRY.timed
+
+# ------------------------- HTTP EXPORT -------------------------
+def start_metrics_server(port, host="127.0.0.1", registry=REGISTRY):
+    """Serve /metrics (Prometheus text) and /metrics.json on a daemon thread; returns the server"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                body, content_type = registry.to_json(), "application/json"
+            elif self.path.startswith("/metrics"):
+                body, content_type = registry.to_prometheus(), "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            payload = body.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-server").start()
+    logging.info(f"Serving span metrics on http://{host}:{port}/metrics")
+    return server
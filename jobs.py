@@ -0,0 +1,219 @@
+"""Background batch jobs with persistent progress and resumable checkpoints.
+
+A job is a list of input files processed in fixed-size chunks by a worker
+thread. Inputs, job state and one checkpoint per finished chunk live under
+`<root>/<job id>/`, so a job keeps running across Streamlit reruns, can be
+polled from any session, and resumes at its last checkpoint after a restart.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from inference import forward_probabilities, get_preprocessing_family, load_image_and_hash, preprocess_batch
+
+JOB_STATUSES = ["queued", "running", "done", "failed", "cancelled", "interrupted"]
+
+# Jobs in these states are not running and will not start by themselves
+FINISHED_STATUSES = {"done", "failed", "cancelled", "interrupted"}
+
+def write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+class JobQueue:
+    """Local worker pool running chunked jobs; state is persisted after every chunk.
+
+    `task(paths, params)` processes one chunk of input files and returns a
+    dict of equal-length arrays, which is saved as that chunk's checkpoint.
+    """
+
+    def __init__(self, root, max_workers=1):
+        self.root = root
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._cancel_flags = {}
+        os.makedirs(root, exist_ok=True)
+
+        # Jobs left queued or running by a previous process can only be resumed explicitly
+        for job in self.jobs():
+            if job["status"] in ("queued", "running"):
+                job["status"] = "interrupted"
+                self._save(job)
+
+    def _job_dir(self, job_id):
+        return os.path.join(self.root, job_id)
+
+    def _save(self, job):
+        with self._lock:
+            write_json_atomic(os.path.join(self._job_dir(job["id"]), "job.json"), job)
+
+    def get(self, job_id):
+        """Current state of a job, or None"""
+        path = os.path.join(self._job_dir(job_id), "job.json")
+        if not os.path.exists(path):
+            return None
+        with self._lock, open(path) as f:
+            return json.load(f)
+
+    def jobs(self):
+        """All jobs, newest first"""
+        found = []
+        for job_id in os.listdir(self.root):
+            job = self.get(job_id)
+            if job is not None:
+                found.append(job)
+        return sorted(found, key=lambda job: job["created"], reverse=True)
+
+    def submit(self, kind, files, task, params=None, chunk_size=32, metadata=None):
+        """Persist input files and queue a job; returns its id.
+
+        `files` are (name, bytes) pairs; `metadata` maps column names to one
+        value per file and is kept with the job for building its results.
+        """
+        job_id = uuid.uuid4().hex[:12]
+        input_dir = os.path.join(self._job_dir(job_id), "inputs")
+        os.makedirs(input_dir)
+
+        names = []
+        for i, (name, data) in enumerate(files):
+            names.append(name)
+            with open(os.path.join(input_dir, f"{i:06d}_{os.path.basename(name)}"), "wb") as f:
+                f.write(data)
+
+        job = {
+            "id": job_id,
+            "kind": kind,
+            "status": "queued",
+            "names": names,
+            "metadata": metadata or {},
+            "params": params or {},
+            "chunk_size": chunk_size,
+            "total": len(names),
+            "done": 0,
+            "chunks_done": [],
+            "created": time.time(),
+            "started": None,
+            "finished": None,
+            "error": None,
+        }
+        self._save(job)
+        self._enqueue(job, task)
+        logging.info(f"Queued {kind} job {job_id} with {len(names)} inputs")
+        return job_id
+
+    def resume(self, job_id, task):
+        """Re-queue an interrupted, failed or cancelled job; finished chunks are skipped"""
+        job = self.get(job_id)
+        if job is None or job["status"] not in FINISHED_STATUSES - {"done"}:
+            return False
+        job["status"], job["error"] = "queued", None
+        self._save(job)
+        self._enqueue(job, task)
+        return True
+
+    def cancel(self, job_id):
+        """Ask a queued or running job to stop after its current chunk"""
+        flag = self._cancel_flags.get(job_id)
+        if flag is not None:
+            flag.set()
+
+    def _enqueue(self, job, task):
+        self._cancel_flags[job["id"]] = threading.Event()
+        self._executor.submit(self._run, job["id"], task)
+
+    def _input_paths(self, job):
+        input_dir = os.path.join(self._job_dir(job["id"]), "inputs")
+        return [os.path.join(input_dir, f"{i:06d}_{os.path.basename(name)}") for i, name in enumerate(job["names"])]
+
+    def _run(self, job_id, task):
+        job = self.get(job_id)
+        cancel_flag = self._cancel_flags[job_id]
+        job["status"], job["started"] = "running", job["started"] or time.time()
+        self._save(job)
+
+        paths = self._input_paths(job)
+        chunk_size = job["chunk_size"]
+        try:
+            for chunk_index, start in enumerate(range(0, len(paths), chunk_size)):
+                if chunk_index in job["chunks_done"]:
+                    continue
+                if cancel_flag.is_set():
+                    job["status"] = "cancelled"
+                    break
+
+                outputs = task(paths[start:start + chunk_size], job["params"])
+                checkpoint = os.path.join(self._job_dir(job_id), f"chunk-{chunk_index:05d}.npz")
+                np.savez(checkpoint + ".tmp.npz", rows=np.arange(start, min(start + chunk_size, len(paths))), **outputs)
+                os.replace(checkpoint + ".tmp.npz", checkpoint)
+
+                job["chunks_done"].append(chunk_index)
+                job["done"] = min(job["done"] + chunk_size, job["total"])
+                self._save(job)
+            else:
+                job["status"] = "done"
+        except Exception as e:
+            logging.error(f"Job {job_id} failed", exc_info=True)
+            job["status"], job["error"] = "failed", str(e)
+
+        job["finished"] = time.time()
+        self._save(job)
+        self._cancel_flags.pop(job_id, None)
+
+    def results(self, job_id):
+        """Concatenate the checkpoints of a job in input order (partial for unfinished jobs)"""
+        job = self.get(job_id)
+        chunks = []
+        for chunk_index in sorted(job["chunks_done"]):
+            with np.load(os.path.join(self._job_dir(job_id), f"chunk-{chunk_index:05d}.npz")) as data:
+                chunks.append({key: data[key] for key in data.files})
+        if not chunks:
+            return {}
+        return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+# ------------------------- BATCH PREDICTION TASK -------------------------
+def prediction_task(model, model_name, source, device, warehouse=None, weights_version=None,
+                    preprocessing_version=None, label_names=None, batch_size=16):
+    """Build a job task that scores image files with one model.
+
+    Images already in the results warehouse under the same weights and
+    preprocessing versions are not scored again. Each chunk returns the image
+    hashes, raw probabilities and whether they came from the warehouse.
+    """
+    family = get_preprocessing_family(source)
+
+    def run(paths, params):
+        images, hashes = map(list, zip(*[load_image_and_hash(path) for path in paths]))
+
+        stored = {}
+        if warehouse is not None:
+            stored = warehouse.fetch(hashes, model_name, weights_version, preprocessing_version)
+            stored = {key: probs for key, (labels, probs) in stored.items() if labels == label_names}
+
+        missing = [i for i, key_hash in enumerate(hashes) if key_hash not in stored]
+        probabilities = [None] * len(images)
+        if missing:
+            scored = forward_probabilities(model, preprocess_batch([images[i] for i in missing], family), device,
+                                           batch_size)
+            for i, probs in zip(missing, scored):
+                probabilities[i] = probs
+        for i, key_hash in enumerate(hashes):
+            if key_hash in stored:
+                probabilities[i] = stored[key_hash]
+
+        return {
+            "hashes": np.asarray(hashes),
+            "probabilities": np.stack(probabilities).astype(np.float32),
+            "from_warehouse": np.array([key_hash in stored for key_hash in hashes]),
+        }
+
+    return run
@@ -0,0 +1,89 @@
+"""Alignment between model output labels and the dataset's disease labels.
+
+TorchXRayVision models emit `xrv.datasets.default_pathologies` names while the
+dataset uses whatever strings its CSV contains ("Pleural Effusion",
+"effusion", "Pleural_Thickening", ...). A LabelAlignment resolves both
+vocabularies to canonical names once and keeps the result as a
+[model outputs x dataset labels] matrix, so whole probability batches are
+re-expressed in dataset labels with a single matrix product.
+"""
+
+import re
+
+import numpy as np
+
+# Canonical pathology -> alternative spellings seen in public chest X-ray datasets
+PATHOLOGY_SYNONYMS = {
+    "atelectasis": ["atelectases"],
+    "cardiomegaly": ["enlarged heart", "cardiac enlargement"],
+    "consolidation": ["consolidations"],
+    "edema": ["pulmonary edema", "oedema", "pulmonary oedema"],
+    "effusion": ["pleural effusion", "pleural effusions", "effusions"],
+    "emphysema": [],
+    "enlarged cardiomediastinum": ["widened mediastinum", "enlarged mediastinum"],
+    "fibrosis": ["pulmonary fibrosis"],
+    "fracture": ["fractures", "rib fracture"],
+    "hernia": ["hiatal hernia"],
+    "infiltration": ["infiltrate", "infiltrates"],
+    "lung lesion": ["lesion", "lung lesions"],
+    "lung opacity": ["opacity", "airspace opacity", "lung opacities"],
+    "mass": ["masses", "lung mass"],
+    "nodule": ["nodules", "lung nodule", "pulmonary nodule"],
+    "pleural thickening": ["pleural_thickening", "pleural other"],
+    "pneumonia": [],
+    "pneumothorax": [],
+    "no finding": ["no disease", "normal", "no findings"],
+}
+
+def normalize_label(name):
+    """Case- and separator-insensitive form of a label ("Pleural_Thickening" -> "pleural thickening")"""
+    return re.sub(r"\s+", " ", re.sub(r"[_\-/]+", " ", str(name))).strip().lower()
+
+def build_synonym_index(synonyms=PATHOLOGY_SYNONYMS):
+    """Map every normalized spelling to its canonical pathology"""
+    index = {}
+    for canonical, alternatives in synonyms.items():
+        canonical = normalize_label(canonical)
+        index[canonical] = canonical
+        for alternative in alternatives:
+            index[normalize_label(alternative)] = canonical
+    return index
+
+SYNONYM_INDEX = build_synonym_index()
+
+def canonical_label(name, synonym_index=SYNONYM_INDEX):
+    """Canonical pathology for a label; unknown labels keep their normalized spelling"""
+    normalized = normalize_label(name)
+    return synonym_index.get(normalized, normalized)
+
+class LabelAlignment:
+    """Precomputed mapping from a model's output indices to dataset labels.
+
+    `matrix[i, j]` is the weight of model output i in dataset label j. Each
+    dataset label averages the model outputs that resolve to the same
+    canonical pathology; dataset labels no output maps to are dropped.
+    """
+
+    def __init__(self, model_labels, dataset_labels, synonym_index=SYNONYM_INDEX):
+        self.model_labels = list(model_labels)
+        model_canonical = np.array([canonical_label(label, synonym_index) for label in self.model_labels], dtype=object)
+        dataset_canonical = np.array([canonical_label(label, synonym_index) for label in dataset_labels], dtype=object)
+
+        matches = model_canonical[:, None] == dataset_canonical[None, :]
+        mapped = matches.any(axis=0)
+        self.labels = [label for label, keep in zip(dataset_labels, mapped) if keep]
+
+        matches = matches[:, mapped].astype(np.float32)
+        self.matrix = matches / np.maximum(matches.sum(axis=0, keepdims=True), 1)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def apply(self, probabilities):
+        """Re-express a [N, C_model] probability matrix as [N, C_dataset]"""
+        return np.asarray(probabilities, dtype=np.float32) @ self.matrix
+
+    def pairs(self):
+        """(model label, dataset label) pairs of the mapping, for display"""
+        rows, columns = np.nonzero(self.matrix)
+        return [(self.model_labels[i], self.labels[j]) for i, j in zip(rows, columns)]
@@ -0,0 +1,268 @@
+"""Per-session memory accounting and cache eviction.
+
+Streamlit keeps everything in st.session_state alive for the life of a
+session: loaded models, the dataset and results DataFrames, feature and
+saliency caches. This module estimates the bytes a session holds per
+category, keeps the latest totals of every session for the performance page,
+optionally traces Python allocations with tracemalloc, and evicts caches
+when a session goes over its memory budget.
+
+torch and matplotlib are only inspected when they are already imported, so
+accounting a session that never opened an ML page stays cheap.
+"""
+
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+CATEGORIES = ["models", "tensors", "dataframes", "arrays", "caches", "figures", "other"]
+
+# Session keys holding rebuildable caches, cheapest to rebuild first: calibrations reload from
+# disk, saliency maps and features cost one pass over an image, and saliency aggregates need a
+# pass over a whole dataset, so they go last
+EVICTION_ORDER = ["calibrations", "saliency_cache", "feature_cache", "saliency_aggregates"]
+
+# Over the soft limit caches are evicted; over the hard limit loaded models are dropped too
+# (load_model reloads them on the next prediction)
+SOFT_LIMIT_BYTES = int(os.environ.get("SESSION_MEMORY_SOFT_MB", 1024)) * 2**20
+HARD_LIMIT_BYTES = int(os.environ.get("SESSION_MEMORY_HARD_MB", 3072)) * 2**20
+
+# Deep DataFrame sizes are not free (~0.5s for a 1M-row dataset), so sessions are checked periodically
+CHECK_INTERVAL_SECONDS = 30
+
+def format_bytes(nbytes):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(nbytes) < 1024 or unit == "GB":
+            return f"{nbytes:.0f} {unit}" if unit == "B" else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+
+# ------------------------- OBJECT SIZES -------------------------
+def module_nbytes(module):
+    """Bytes of a torch module's parameters and buffers"""
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(tensor.element_size() * tensor.nelement() for tensor in tensors)
+
+def figure_nbytes(figure):
+    """Approximate bytes of a matplotlib figure: its RGBA canvas at the figure's dpi"""
+    width, height = figure.get_size_inches() * figure.dpi
+    return int(width * height * 4)
+
+def account(obj, seen):
+    """Bytes held by `obj` per category, following containers; objects already in `seen` count once"""
+    if id(obj) in seen:
+        return Counter()
+    seen.add(id(obj))
+
+    torch = sys.modules.get("torch")
+    matplotlib_figure = sys.modules.get("matplotlib.figure")
+
+    if isinstance(obj, pd.DataFrame):
+        return Counter(dataframes=int(obj.memory_usage(deep=True).sum()))
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return Counter(dataframes=int(obj.memory_usage(deep=True)))
+    if isinstance(obj, np.ndarray):
+        return Counter(arrays=obj.nbytes)
+    if torch is not None and isinstance(obj, torch.Tensor):
+        return Counter(tensors=obj.element_size() * obj.nelement())
+    if torch is not None and isinstance(obj, torch.nn.Module):
+        return Counter(models=module_nbytes(obj))
+    if matplotlib_figure is not None and isinstance(obj, matplotlib_figure.Figure):
+        return Counter(figures=figure_nbytes(obj))
+
+    # FeatureCache, SaliencyCache, ProbabilityStore, ... report their own size
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, (int, np.integer)):
+        return Counter(caches=int(nbytes))
+
+    if isinstance(obj, dict):
+        totals = Counter(other=sys.getsizeof(obj))
+        for key, value in obj.items():
+            totals.update(account(key, seen))
+            totals.update(account(value, seen))
+        return totals
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        totals = Counter(other=sys.getsizeof(obj))
+        for value in obj:
+            totals.update(account(value, seen))
+        return totals
+    return Counter(other=sys.getsizeof(obj))
+
+def estimate_nbytes(obj):
+    """Approximate total bytes held by an object"""
+    return sum(account(obj, set()).values())
+
+def session_footprint(state):
+    """One row per session-state key: its dominant category and bytes, largest first"""
+    seen = set()
+    rows = []
+    for key in list(state.keys()):
+        totals = account(state[key], seen)
+        nbytes = sum(totals.values())
+        category = max(totals, key=totals.get) if nbytes else "other"
+        rows.append({"key": key, "category": category, "bytes": nbytes})
+    footprint = pd.DataFrame(rows, columns=["key", "category", "bytes"])
+    return footprint.sort_values("bytes", ascending=False, ignore_index=True)
+
+def category_totals(footprint):
+    """Bytes per category (every category present, in CATEGORIES order)"""
+    return footprint.groupby("category")["bytes"].sum().reindex(CATEGORIES, fill_value=0).astype(int).to_dict()
+
+# ------------------------- PROCESS-WIDE MEMORY -------------------------
+def process_rss_bytes():
+    """Resident set size of this process (Linux), or None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def live_tensor_bytes():
+    """(tensor count, bytes) of all torch tensors the garbage collector knows, deduplicated by storage"""
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return 0, 0
+
+    count = 0
+    storages = {}
+    for obj in gc.get_objects():
+        try:
+            if not isinstance(obj, torch.Tensor):
+                continue
+            storage = obj.untyped_storage()
+            storages[(storage.device.type, storage.data_ptr())] = storage.nbytes()
+            count += 1
+        except (ReferenceError, RuntimeError):
+            continue
+    return count, sum(storages.values())
+
+def open_figures():
+    """Figures still registered with pyplot by any session (never closed by the page that drew them)"""
+    helpers = sys.modules.get("matplotlib._pylab_helpers")
+    if helpers is None:
+        return []
+    # Read the registry directly: plt.figure(num) would make each figure current under other sessions
+    return [manager.canvas.figure for manager in helpers.Gcf.get_all_fig_managers()]
+
+class SessionMemoryRegistry:
+    """Latest per-category totals reported by each session, shared by the whole process"""
+
+    def __init__(self, max_age=3600):
+        self.max_age = max_age
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def report(self, session_id, totals):
+        now = time.time()
+        with self._lock:
+            self._sessions[session_id] = {"updated": now, **totals, "total": sum(totals.values())}
+            # Sessions that stopped reporting are most likely closed
+            for stale in [key for key, entry in self._sessions.items() if now - entry["updated"] > self.max_age]:
+                del self._sessions[stale]
+
+    def frame(self):
+        """One row per session, largest first"""
+        with self._lock:
+            rows = [{"session": session_id, **entry} for session_id, entry in self._sessions.items()]
+        frame = pd.DataFrame(rows, columns=["session", "updated", *CATEGORIES, "total"])
+        frame["updated"] = pd.to_datetime(frame["updated"], unit="s")
+        return frame.sort_values("total", ascending=False, ignore_index=True)
+
+SESSIONS = SessionMemoryRegistry()
+
+# ------------------------- ALLOCATION TRACING -------------------------
+class AllocationProfiler:
+    """tracemalloc on demand: top allocation sites and their growth since the previous snapshot"""
+
+    def __init__(self, nframes=1):
+        self.nframes = nframes
+        self._previous = None
+
+    @property
+    def active(self):
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.nframes)
+        self._previous = None
+
+    def stop(self):
+        tracemalloc.stop()
+        self._previous = None
+
+    def traced(self):
+        """(current, peak) bytes traced since start"""
+        return tracemalloc.get_traced_memory()
+
+    def top(self, limit=15):
+        """Largest allocation sites by line, with growth since the previous call"""
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+        if self._previous is not None:
+            stats = snapshot.compare_to(self._previous, "lineno")
+        else:
+            stats = snapshot.statistics("lineno")
+        self._previous = snapshot
+
+        rows = [{
+            "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "bytes": stat.size,
+            "blocks": stat.count,
+            "bytes_diff": getattr(stat, "size_diff", 0),
+        } for stat in stats[:limit]]
+        return pd.DataFrame(rows, columns=["location", "bytes", "blocks", "bytes_diff"])
+
+PROFILER = AllocationProfiler()
+
+# ------------------------- EVICTION -------------------------
+def evict_caches(state, target_bytes, current_bytes, include_models=False):
+    """Clear session caches cheapest-first until the session is under `target_bytes`.
+
+    Returns the (what, bytes freed) steps taken. Results, datasets and
+    retrained heads are never evicted; models only with `include_models`.
+    """
+    # Open pyplot figures are not closed here: the registry is process-wide, so they may belong to other sessions
+    steps = []
+    keys = EVICTION_ORDER + (["models_loaded"] if include_models else [])
+    for key in keys:
+        if current_bytes <= target_bytes:
+            break
+        if key not in state or not state[key]:
+            continue
+        nbytes = estimate_nbytes(state[key])
+        if not nbytes:
+            continue
+        state[key].clear()
+        current_bytes -= nbytes
+        steps.append((key, nbytes))
+
+    if steps:
+        gc.collect()
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    return steps
+
+def enforce_budget(state, session_id=None, soft_limit=SOFT_LIMIT_BYTES, hard_limit=HARD_LIMIT_BYTES):
+    """Account a session, report it to SESSIONS and evict over the limits; returns (footprint, steps)"""
+    footprint = session_footprint(state)
+    total = int(footprint["bytes"].sum())
+
+    steps = []
+    if total > soft_limit:
+        steps = evict_caches(state, soft_limit, total, include_models=total > hard_limit)
+        if steps:
+            footprint = session_footprint(state)
+
+    if session_id is not None:
+        SESSIONS.report(session_id, category_totals(footprint))
+    return footprint, steps
@@ -0,0 +1,3068 @@
+"""Data, prediction, bias analysis and mitigation pages.
+
+Everything that needs torch, torchxrayvision or the scientific stack lives
+here. app.py imports this module the first time an ML page is opened, so the
+static and dataset pages render without loading any of it.
+"""
+
+import io
+import os
+import logging
+import time
+import streamlit as st
+import pandas as pd
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+import matplotlib.pyplot as plt
+import torch
+import torch.nn as nn
+from sklearn.metrics import confusion_matrix, accuracy_score, precision_score, recall_score, f1_score
+
+# Install required packages (uncomment for first run)
+# import subprocess
+# subprocess.run(["pip", "install", "torchxrayvision"], check=True)
+import torchxrayvision as xrv
+
+from inference import (
+    ENSEMBLE_METHODS, preprocess_xrv, preprocess_imagenet, preprocess_batch, get_preprocessing_family,
+    get_preprocessing_version, image_hash, load_image, load_image_and_hash, run_ensemble, combine_probabilities,
+    ensemble_bias_report
+)
+from embeddings import (FeatureCache, EmbeddingStore, FeatureStore, get_features, head_forward, get_classifier_head,
+                        head_fingerprint, feature_cache_key, train_linear_head)
+from probes import ProbeRegistry, train_probe_from_store
+from label_alignment import LabelAlignment, canonical_label
+from jobs import JobQueue, FINISHED_STATUSES, prediction_task
+from explainability import (
+    SALIENCY_METHODS, PERTURBATION_METHODS, SaliencyCache, ExplanationService, SaliencyAggregator,
+    get_saliency_maps, accumulate_saliency, render_overlay, render_attribution, render_heatmap
+)
+from data_profile import box_plot_stats, error_type_counts, DemographicIndex, AGE_GROUP_DTYPE, age_groups
+from data_pages import init_data_state, new_results_version, box_plot_figure
+from fairness import (SUBGROUP_DIMENSIONS, HIGHER_IS_BETTER, intersectional_metrics, rank_worst_subgroups,
+                      label_matrix, label_vocabulary, pathology_group_rates, pathology_gaps,
+                      disease_scores, binary_curves, group_curves, operating_point,
+                      FAIRNESS_CONSTRAINTS, EqualizedOddsPostprocessor, reweighing_weights, rebalanced_bootstrap)
+from results_store import ProbabilityStore, ResultsWarehouse
+from instrumentation import span, timed
+from calibration import CALIBRATION_METHODS, CalibrationSet, reliability_table, expected_calibration_error
+
+# ------------------------- MODEL CONFIGURATIONS -------------------------
+MODELS = {
+    "DenseNet121": {
+        "source": "pytorch_hub",
+        "name": "densenet121",
+        "pretrained": True,
+        "classes": 14,
+        "description": "DenseNet architecture pre-trained on ImageNet and adapted for chest X-ray analysis"
+    },
+    "ResNet50": {
+        "source": "pytorch_hub",
+        "name": "resnet50",
+        "pretrained": True,
+        "classes": 14,
+        "description": "Residual network architecture pre-trained on ImageNet and adapted for chest X-ray analysis"
+    },
+    "CheXpert": {
+        "source": "torchxrayvision",
+        "name": "densenet121-res224-chex",
+        "classes": 14,
+        "description": "DenseNet121 architecture specifically trained on the CheXpert dataset from Stanford"
+    },
+    "MIMIC-CXR": {
+        "source": "torchxrayvision",
+        "name": "densenet121-res224-mimic_nb",
+        "classes": 14,
+        "description": "DenseNet121 architecture trained on the MIMIC-CXR dataset from MIT"
+    }
+}
+
+# Directory holding the persistent per-model embedding indexes
+EMBEDDING_STORE_DIR = "embedding_store"
+
+# Directory holding persisted LIME/KernelSHAP explanations
+EXPLANATION_CACHE_DIR = "explanation_cache"
+
+# Directory holding fitted per-group probability calibrators
+CALIBRATION_DIR = "calibration"
+
+# Directories holding labeled backbone features and versioned linear-probe heads
+PROBE_FEATURE_DIR = "probe_features"
+PROBE_HEAD_DIR = "probe_heads"
+
+# SQLite file persisting scored predictions across sessions
+RESULTS_WAREHOUSE_PATH = "results_warehouse.sqlite"
+
+# Directory holding background job inputs, state and checkpoints
+JOB_DIR = "jobs"
+
+# ------------------------- GLOBAL SESSION STATE -------------------------
+def init_session_state():
+    """Create the session-state entries the ML pages rely on (once per session)"""
+    init_data_state()
+    if "models_loaded" not in st.session_state:
+        st.session_state.models_loaded = {}
+    if "device" not in st.session_state:
+        st.session_state.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    if "debug_mode" not in st.session_state:
+        st.session_state.debug_mode = False
+    if "feature_cache" not in st.session_state:
+        st.session_state.feature_cache = FeatureCache()
+    if "saliency_cache" not in st.session_state:
+        st.session_state.saliency_cache = SaliencyCache()
+    if "saliency_aggregates" not in st.session_state:
+        st.session_state.saliency_aggregates = {}
+    if "probability_store" not in st.session_state:
+        st.session_state.probability_store = ProbabilityStore()
+    if "calibrations" not in st.session_state:
+        st.session_state.calibrations = {}
+    if "apply_calibration" not in st.session_state:
+        st.session_state.apply_calibration = False
+    if "reweighed_heads" not in st.session_state:
+        st.session_state.reweighed_heads = {}
+    if "submitted_jobs" not in st.session_state:
+        st.session_state.submitted_jobs = []
+    if "imported_jobs" not in st.session_state:
+        st.session_state.imported_jobs = set()
+
+# ------------------------- MODEL & HELPER FUNCTIONS -------------------------
+def load_model(model_name):
+    """Load the specified model from reliable sources with correct configuration"""
+    if model_name in st.session_state.models_loaded:
+        return st.session_state.models_loaded[model_name]
+
+    with span("load_model"):
+        try:
+            model_info = MODELS[model_name]
+
+            with st.spinner(f"Loading {model_name} model..."):
+                # Load pre-trained model from PyTorch Hub
+                if model_info["source"] == "pytorch_hub":
+                    base_model = torch.hub.load('pytorch/vision:v0.10.0',
+                                               model_info["name"],
+                                               pretrained=model_info["pretrained"])
+
+                    # Modify the classifier for chest X-ray tasks
+                    if model_name == "DenseNet121":
+                        num_ftrs = base_model.classifier.in_features
+                        base_model.classifier = nn.Linear(num_ftrs, model_info["classes"])
+                    elif model_name == "ResNet50":
+                        num_ftrs = base_model.fc.in_features
+                        base_model.fc = nn.Linear(num_ftrs, model_info["classes"])
+
+                    # Use the newest trained linear-probe head instead of the random one, if there is one
+                    manifest = get_probe_registry().load_into(model_name, get_classifier_head(base_model))
+                    if manifest is not None:
+                        st.session_state[f"{model_name}_labels"] = manifest["labels"]
+                        st.info(f"Using trained probe head v{manifest['version']} for {model_name}")
+
+                    # Move model to appropriate device
+                    model = base_model.to(st.session_state.device)
+                    model.eval()
+
+                    st.session_state.models_loaded[model_name] = model
+                    st.success(f"✅ {model_name} loaded successfully!")
+                    return model
+
+                # Load pre-trained model from TorchXRayVision
+                elif model_info["source"] == "torchxrayvision":
+                    # Display available models for debugging
+                    if st.session_state.debug_mode:
+                        st.write("Available TorchXRayVision models:", xrv.models.available_models())
+
+                    try:
+                        # Load the model with proper initialization
+                        model = xrv.models.DenseNet(weights=model_info["name"])
+
+                        if st.session_state.debug_mode:
+                            st.write(f"Model expects data preprocessing with xrv.datasets.normalize(img, maxval=255)")
+
+                        # Set model to evaluation mode
+                        model = model.to(st.session_state.device)
+                        model.eval()
+
+                        # Store pathology labels
+                        pathologies = xrv.datasets.default_pathologies
+                        if st.session_state.debug_mode:
+                            st.write(f"Model can predict these pathologies: {pathologies}")
+
+                        # Store in session state
+                        st.session_state.models_loaded[model_name] = model
+                        st.session_state[f"{model_name}_pathologies"] = pathologies
+
+                        st.success(f"✅ {model_name} loaded successfully!")
+                        return model
+                    except Exception as e:
+                        st.error(f"Error in primary loading method: {e}")
+                        st.warning("Attempting alternative loading method...")
+
+                        # Fallback method with explicit parameters
+                        model = xrv.models.DenseNet(weights=model_info["name"])
+                        model = model.to(st.session_state.device)
+                        model.eval()
+
+                        st.session_state.models_loaded[model_name] = model
+                        st.success(f"✅ {model_name} loaded with alternative method!")
+                        return model
+
+        except Exception as e:
+            logging.error(f"Error loading {model_name} model", exc_info=True)
+            st.error(f"🚨 Error loading {model_name} model: {e}")
+            return None
+
+@timed("preprocess_image")
+def preprocess_image(image, model_name):
+    """Preprocess image for model input based on model type"""
+    # Different preprocessing depending on model source
+    if model_name in MODELS and MODELS[model_name]["source"] == "torchxrayvision":
+        # For TorchXRayVision models (CheXpert, MIMIC-CXR)
+        return preprocess_xrv(image)
+
+    # For PyTorch Hub models (DenseNet121, ResNet50), which expect 3 channels (RGB)
+    return preprocess_imagenet(image)
+
+def get_model_calibrated_threshold(model_name):
+    """Return appropriate threshold for specific models based on their calibration"""
+    # Model-specific thresholds based on typical calibration
+    if model_name == "CheXpert":
+        return 0.35  # Lower threshold for CheXpert
+    elif model_name == "MIMIC-CXR":
+        return 0.30  # Lower threshold for MIMIC-CXR
+    else:
+        return 0.5   # Standard threshold for other models
+
+@timed("predict_probabilities")
+def predict_probabilities(image, model_name):
+    """Return (label names, [C] probability array) for an image over all of a model's outputs"""
+    model = st.session_state.models_loaded[model_name]
+
+    # Pooled trunk features are cached per image, so re-scoring the same image
+    # (e.g. at several thresholds) only runs the classifier head
+    features = get_features(
+        [image], model_name, model, MODELS[model_name]["source"],
+        st.session_state.device, st.session_state.feature_cache
+    )
+    features = torch.from_numpy(features).to(st.session_state.device)
+
+    with torch.no_grad(), span("model_forward.head"):
+        # Forward pass through the model head and apply sigmoid to get probabilities
+        probs = torch.sigmoid(head_forward(model, features))[0].cpu().numpy()
+
+    return get_model_label_names(model_name), probs
+
+@st.cache_resource(max_entries=32)
+def get_label_alignment(model_labels, dataset_labels):
+    """Build the model-output -> dataset-label mapping matrix once per pair of vocabularies"""
+    return LabelAlignment(model_labels, dataset_labels)
+
+def align_probabilities(label_names, probs):
+    """Re-express a [N, C] model probability matrix in the dataset's disease labels.
+
+    Falls back to the model's own labels when no output maps onto the dataset.
+    """
+    if not st.session_state.disease_classes:
+        return label_names, probs
+    alignment = get_label_alignment(tuple(label_names), tuple(st.session_state.disease_classes))
+    if not len(alignment):
+        return label_names, probs
+    return alignment.labels, alignment.apply(probs)
+
+def ensemble_disease_probabilities(member_probs):
+    """Re-express member probabilities over the dataset disease labels every member maps to.
+
+    Returns (labels, {model name: [N, L] array}). "No Disease" outputs are
+    dropped, since a confident "No Disease" is not a disease score.
+    """
+    aligned = {name: align_probabilities(get_model_label_names(name), probs) for name, probs in member_probs.items()}
+    first_labels = next(iter(aligned.values()))[0]
+    labels = [label for label in first_labels if canonical_label(label) != canonical_label("No Disease")
+              and all(label in list(member_labels) for member_labels, _ in aligned.values())]
+    matrices = {}
+    for name, (member_labels, probs) in aligned.items():
+        columns = [list(member_labels).index(label) for label in labels]
+        matrices[name] = np.asarray(probs)[:, columns]
+    return labels, matrices
+
+def top_label(label_names, probs, threshold):
+    """Collapse a probability vector to (predicted label, confidence) at a threshold"""
+    top_idx = int(np.argmax(probs))
+    top_prob = float(probs[top_idx])
+
+    # Apply threshold to determine if we should predict this disease
+    if top_prob >= threshold:
+        return label_names[top_idx], top_prob
+    return "No Disease", 1.0 - top_prob  # Confidence in "No Disease"
+
+def get_calibration(model_name):
+    """Return the fitted calibration set of a model (loaded from disk once), or None"""
+    calibrations = st.session_state.calibrations
+    if model_name not in calibrations:
+        calibrations[model_name] = CalibrationSet.load(CALIBRATION_DIR, model_name)
+    return calibrations[model_name]
+
+def calibrate_probabilities(model_name, label_names, probs, genders):
+    """Apply the model's per-gender calibrators to a [N, C] probability matrix when enabled"""
+    calibration = get_calibration(model_name) if st.session_state.apply_calibration else None
+    if calibration is None:
+        return probs
+    return calibration.apply(label_names, probs, genders)
+
+def top_labels(label_names, probs, threshold):
+    """Vectorized top_label for a [N, C] matrix: (predicted labels, confidences)"""
+    top_idx = np.argmax(probs, axis=1)
+    top_prob = probs[np.arange(len(probs)), top_idx].astype(np.float64)
+    positive = top_prob >= threshold
+    labels = np.where(positive, np.asarray(label_names, dtype=object)[top_idx], "No Disease")
+    return labels, np.where(positive, top_prob, 1.0 - top_prob)
+
+def disease_positive(label_names, probs, threshold):
+    """Vectorized top_label for a [N, C] matrix: whether each row's top-1 label is a disease"""
+    label_names, probs = align_probabilities(label_names, probs)
+    top_idx = np.argmax(probs, axis=1)
+    is_disease = np.asarray(label_names, dtype=object)[top_idx] != "No Disease"
+    return (probs[np.arange(len(probs)), top_idx] >= threshold) & is_disease
+
+def predict_disease(image, model_name, threshold=None):
+    """Predict disease from image using specified model with proper calibration"""
+    if model_name not in st.session_state.models_loaded:
+        st.error(f"Model {model_name} not loaded. Please load it first.")
+        return None, None
+
+    # Use model-specific calibrated threshold if not explicitly provided
+    if threshold is None:
+        threshold = get_model_calibrated_threshold(model_name)
+
+    label_names, probs = predict_probabilities(image, model_name)
+    aligned_labels, aligned = align_probabilities(label_names, probs[None, :])
+    predicted_label, confidence = top_label(aligned_labels, aligned[0], threshold)
+
+    # Optional debug information
+    if st.session_state.get('debug_mode', False) and MODELS[model_name]["source"] == "torchxrayvision":
+        st.write("### Top 5 Disease Probabilities")
+        for idx in np.argsort(-probs)[:5]:
+            st.write(f"{label_names[idx]}: {probs[idx]:.4f}")
+        st.write(f"Using threshold: {threshold}")
+
+    return predicted_label, confidence
+
+@st.cache_resource
+def get_explanation_service():
+    """Return the shared LIME/KernelSHAP explanation service"""
+    return ExplanationService(EXPLANATION_CACHE_DIR)
+
+def embedding_store_exists(model_name):
+    """Check whether an embedding index has been recorded for a model"""
+    return os.path.exists(os.path.join(EMBEDDING_STORE_DIR, model_name, "meta.json"))
+
+@st.cache_resource
+def get_embedding_store(model_name, _dim=None):
+    """Open the persistent embedding index for a model (one instance per model, shared across sessions)"""
+    return EmbeddingStore(os.path.join(EMBEDDING_STORE_DIR, model_name), _dim)
+
+def record_embeddings(model_name, images, image_ids, genders):
+    """Add the cached pooled features of scored images to the model's embedding index"""
+    try:
+        cache = st.session_state.feature_cache
+        cache_key = feature_cache_key(model_name, st.session_state.models_loaded[model_name])
+        hashes = [image_hash(image) for image in images]
+        rows = [(key_hash, cache.get(key_hash, cache_key)) for key_hash in hashes]
+        rows = [(i, key_hash, features) for i, (key_hash, features) in enumerate(rows) if features is not None]
+        if not rows:
+            return
+
+        features = np.stack([features for _, _, features in rows])
+        store = get_embedding_store(model_name, features.shape[1])
+        store.add(
+            features,
+            [image_ids[i] for i, _, _ in rows],
+            [genders[i] for i, _, _ in rows],
+            [key_hash for _, key_hash, _ in rows]
+        )
+
+        # Switch large indexes from brute force to IVF search
+        if len(store) >= 20000 and store.centroids is None:
+            store.build_ivf()
+    except Exception as e:
+        logging.error(f"Error recording embeddings for {model_name}", exc_info=True)
+
+@st.cache_resource
+def get_probe_registry():
+    """Return the registry of versioned linear-probe heads"""
+    return ProbeRegistry(PROBE_HEAD_DIR)
+
+@st.cache_resource
+def get_feature_store(model_name, _dim=None):
+    """Open the persistent labeled feature store used to train a model's probe head (one instance per model)"""
+    return FeatureStore(os.path.join(PROBE_FEATURE_DIR, model_name), _dim)
+
+def feature_store_exists(model_name):
+    """Check whether labeled features have been extracted for a model"""
+    return os.path.exists(os.path.join(PROBE_FEATURE_DIR, model_name, "meta.json"))
+
+def extract_probe_features(model_name, uploaded_files, batch_size=16):
+    """Extract pooled features of labeled images into the model's feature store.
+
+    Images already in the store are skipped by hash; their labels are refreshed
+    from the current dataset. Returns the number of new feature vectors.
+    """
+    model = st.session_state.models_loaded[model_name]
+    demographics = lookup_image_demographics([f.name for f in uploaded_files])
+    labeled = np.flatnonzero((demographics["Actual"] != "Unknown").to_numpy())
+    if not len(labeled):
+        return 0
+
+    added = 0
+    progress_bar = st.progress(0)
+    for start in range(0, len(labeled), batch_size):
+        chunk = labeled[start:start + batch_size]
+        images, hashes = map(list, zip(*[load_image_and_hash(uploaded_files[i]) for i in chunk]))
+        labels = demographics["Actual"].to_numpy()[chunk]
+        genders = demographics["Gender"].to_numpy()[chunk]
+
+        store = get_feature_store(model_name) if feature_store_exists(model_name) else None
+        missing = [j for j, key_hash in enumerate(hashes) if store is None or not store.contains(key_hash)]
+        if missing:
+            features = get_features([images[j] for j in missing], model_name, model, MODELS[model_name]["source"],
+                                    st.session_state.device, st.session_state.feature_cache,
+                                    hashes=[hashes[j] for j in missing])
+            store = store or get_feature_store(model_name, features.shape[1])
+            added += store.add(features, [uploaded_files[chunk[j]].name for j in missing],
+                               genders[missing], [hashes[j] for j in missing], labels=labels[missing])
+        store.update_labels(hashes, labels, genders)
+        progress_bar.progress(min(start + batch_size, len(labeled)) / len(labeled))
+    return added
+
+def probe_training_section(model_name):
+    """Feature extraction and linear-probe training controls for an ImageNet backbone"""
+    with st.expander(f"🏋️ Train {model_name} Linear Probe Head"):
+        st.markdown(
+            f"{model_name}'s 14-way head starts untrained. Upload labeled images from the dataset to extract "
+            "backbone features once into a memory-mapped store, then train the multi-label head on them. "
+            "Each run is saved as a new head version and loaded automatically with the model."
+        )
+        registry = get_probe_registry()
+        versions = registry.versions(model_name)
+        if versions:
+            st.dataframe(pd.DataFrame([{
+                "Version": m["version"], "Created": m["created"], "Samples": m["metrics"].get("n_train"),
+                "Balanced": m.get("balanced"), "Validation AUC": m["metrics"].get("validation_auc"),
+            } for m in versions]))
+
+        probe_files = st.file_uploader("Labeled training images", type=["png", "jpg", "jpeg"],
+                                       accept_multiple_files=True, key="probe_images")
+        if probe_files and st.button("Extract Features"):
+            try:
+                with st.spinner("Extracting backbone features..."):
+                    added = extract_probe_features(model_name, probe_files)
+                st.success(f"Added {added} new feature vectors")
+            except Exception as e:
+                logging.error(f"Error extracting probe features for {model_name}", exc_info=True)
+                st.error(f"Error extracting features: {e}")
+
+        if not feature_store_exists(model_name):
+            st.info("No labeled features extracted yet.")
+            return
+
+        store = get_feature_store(model_name)
+        labels = label_vocabulary(store.meta["label"], max_labels=MODELS[model_name]["classes"])
+        st.write(f"Feature store: {len(store)} vectors, {len(labels)} pathologies")
+        if not labels:
+            st.warning("The stored labels contain no pathologies to train on.")
+            return
+
+        col1, col2 = st.columns(2)
+        with col1:
+            epochs = st.slider("Epochs", 1, 200, 30, key="probe_epochs")
+            batch_size = st.select_slider("Batch size", [32, 64, 128, 256, 512, 1024], 256, key="probe_batch")
+        with col2:
+            num_threads = st.slider("CPU threads", 1, max(os.cpu_count() or 1, 1), min(4, os.cpu_count() or 1),
+                                    key="probe_threads")
+            balanced = st.checkbox("Gender-balanced sample weights", value=True, key="probe_balanced")
+
+        if st.button("Train Probe Head"):
+            try:
+                # Pad to the head's width so the trained weights fit the model
+                labels = labels + [f"Disease_{i}" for i in range(len(labels), MODELS[model_name]["classes"])]
+                progress_bar = st.progress(0)
+                head, history, metrics = train_probe_from_store(
+                    store, labels, balanced=balanced, epochs=epochs, batch_size=batch_size, num_threads=num_threads,
+                    progress_callback=lambda epoch, total, loss: progress_bar.progress(epoch / total)
+                )
+                manifest = registry.save(model_name, head, labels, metrics, balanced=balanced, epochs=epochs,
+                                         n_features=len(store))
+
+                # Swap the new head into the loaded model right away
+                if model_name in st.session_state.models_loaded:
+                    model_head = get_classifier_head(st.session_state.models_loaded[model_name])
+                    model_head.load_state_dict(head.state_dict())
+                st.session_state[f"{model_name}_labels"] = labels
+
+                st.success(f"Saved {model_name} probe head v{manifest['version']} "
+                           f"({metrics['train_seconds']:.1f}s, validation AUC {metrics.get('validation_auc', float('nan')):.3f})")
+                st.line_chart(pd.DataFrame(history).set_index("epoch"))
+            except Exception as e:
+                logging.error(f"Error training probe head for {model_name}", exc_info=True)
+                st.error(f"Error training probe head: {e}")
+
+@st.cache_resource
+def get_job_queue():
+    """Return the background job queue shared by all sessions"""
+    return JobQueue(JOB_DIR, max_workers=1)
+
+def model_prediction_task(model_name):
+    """Job task scoring image files with a loaded model, reusing warehouse results"""
+    return prediction_task(
+        st.session_state.models_loaded[model_name], model_name, MODELS[model_name]["source"], st.session_state.device,
+        warehouse=get_results_warehouse(), weights_version=model_weights_version(model_name),
+        preprocessing_version=get_preprocessing_version(MODELS[model_name]["source"]),
+        label_names=get_model_label_names(model_name)
+    )
+
+def submit_prediction_job(model_name, uploaded_files, threshold):
+    """Queue a batch prediction job for uploaded images and return its id"""
+    demographics = lookup_image_demographics([f.name for f in uploaded_files])
+    metadata = {
+        "Actual": demographics["Actual"].astype(str).tolist(),
+        "Gender": demographics["Gender"].astype(str).tolist(),
+        "Age": demographics["Age"].astype(float).tolist(),
+    }
+    params = {
+        "model_name": model_name,
+        "threshold": threshold,
+        "label_names": get_model_label_names(model_name),
+        "weights_version": model_weights_version(model_name),
+        "preprocessing_version": get_preprocessing_version(MODELS[model_name]["source"]),
+    }
+    job_id = get_job_queue().submit("prediction", [(f.name, f.getvalue()) for f in uploaded_files],
+                                    model_prediction_task(model_name), params=params, metadata=metadata)
+    st.session_state.submitted_jobs.append(job_id)
+    return job_id
+
+def import_job_results(job):
+    """Add the rows of a finished prediction job to the session results; returns the number added"""
+    outputs = get_job_queue().results(job["id"])
+    if not outputs:
+        return 0
+
+    params, rows = job["params"], outputs["rows"]
+    model_name, label_names = params["model_name"], params["label_names"]
+    probs = outputs["probabilities"]
+    genders = np.asarray(job["metadata"]["Gender"], dtype=object)[rows]
+
+    # Same top-1 decision as the interactive loop: calibrate, align to dataset labels, threshold
+    with span("postprocess"):
+        calibrated = calibrate_probabilities(model_name, label_names, probs, genders)
+        aligned_labels, aligned = align_probabilities(label_names, calibrated)
+        predictions, confidences = top_labels(aligned_labels, aligned, params["threshold"])
+
+    ages = np.asarray(job["metadata"]["Age"], dtype=np.float64)[rows]
+    new_results_df = pd.DataFrame({
+        "Image_ID": np.asarray(job["names"], dtype=object)[rows],
+        "Gender": genders,
+        "Actual": np.asarray(job["metadata"]["Actual"], dtype=object)[rows],
+        "Prediction": predictions,
+        "Probability": confidences,
+        "Model": model_name,
+        "Age": ages,
+        "Age_Group": pd.Categorical(age_groups(ages), dtype=AGE_GROUP_DTYPE),
+        "Image_Hash": outputs["hashes"].astype(object),
+    })
+
+    df_results = ensure_result_demographics()
+    df_results = pd.concat([df_results, new_results_df], ignore_index=True)
+    df_results["Age_Group"] = df_results["Age_Group"].astype(AGE_GROUP_DTYPE)
+    record_probabilities(model_name, df_results.index[-len(new_results_df):], probs, label_names=label_names)
+
+    # Only rows that were actually scored are new to the warehouse
+    scored = ~outputs["from_warehouse"]
+    if scored.any():
+        try:
+            get_results_warehouse().upsert(new_results_df[scored], params["weights_version"],
+                                           params["preprocessing_version"], label_names, probs[scored])
+        except Exception as e:
+            logging.error(f"Error storing results of job {job['id']}", exc_info=True)
+
+    st.session_state.df_results = df_results
+    st.session_state.results_version = new_results_version()
+    st.session_state.imported_jobs.add(job["id"])
+    return len(new_results_df)
+
+def batch_jobs_section():
+    """Status, progress and controls of background prediction jobs"""
+    queue = get_job_queue()
+    jobs = [job for job in queue.jobs() if job["kind"] == "prediction"]
+    if not jobs:
+        return
+
+    st.markdown("### Background Prediction Jobs")
+
+    # Results of this session's jobs are added as soon as they finish
+    for job in jobs:
+        if job["id"] in st.session_state.submitted_jobs and job["status"] == "done" \
+                and job["id"] not in st.session_state.imported_jobs:
+            added = import_job_results(job)
+            st.success(f"Job {job['id']} finished: added {added} predictions to this session.")
+
+    st.dataframe(pd.DataFrame([{
+        "Job": job["id"],
+        "Model": job["params"].get("model_name"),
+        "Status": job["status"],
+        "Progress": f"{job['done']}/{job['total']}",
+        "Submitted": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(job["created"])),
+        "Mine": job["id"] in st.session_state.submitted_jobs,
+        "In Session": job["id"] in st.session_state.imported_jobs,
+        "Error": job["error"],
+    } for job in jobs]))
+
+    for job in jobs:
+        if job["status"] in ("queued", "running"):
+            st.progress(job["done"] / max(job["total"], 1), text=f"Job {job['id']}: {job['done']}/{job['total']} images")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        job_id = st.selectbox("Job:", [job["id"] for job in jobs], key="selected_job")
+    job = next(job for job in jobs if job["id"] == job_id)
+    with col2:
+        if job["status"] in ("queued", "running"):
+            if st.button("Cancel Job"):
+                queue.cancel(job_id)
+                st.info("The job stops after its current chunk.")
+        elif job["status"] in FINISHED_STATUSES - {"done"}:
+            model_name = job["params"]["model_name"]
+            if model_name not in st.session_state.models_loaded:
+                st.info(f"Load {model_name} to resume this job.")
+            elif st.button("Resume Job"):
+                queue.resume(job_id, model_prediction_task(model_name))
+                if job_id not in st.session_state.submitted_jobs:
+                    st.session_state.submitted_jobs.append(job_id)
+                st.rerun()
+        if job["done"] and job_id not in st.session_state.imported_jobs and st.button("Add Results to Session"):
+            added = import_job_results(job)
+            st.success(f"Added {added} predictions from job {job_id}.")
+
+    # Refresh on demand: sleeping before st.rerun would hold the script thread and block every other widget
+    if any(job["status"] in ("queued", "running") for job in jobs):
+        st.caption("Jobs keep running in the background; progress updates on the next interaction.")
+        if st.button("Refresh Status"):
+            st.rerun()
+
+@st.cache_resource(max_entries=4)
+def get_demographic_index(df_version, id_col, disease_col, gender_col, age_col, _df):
+    """Build the image -> label/demographics join index once per dataset version and column selection"""
+    return DemographicIndex(_df, id_col, disease_col, gender_col, age_col)
+
+def demographic_index_key():
+    """Identify the dataset version and column selection the join index is built from"""
+    return (st.session_state.df_version, st.session_state.image_id_col, st.session_state.disease_col,
+            st.session_state.gender_col, st.session_state.age_col)
+
+@timed("id_lookup")
+def lookup_image_demographics(image_names):
+    """Return Actual/Gender/Age/Age_Group rows for uploaded image names"""
+    df = st.session_state.df
+    if df is None or not st.session_state.image_id_col:
+        unknown = pd.DataFrame({"Actual": "Unknown", "Gender": "Unknown", "Age": np.nan}, index=range(len(image_names)))
+        unknown["Age_Group"] = pd.Series(np.nan, index=unknown.index).astype(AGE_GROUP_DTYPE)
+        return unknown
+
+    index = get_demographic_index(*demographic_index_key(), df)
+    return index.lookup(list(image_names))
+
+def lookup_image_metadata(image_name):
+    """Find the actual disease and gender for an uploaded image in the dataset"""
+    row = lookup_image_demographics([image_name]).iloc[0]
+    return row["Actual"], row["Gender"]
+
+def record_probabilities(model_name, row_ids, probabilities, label_names=None):
+    """Store the full probability matrix for new result rows of a model"""
+    store = st.session_state.probability_store
+    if label_names is None:
+        label_names = get_model_label_names(model_name)
+    try:
+        store.add(model_name, label_names, row_ids, probabilities)
+    except ValueError:
+        # The label space changed (e.g. new dataset classes): restart this model's matrix
+        logging.info(f"Label space of {model_name} changed, resetting its stored probabilities")
+        store.clear(model_name)
+        store.add(model_name, label_names, row_ids, probabilities)
+
+@st.cache_resource
+def get_results_warehouse():
+    """Open the SQLite results warehouse shared by all sessions"""
+    return ResultsWarehouse(RESULTS_WAREHOUSE_PATH)
+
+def model_weights_version(model_name):
+    """Identify the loaded weights of a model: architecture plus a hash of its head"""
+    model = st.session_state.models_loaded[model_name]
+    return f"{MODELS[model_name]['name']}:{head_fingerprint(model)}"
+
+def store_results(model_name, rows, probabilities):
+    """Upsert newly scored result rows and their probabilities into the warehouse"""
+    try:
+        get_results_warehouse().upsert(
+            rows, model_weights_version(model_name), get_preprocessing_version(MODELS[model_name]["source"]),
+            get_model_label_names(model_name), probabilities
+        )
+    except Exception as e:
+        logging.error(f"Error storing results for {model_name}", exc_info=True)
+
+def load_stored_results():
+    """Append warehouse rows that are not in the session yet; returns the number of rows added"""
+    stored, labels, probabilities = get_results_warehouse().results_frame()
+    df_results = ensure_result_demographics()
+
+    # One row per (image, model): the most recently scored weights version wins
+    stored = stored.drop_duplicates(["Image_Hash", "Model"], keep="last")
+    existing = pd.MultiIndex.from_frame(df_results.reindex(columns=["Image_Hash", "Model"]).astype(str))
+    stored = stored[~pd.MultiIndex.from_frame(stored[["Image_Hash", "Model"]]).isin(existing)]
+    if stored.empty:
+        return 0
+
+    positions = stored.index.to_numpy()
+    stored = stored.reset_index(drop=True)
+    stored["Age"] = pd.to_numeric(stored["Age"], errors="coerce")
+    stored["Age_Group"] = pd.Categorical(stored["Age_Group"], dtype=AGE_GROUP_DTYPE)
+
+    df_results = pd.concat([df_results, stored], ignore_index=True)
+    df_results["Age_Group"] = df_results["Age_Group"].astype(AGE_GROUP_DTYPE)
+    row_ids = df_results.index[-len(stored):]
+
+    # Restore the probability matrices, grouped by model and label space
+    groups = {}
+    for i, (model, position) in enumerate(zip(stored["Model"], positions)):
+        groups.setdefault((model, tuple(labels[position])), []).append(i)
+    for (model, label_names), members in groups.items():
+        record_probabilities(model, row_ids[members], np.stack([probabilities[positions[i]] for i in members]),
+                             label_names=list(label_names))
+
+    st.session_state.df_results = df_results
+    st.session_state.results_version = new_results_version()
+    return len(stored)
+
+def cached_result_features(model_name, rows):
+    """Return (mask, features) for result rows whose pooled features are in the feature cache"""
+    cache = st.session_state.feature_cache
+    model = st.session_state.models_loaded.get(model_name)
+    if model is None:
+        return np.zeros(len(rows), dtype=bool), None
+    cache_key = feature_cache_key(model_name, model)
+    hashes = rows["Image_Hash"] if "Image_Hash" in rows.columns else pd.Series(None, index=rows.index)
+    features = [cache.get(key_hash, cache_key) if isinstance(key_hash, str) else None for key_hash in hashes]
+    mask = np.array([f is not None for f in features], dtype=bool)
+    if not mask.any():
+        return mask, None
+    return mask, np.stack([f for f in features if f is not None])
+
+def ensure_result_demographics():
+    """Re-join Age/Age_Group onto stored results recorded under another dataset or column selection"""
+    df_results = st.session_state.df_results
+    if df_results.empty or st.session_state.get("results_demographics_key") == demographic_index_key():
+        return df_results
+
+    demographics = lookup_image_demographics(df_results["Image_ID"])
+    df_results["Age"] = demographics["Age"].to_numpy()
+    df_results["Age_Group"] = pd.Categorical(demographics["Age_Group"], dtype=AGE_GROUP_DTYPE)
+    st.session_state.results_demographics_key = demographic_index_key()
+    st.session_state.results_version = new_results_version()
+    return df_results
+
+def get_model_label_names(model_name):
+    """Return the output label names of a model"""
+    if MODELS[model_name]["source"] == "torchxrayvision":
+        return list(st.session_state.get(f"{model_name}_pathologies", xrv.datasets.default_pathologies))
+
+    # Trained probe heads carry their own label order
+    if f"{model_name}_labels" in st.session_state:
+        return list(st.session_state[f"{model_name}_labels"])
+
+    # ImageNet models index the dataset's disease classes, padded with generic names
+    num_outputs = MODELS[model_name]["classes"]
+    label_names = list(st.session_state.disease_classes[:num_outputs])
+    return label_names + [f"Disease_{i}" for i in range(len(label_names), num_outputs)]
+
+@timed("compute_fairness_metrics")
+def compute_fairness_metrics(df, protected_attribute, target, prediction, score=None):
+    """Compute fairness metrics based on predictions (AUC needs a continuous `score` column)"""
+    try:
+        # Group dataframe by protected attribute
+        groups = df[protected_attribute].unique()
+        metrics = {}
+
+        for group in groups:
+            group_df = df[df[protected_attribute] == group]
+            if len(group_df) == 0:
+                continue
+
+            y_true = group_df[target]
+            y_pred = group_df[prediction]
+
+            metrics[group] = {
+                'size': len(group_df),
+                'positive_rate': y_pred.mean(),
+                'accuracy': accuracy_score(y_true, y_pred),
+                'precision': precision_score(y_true, y_pred, zero_division=0),
+                'recall': recall_score(y_true, y_pred, zero_division=0),
+                'f1': f1_score(y_true, y_pred, zero_division=0)
+            }
+
+            # AUC ranks continuous scores; it is undefined for hard labels
+            metrics[group]['auc'] = binary_curves(group_df[score], y_true)["auc"] if score else float('nan')
+
+        # Calculate disparities as the spread (max - min) across all groups
+        if len(metrics) >= 2:
+            group_metrics = pd.DataFrame(metrics).T
+            disparities = {
+                f'{name}_disparity': group_metrics[name].max() - group_metrics[name].min()
+                for name in ['positive_rate', 'accuracy', 'precision', 'recall', 'f1', 'auc']
+            }
+            metrics['disparities'] = disparities
+
+        return metrics
+    except Exception as e:
+        logging.error("Error computing fairness metrics", exc_info=True)
+        st.error(f"Error computing fairness metrics: {e}")
+        return {}
+
+@timed("apply_bias_mitigation")
+def apply_bias_mitigation(df, protected_attribute, prediction_col, probability_col, method="threshold_adjustment",
+                          target_col=None, label_col="Prediction"):
+    """Apply bias mitigation techniques to predictions (post-processing methods need `target_col` and `label_col`)"""
+    try:
+        df_mitigated = df.copy()
+        groups = df[protected_attribute].unique()
+
+        if method == "threshold_adjustment":
+            # Find optimal thresholds for each group
+            thresholds = {}
+
+            for group in groups:
+                group_df = df[df[protected_attribute] == group]
+                if len(group_df) == 0:
+                    continue
+
+                # Get the current positive rate
+                current_rate = group_df[prediction_col].mean()
+                thresholds[group] = 0.5  # Default threshold
+
+                # We'll adjust threshold based on overall positive rate
+                # This is a simple approach - more sophisticated methods can be implemented
+                overall_rate = df[prediction_col].mean()
+
+                # If this group has higher positive rate than overall, increase threshold
+                if current_rate > overall_rate:
+                    thresholds[group] = 0.5 + (current_rate - overall_rate) / 2
+
+                # If this group has lower positive rate than overall, decrease threshold
+                elif current_rate < overall_rate:
+                    thresholds[group] = 0.5 - (overall_rate - current_rate) / 2
+
+            # Apply the new thresholds
+            for group, threshold in thresholds.items():
+                group_mask = df_mitigated[protected_attribute] == group
+                df_mitigated.loc[group_mask, "Mitigated_Prediction"] = (
+                    df_mitigated.loc[group_mask, probability_col] >= threshold
+                ).astype(int)
+
+        elif method in FAIRNESS_CONSTRAINTS:
+            # Randomized per-group thresholds equalizing TPR (and FPR) across groups
+            # Fit on disease scores: `probability_col` is the confidence in the shown label
+            scores = disease_scores(df, label_col, probability_col)
+            labeled = df[target_col].notna().to_numpy()
+            postprocessor = EqualizedOddsPostprocessor(method).fit(
+                scores[labeled], df.loc[labeled, target_col].astype(bool), df.loc[labeled, protected_attribute]
+            )
+            df_mitigated["Mitigated_Prediction"] = postprocessor.predict(scores, df[protected_attribute])
+
+        elif method == "reweighing":
+            # Reweighing assigns weights to training instances to ensure fairness
+            # This is a simplified version for demonstration
+            weights = {}
+            total_count = len(df)
+
+            for group in groups:
+                group_df = df[df[protected_attribute] == group]
+                if len(group_df) == 0:
+                    continue
+
+                group_size = len(group_df)
+                group_positive = group_df[prediction_col].sum()
+
+                # Calculate weights inversely proportional to positive rate
+                if group_positive > 0:
+                    weights[group] = total_count / (2 * group_size * (group_positive / group_size))
+                else:
+                    weights[group] = 1.0
+
+            # Kamiran & Calders weights for retraining; the mitigation page retrains the
+            # model heads on cached features with them, so predictions are unchanged here
+            if target_col is not None:
+                df_mitigated["Sample_Weight"] = reweighing_weights(df[protected_attribute], df[target_col])
+            else:
+                df_mitigated["Sample_Weight"] = df_mitigated[protected_attribute].map(weights).fillna(1.0)
+            df_mitigated["Mitigated_Prediction"] = df_mitigated[prediction_col]
+
+        else:
+            # Default to copying original predictions
+            df_mitigated["Mitigated_Prediction"] = df_mitigated[prediction_col]
+
+        return df_mitigated
+
+    except Exception as e:
+        logging.error(f"Error applying bias mitigation: {e}", exc_info=True)
+        return df
+
+def test_with_lower_threshold(image, model_name):
+    """Test disease prediction with progressively lower thresholds to find when predictions appear"""
+    if model_name not in st.session_state.models_loaded:
+        st.error(f"Model {model_name} not loaded. Please load it first.")
+        return
+
+    st.write(f"## Testing {model_name} with different thresholds")
+
+    # Test with different thresholds
+    thresholds = [0.9, 0.8, 0.7, 0.6, 0.5, 0.4, 0.3, 0.2, 0.1, 0.05]
+
+    results = []
+    for threshold in thresholds:
+        predicted_label, confidence = predict_disease(image, model_name, threshold)
+        results.append({
+            "Threshold": threshold,
+            "Prediction": predicted_label,
+            "Confidence": confidence
+        })
+
+    # Display results as a table
+    st.table(pd.DataFrame(results))
+
+# ------------------------- FIGURE HELPERS -------------------------
+@st.cache_data(max_entries=64)
+def render_confusion_matrix(cm_values, cmap_name="Blues", figsize=(4, 4), title=None, colorbar=True,
+                            matshow=True, axis_labels=False):
+    """Render a 2x2 confusion matrix to PNG bytes, cached by its counts and style.
+
+    Unchanged matrices are served from the cache on reruns, and the matplotlib
+    figure is closed right after rasterizing so figures never accumulate.
+    """
+    cm = np.array(cm_values)
+    fig, ax = plt.subplots(figsize=figsize)
+    try:
+        if matshow:
+            cax = ax.matshow(cm, cmap=plt.get_cmap(cmap_name))
+        else:
+            cax = ax.imshow(cm, interpolation='nearest', cmap=plt.get_cmap(cmap_name))
+        if colorbar:
+            fig.colorbar(cax)
+
+        if title:
+            ax.set_title(title)
+        if axis_labels:
+            ax.set_xlabel("Predicted")
+            ax.set_ylabel("Actual")
+
+        ax.set_xticks([0, 1])
+        ax.set_yticks([0, 1])
+        ax.set_xticklabels(["No Disease", "Disease"])
+        ax.set_yticklabels(["No Disease", "Disease"])
+
+        # Add text annotations
+        for (i, j), val in np.ndenumerate(cm):
+            ax.text(j, i, f"{val}", ha="center", va="center", color="white" if val > cm.max()/2 else "black")
+
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", dpi=150, bbox_inches="tight")
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+@st.cache_data(max_entries=16)
+def get_intersectional_metrics(results_version, dimensions, min_support, min_positives, _df_results):
+    """Intersectional subgroup metrics, computed once per results version (see `new_results_version`) and settings"""
+    return intersectional_metrics(_df_results, list(dimensions), min_support, min_positives)
+
+@st.cache_data(max_entries=16)
+def get_gender_curves(results_version, _df_results, model=None):
+    """ROC/PR curves of the disease score per gender (of one model, or all), computed once per results version.
+
+    The version is the session's `new_results_version` token, so sessions never share cached curves.
+    """
+    labeled = _df_results[_df_results["Gender"].isin(["F", "M"]) & (_df_results["Actual"] != "Unknown")]
+    if model is not None:
+        labeled = labeled[labeled["Model"] == model]
+    if labeled.empty:
+        return {}
+    return group_curves(disease_scores(labeled), (labeled["Actual"] != "No Disease").to_numpy(),
+                        labeled["Gender"].to_numpy())
+
+def operating_point_figures(curves, thresholds):
+    """ROC and PR figures per gender with the operating point of each gender's threshold marked"""
+    colors = {"F": "pink", "M": "blue"}
+    names = {"F": "Female", "M": "Male"}
+    roc_fig, pr_fig = go.Figure(), go.Figure()
+
+    for gender, gender_curves in sorted(curves.items()):
+        color = colors.get(gender, "gray")
+        name = names.get(gender, gender)
+        roc_fig.add_trace(go.Scatter(x=gender_curves["fpr"], y=gender_curves["tpr"], mode="lines", line_color=color,
+                                     name=f"{name} (AUC {gender_curves['auc']:.3f})"))
+        pr_fig.add_trace(go.Scatter(x=gender_curves["recall"], y=gender_curves["precision"], mode="lines",
+                                    line_color=color, name=f"{name} (AP {gender_curves['ap']:.3f})"))
+
+        if gender in thresholds:
+            point = operating_point(gender_curves, thresholds[gender])
+            label = f"{name} @ {thresholds[gender]:.2f}"
+            marker = dict(size=12, color=color, line=dict(width=2, color="black"))
+            roc_fig.add_trace(go.Scatter(x=[point["fpr"]], y=[point["tpr"]], mode="markers", marker=marker, name=label))
+            pr_fig.add_trace(go.Scatter(x=[point["tpr"]], y=[point["precision"]], mode="markers", marker=marker, name=label))
+
+    roc_fig.add_shape(type="line", x0=0, y0=0, x1=1, y1=1, line=dict(dash="dot", color="gray"))
+    roc_fig.update_layout(title="ROC Curves by Gender", xaxis_title="False Positive Rate", yaxis_title="True Positive Rate")
+    pr_fig.update_layout(title="Precision-Recall Curves by Gender", xaxis_title="Recall", yaxis_title="Precision")
+    return roc_fig, pr_fig
+
+def show_operating_points(thresholds):
+    """Plot the current per-gender thresholds on the precomputed ROC/PR curves"""
+    curves = get_gender_curves(st.session_state.results_version, st.session_state.df_results)
+    if not curves:
+        st.info("ROC/PR curves need predictions with ground truth labels.")
+        return
+
+    roc_fig, pr_fig = operating_point_figures(curves, thresholds)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.plotly_chart(roc_fig, use_container_width=True)
+    with col2:
+        st.plotly_chart(pr_fig, use_container_width=True)
+
+@st.cache_data(max_entries=16)
+def get_error_type_counts(results_version, _df_results):
+    """Gender x error-type counts, computed once per results version (see `new_results_version`)"""
+    return error_type_counts(_df_results)
+
+def confusion_counts(y_true, y_pred):
+    """Return a hashable 2x2 binary confusion matrix (rows: actual, columns: predicted)"""
+    return tuple(map(tuple, confusion_matrix(y_true, y_pred, labels=[0, 1]).tolist()))
+
+# ------------------------- PAGE FUNCTIONS -------------------------
+
+def model_prediction_page():
+    st.title("🤖 Model Prediction")
+    st.markdown("Select an AI model and upload chest X-ray images for prediction.")
+
+    # Debug mode toggle
+    st.session_state.debug_mode = st.sidebar.checkbox("Enable Debug Mode", value=False)
+
+    if st.session_state.debug_mode:
+        cache = st.session_state.feature_cache
+        st.sidebar.write(
+            f"Feature cache: {len(cache)} entries ({cache.nbytes / 1e6:.1f} MB), "
+            f"{cache.hits} hits / {cache.misses} misses"
+        )
+
+    if st.session_state.df is None:
+        st.warning("⚠️ Please upload and process a dataset before making predictions.")
+        return
+
+    if not st.session_state.disease_classes:
+        st.warning("⚠️ No disease classes detected. Please ensure you've selected the correct disease column.")
+        return
+
+    # Check if any models are loaded
+    if not st.session_state.models_loaded:
+        st.warning("⚠️ No models are loaded. Please go to the Home page and load at least one model.")
+        return
+
+    # Model selection
+    model_choice = st.selectbox(
+        "Select AI Model:",
+        list(st.session_state.models_loaded.keys()),
+        help="Choose the model to use for prediction."
+    )
+
+    # Decision threshold with model-specific defaults
+    default_threshold = get_model_calibrated_threshold(model_choice)
+    threshold = st.slider(
+        "Decision Threshold",
+        0.0, 1.0, default_threshold, 0.01,
+        help=f"Adjust threshold for positive predictions. Default for {model_choice}: {default_threshold}"
+    )
+
+    # Model-specific information
+    if model_choice in MODELS and MODELS[model_choice]["source"] == "torchxrayvision":
+        st.info(f"""
+        **{model_choice} Information**:
+        - Medical-specific model requiring specialized preprocessing
+        - Typically uses lower threshold values ({default_threshold})
+        - Trained on specific chest X-ray datasets
+        - May require different interpretation than general models
+        """)
+    elif model_choice in MODELS and MODELS[model_choice]["source"] == "pytorch_hub":
+        probe_training_section(model_choice)
+
+    # Show how the model's outputs are matched to the dataset's disease labels
+    if st.session_state.debug_mode:
+        alignment = get_label_alignment(tuple(get_model_label_names(model_choice)), tuple(st.session_state.disease_classes))
+        st.write(f"Label mapping: {len(alignment)} of {len(st.session_state.disease_classes)} dataset labels covered")
+        st.dataframe(pd.DataFrame(alignment.pairs(), columns=["Model Output", "Dataset Label"]))
+
+    # Results persisted by earlier sessions
+    stored_count = len(get_results_warehouse())
+    if stored_count:
+        col1, col2 = st.columns([3, 1])
+        col1.info(f"🗄️ The results warehouse holds {stored_count} stored predictions from earlier sessions.")
+        if col2.button("Load Stored Results"):
+            try:
+                added = load_stored_results()
+                st.success(f"Loaded {added} stored predictions into this session.")
+            except Exception as e:
+                logging.error("Error loading stored results", exc_info=True)
+                st.error(f"Error loading stored results: {e}")
+
+    # Upload images
+    uploaded_images = st.file_uploader(
+        "Upload X-ray Images",
+        type=["png", "jpg", "jpeg"],
+        accept_multiple_files=True,
+        help="Upload one or more chest X-ray images for analysis."
+    )
+
+    # Add threshold testing button
+    if st.button("Test with Multiple Thresholds") and uploaded_images:
+        with st.expander("Threshold Testing Results", expanded=True):
+            img = load_image(uploaded_images[0])
+
+            st.write(f"### Testing {model_choice} with different thresholds")
+            test_thresholds = [0.9, 0.8, 0.7, 0.6, 0.5, 0.4, 0.3, 0.2, 0.1]
+
+            results = []
+            for test_threshold in test_thresholds:
+                pred_label, conf = predict_disease(img, model_choice, test_threshold)
+                results.append({
+                    "Threshold": test_threshold,
+                    "Prediction": pred_label,
+                    "Confidence": conf
+                })
+
+            # Display results as a table
+            st.table(pd.DataFrame(results))
+
+    if uploaded_images and st.checkbox("Run as background job", value=len(uploaded_images) > 20,
+                                       help="Score the images on a background worker that survives reruns"):
+        st.write(f"{len(uploaded_images)} images ready for {model_choice} at threshold {threshold:.2f}.")
+        if st.button("Submit Batch Job"):
+            try:
+                job_id = submit_prediction_job(model_choice, uploaded_images, threshold)
+                st.success(f"Submitted job {job_id}. Progress is shown below and survives reruns.")
+            except Exception as e:
+                logging.error("Error submitting prediction job", exc_info=True)
+                st.error(f"Error submitting prediction job: {e}")
+    elif uploaded_images:
+        warehouse = get_results_warehouse()
+        weights_version = model_weights_version(model_choice)
+        preprocessing_version = get_preprocessing_version(MODELS[model_choice]["source"])
+
+        with st.spinner("Processing images..."):
+            progress_bar = st.progress(0)
+            total_images = len(uploaded_images)
+            results = []
+            scored_images = []
+            scored_probs = []
+
+            for i, img in enumerate(uploaded_images, start=1):
+                col1, col2 = st.columns([1, 2])
+                with col1:
+                    st.write(f"Processing Image {i}/{total_images}")
+                    st.image(img, caption=f"Uploaded: {img.name}", width=300)
+
+                with col2:
+                    try:
+                        # Process image
+                        image, key_hash = load_image_and_hash(img)
+
+                        # Join the actual label and demographics from the dataset
+                        demographics = lookup_image_demographics([img.name]).iloc[0]
+                        actual_disease, gender = demographics["Actual"], demographics["Gender"]
+
+                        # Reuse stored probabilities when this image was scored with the same weights and preprocessing
+                        stored = warehouse.fetch([key_hash], model_choice, weights_version, preprocessing_version).get(key_hash)
+                        if stored is not None and stored[0] == get_model_label_names(model_choice):
+                            label_names, probs = stored
+                            st.caption("Loaded stored probabilities (inference skipped)")
+                        else:
+                            # Raw probabilities are stored; the top-1 label uses the per-gender calibration if enabled
+                            label_names, probs = predict_probabilities(image, model_choice)
+                        with span("postprocess"):
+                            calibrated = calibrate_probabilities(model_choice, label_names, probs[None, :], [gender])
+                            aligned_labels, aligned = align_probabilities(label_names, calibrated)
+                            predicted_label, confidence = top_label(aligned_labels, aligned[0], threshold)
+
+                        # Add result to our tracking dataframe
+                        new_row = {
+                            "Image_ID": img.name,
+                            "Gender": gender,
+                            "Actual": actual_disease,
+                            "Prediction": predicted_label,
+                            "Probability": confidence,
+                            "Model": model_choice,
+                            "Age": demographics["Age"],
+                            "Age_Group": demographics["Age_Group"],
+                            "Image_Hash": key_hash
+                        }
+                        results.append(new_row)
+                        scored_images.append(image)
+                        scored_probs.append(probs)
+
+                        # Display prediction results
+                        st.markdown(f"**Prediction:** {predicted_label}")
+                        st.markdown(f"**Confidence:** {confidence:.2%}")
+                        st.markdown(f"**Actual Disease:** {actual_disease}")
+                        st.markdown(f"**Gender:** {gender}")
+
+                        # Show if prediction matches actual
+                        if actual_disease != "Unknown":
+                            if predicted_label == actual_disease:
+                                st.success("✅ Correct prediction!")
+                            else:
+                                st.error("❌ Incorrect prediction")
+
+                    except Exception as e:
+                        logging.error(f"Error processing image {img.name}", exc_info=True)
+                        st.error(f"❌ Error processing image: {e}")
+
+                progress_bar.progress(int((i / total_images) * 100))
+
+            # Update results in session state
+            if results:
+                # Keep the pooled features of every scored image for similar-case search
+                record_embeddings(
+                    model_choice,
+                    scored_images,
+                    [row["Image_ID"] for row in results],
+                    [row["Gender"] for row in results]
+                )
+
+                new_results_df = pd.DataFrame(results)
+                df_results = ensure_result_demographics()
+                df_results = pd.concat([df_results, new_results_df], ignore_index=True)
+                df_results["Age_Group"] = df_results["Age_Group"].astype(AGE_GROUP_DTYPE)
+
+                # Keep the full multi-label probabilities behind the new top-1 rows
+                record_probabilities(model_choice, df_results.index[-len(results):], np.stack(scored_probs))
+                store_results(model_choice, new_results_df, np.stack(scored_probs))
+                st.session_state.df_results = df_results
+                st.session_state.results_demographics_key = demographic_index_key()
+                st.session_state.results_version = new_results_version()
+
+                # Show summary of predictions
+                st.markdown("### Prediction Summary")
+                st.dataframe(new_results_df)
+
+                # Calculate and display accuracy
+                if "Actual" in new_results_df.columns and not all(new_results_df["Actual"] == "Unknown"):
+                    accuracy = (new_results_df["Prediction"] == new_results_df["Actual"]).mean()
+                    st.markdown(f"**Batch Accuracy:** {accuracy:.2%}")
+    else:
+        st.info("Upload images to generate predictions.")
+
+    batch_jobs_section()
+
+def gender_bias_analysis_page():
+    st.title("⚖️ Gender Bias Analysis")
+
+    df_results = st.session_state.df_results
+    if df_results.empty:
+        st.info("No prediction data available yet. Please make predictions first.")
+        return
+
+    st.markdown("### Overview of Predictions by Gender")
+
+    # Filter out rows with unknown gender
+    df_gender = df_results[df_results["Gender"] != "Unknown"]
+
+    if df_gender.empty:
+        st.warning("No predictions with known gender available for analysis.")
+        return
+
+    # Count predictions by gender
+    gender_counts = df_gender["Gender"].value_counts()
+    st.write("**Total predictions by gender:**")
+
+    # Create columns to display gender statistics
+    col1, col2 = st.columns(2)
+
+    with col1:
+        total_F = gender_counts.get("F", 0)
+        total_M = gender_counts.get("M", 0)
+
+        st.metric("Female", f"{total_F}")
+        st.metric("Male", f"{total_M}")
+
+        # Calculate gender ratio
+        if total_M > 0:
+            gender_ratio = total_F / total_M
+            st.write(f"**Female-to-Male Ratio:** {gender_ratio:.2f}")
+
+    with col2:
+        # Create pie chart of gender distribution
+        fig = px.pie(
+            values=[total_F, total_M],
+            names=["Female", "Male"],
+            title="Gender Distribution",
+            color=["Female", "Male"],
+            color_discrete_map={"Female": "pink", "Male": "blue"}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    # Analyze disease predictions by gender
+    st.markdown("### Disease Prediction Analysis by Gender")
+
+    # Count positive predictions (predicted disease)
+    pos_F = df_gender[(df_gender["Gender"] == "F") & (df_gender["Prediction"] != "No Disease")].shape[0]
+    pos_M = df_gender[(df_gender["Gender"] == "M") & (df_gender["Prediction"] != "No Disease")].shape[0]
+
+    # Calculate positive prediction rates
+    rate_F = pos_F / total_F if total_F > 0 else 0
+    rate_M = pos_M / total_M if total_M > 0 else 0
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.write(f"**Female Disease Detection Rate:** {rate_F:.2%}")
+        st.write(f"**Male Disease Detection Rate:** {rate_M:.2%}")
+
+        # Calculate bias difference
+        bias_diff = abs(rate_F - rate_M)
+        st.write(f"**Absolute Bias Difference:** {bias_diff:.4f}")
+
+        # Show bias assessment
+        if bias_diff > 0.15:
+            st.error("⚠️ Significant gender bias detected!")
+        elif bias_diff > 0.05:
+            st.warning("⚠️ Moderate gender bias detected")
+        else:
+            st.success("✅ Low gender bias detected")
+
+    with col2:
+        # Bar chart comparing detection rates
+        comp_data = pd.DataFrame({
+            "Gender": ["Female", "Male"],
+            "Detection Rate": [rate_F, rate_M]
+        })
+
+        fig = px.bar(
+            comp_data,
+            x="Gender",
+            y="Detection Rate",
+            color="Gender",
+            color_discrete_map={"Female": "pink", "Male": "blue"},
+            title="Disease Detection Rate by Gender"
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    # Accuracy analysis by gender if we have ground truth
+    if "Actual" in df_gender.columns and not all(df_gender["Actual"] == "Unknown"):
+        st.markdown("### Accuracy Analysis by Gender")
+
+        # Calculate accuracy by gender
+        acc_F = df_gender[df_gender["Gender"] == "F"]["Prediction"] == df_gender[df_gender["Gender"] == "F"]["Actual"]
+        acc_M = df_gender[df_gender["Gender"] == "M"]["Prediction"] == df_gender[df_gender["Gender"] == "M"]["Actual"]
+
+        acc_F_rate = acc_F.mean() if not acc_F.empty else 0
+        acc_M_rate = acc_M.mean() if not acc_M.empty else 0
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.write(f"**Female Accuracy:** {acc_F_rate:.2%}")
+            st.write(f"**Male Accuracy:** {acc_M_rate:.2%}")
+
+            # Calculate accuracy disparity
+            acc_diff = abs(acc_F_rate - acc_M_rate)
+            st.write(f"**Accuracy Disparity:** {acc_diff:.4f}")
+
+            # Show accuracy disparity assessment
+            if acc_diff > 0.15:
+                st.error("⚠️ Significant accuracy disparity!")
+            elif acc_diff > 0.05:
+                st.warning("⚠️ Moderate accuracy disparity")
+            else:
+                st.success("✅ Low accuracy disparity")
+
+        with col2:
+            # Bar chart comparing accuracy
+            acc_data = pd.DataFrame({
+                "Gender": ["Female", "Male"],
+                "Accuracy": [acc_F_rate, acc_M_rate]
+            })
+
+            fig = px.bar(
+                acc_data,
+                x="Gender",
+                y="Accuracy",
+                color="Gender",
+                color_discrete_map={"Female": "pink", "Male": "blue"},
+                title="Model Accuracy by Gender"
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+    # Disease-specific analysis
+    if len(df_gender["Prediction"].unique()) > 2:  # More than just binary classification
+        st.markdown("### Disease-Specific Gender Analysis")
+
+        # Group by disease and gender
+        disease_gender = df_gender.groupby(["Prediction", "Gender"]).size().unstack(fill_value=0)
+
+        # Calculate percentages
+        disease_gender_pct = disease_gender.div(disease_gender.sum(axis=1), axis=0) * 100
+
+        # Display the tables
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.write("**Disease counts by gender:**")
+            st.dataframe(disease_gender)
+
+        with col2:
+            st.write("**Disease distribution by gender (%):**")
+            st.dataframe(disease_gender_pct.round(1))
+
+        # Visualize disease distribution by gender
+        disease_data = []
+        for disease, row in disease_gender.iterrows():
+            for gender, count in row.items():
+                disease_data.append({
+                    "Disease": disease,
+                    "Gender": gender,
+                    "Count": count
+                })
+
+        disease_df = pd.DataFrame(disease_data)
+
+        # Get top diseases for visualization
+        top_diseases = disease_gender.sum(axis=1).nlargest(5).index.tolist()
+        disease_df_top = disease_df[disease_df["Disease"].isin(top_diseases)]
+
+        fig = px.bar(
+            disease_df_top,
+            x="Disease",
+            y="Count",
+            color="Gender",
+            barmode="group",
+            color_discrete_map={"F": "pink", "M": "blue"},
+            title="Top 5 Diseases by Gender"
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    # Model comparison if multiple models were used
+    if len(df_gender["Model"].unique()) > 1:
+        st.markdown("### Bias Analysis by Model")
+
+        models = df_gender["Model"].unique()
+        model_bias = []
+
+        for model in models:
+            model_data = df_gender[df_gender["Model"] == model]
+
+            # Skip if insufficient data
+            if model_data.empty or "F" not in model_data["Gender"].values or "M" not in model_data["Gender"].values:
+                continue
+
+            # Calculate detection rates
+            m_total_F = model_data[model_data["Gender"] == "F"].shape[0]
+            m_total_M = model_data[model_data["Gender"] == "M"].shape[0]
+
+            m_pos_F = model_data[(model_data["Gender"] == "F") & (model_data["Prediction"] != "No Disease")].shape[0]
+            m_pos_M = model_data[(model_data["Gender"] == "M") & (model_data["Prediction"] != "No Disease")].shape[0]
+
+            m_rate_F = m_pos_F / m_total_F if m_total_F > 0 else 0
+            m_rate_M = m_pos_M / m_total_M if m_total_M > 0 else 0
+
+            model_bias.append({
+                "Model": model,
+                "Female Rate": m_rate_F,
+                "Male Rate": m_rate_M,
+                "Bias Difference": abs(m_rate_F - m_rate_M)
+            })
+
+        if model_bias:
+            model_bias_df = pd.DataFrame(model_bias)
+
+            # Display model bias comparison
+            st.write("**Model Bias Comparison:**")
+            st.dataframe(model_bias_df.round(4))
+
+            # Bar chart of bias by model
+            fig = px.bar(
+                model_bias_df,
+                x="Model",
+                y="Bias Difference",
+                color="Model",
+                title="Gender Bias by Model"
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+    # Per-pathology gender gaps from the stored multi-label probabilities
+    st.markdown("### Per-Pathology Gender Gaps")
+    store = st.session_state.probability_store
+    store_models = [name for name in store.models() if name in df_results["Model"].unique()]
+
+    if not store_models:
+        st.info("Per-pathology analysis uses the full probability outputs recorded with new predictions.")
+    else:
+        pathology_model = st.selectbox("Model for per-pathology analysis:", store_models)
+        pathology_threshold = st.slider("Per-pathology decision threshold:", 0.0, 1.0,
+                                        float(get_model_calibrated_threshold(pathology_model)), 0.01)
+
+        row_ids, label_names, probabilities = store.matrix(pathology_model)
+        rows = df_results.loc[row_ids]
+        truth, known = label_matrix(rows["Actual"], label_names, key=canonical_label)
+        known &= (rows["Gender"] != "Unknown").to_numpy()
+
+        if not known.any():
+            st.info("Ground truth and gender are required for per-pathology gaps.")
+        else:
+            rates = pathology_group_rates(probabilities[known], truth[known], rows["Gender"].to_numpy()[known],
+                                          pathology_threshold, label_names)
+            gaps = pathology_gaps(rates)
+
+            st.write("**TPR/FPR by pathology and gender** (gap = max - min across genders):")
+            st.dataframe(gaps.round(4))
+
+            chart_rates = rates[rates["Positives"] > 0]
+            fig = px.bar(
+                chart_rates,
+                x="Pathology",
+                y="TPR",
+                color="Group",
+                barmode="group",
+                title=f"True Positive Rate by Pathology and Gender ({pathology_model})",
+                labels={"Group": "Gender"},
+                color_discrete_map={"F": "pink", "M": "blue"}
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+    # Intersectional subgroups: every gender x age group x pathology x model cell
+    st.markdown("### Intersectional Subgroup Analysis")
+    df_subgroups = ensure_result_demographics()
+
+    if all(df_subgroups["Actual"].isin(["Unknown"])):
+        st.info("Ground truth labels are required for intersectional subgroup analysis.")
+    else:
+        col1, col2 = st.columns(2)
+        with col1:
+            dimensions = st.multiselect("Subgroup dimensions (pathology is always included):",
+                                        SUBGROUP_DIMENSIONS, default=SUBGROUP_DIMENSIONS)
+            subgroup_metric = st.selectbox("Rank subgroups by:", list(HIGHER_IS_BETTER), index=0)
+        with col2:
+            min_support = st.number_input("Minimum predictions per subgroup:", min_value=1, value=30, step=5)
+            min_positives = st.number_input("Minimum positives per subgroup:", min_value=1, value=5, step=1)
+
+        subgroups = get_intersectional_metrics(st.session_state.results_version, tuple(dimensions),
+                                               int(min_support), int(min_positives), df_subgroups)
+
+        if subgroups.empty:
+            st.info("No subgroup meets the minimum support. Lower the thresholds or add more predictions.")
+        else:
+            worst = rank_worst_subgroups(subgroups, subgroup_metric, top_k=20)
+            columns = dimensions + ["Pathology", "n", "Positives", subgroup_metric,
+                                    f"Reference_{subgroup_metric}", f"{subgroup_metric}_Gap"]
+
+            st.write(f"**Worst-served subgroups by {subgroup_metric}** "
+                     f"({len(subgroups)} subgroups with at least {int(min_support)} predictions):")
+            st.dataframe(worst[columns].round(4))
+
+            worst_labels = worst[dimensions + ["Pathology"]].astype(str).agg(" / ".join, axis=1)
+            fig = px.bar(
+                x=worst[f"{subgroup_metric}_Gap"],
+                y=worst_labels,
+                orientation="h",
+                labels={"x": f"{subgroup_metric} gap vs. reference", "y": "Subgroup"},
+                title=f"Largest {subgroup_metric} Gaps by Subgroup"
+            )
+            fig.update_yaxes(autorange="reversed")
+            st.plotly_chart(fig, use_container_width=True)
+
+    # Aggregates over the latest persisted prediction per image and model, computed in SQL
+    st.markdown("### Stored Results Across Sessions")
+    warehouse = get_results_warehouse()
+    if not len(warehouse):
+        st.info("The results warehouse is empty. Predictions are stored there as they are made.")
+    else:
+        summary = warehouse.group_summary(("model", "gender"))
+        summary.columns = ["Model", "Gender", "Predictions", "Detection Rate", "Accuracy", "TPR", "FPR", "Last Updated"]
+        summary["Last Updated"] = pd.to_datetime(summary["Last Updated"], unit="s").dt.strftime("%Y-%m-%d %H:%M")
+        st.write(f"**{int(summary['Predictions'].sum())} stored predictions by model and gender:**")
+        st.dataframe(summary.round(4))
+
+        fig = px.bar(
+            summary[summary["Gender"].isin(["F", "M"])],
+            x="Model",
+            y="Detection Rate",
+            color="Gender",
+            barmode="group",
+            color_discrete_map={"F": "pink", "M": "blue"},
+            title="Stored Disease Detection Rate by Model and Gender"
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    # Summary and recommendations
+    st.markdown("### Bias Assessment Summary")
+
+    if bias_diff > 0.15:
+        st.error(
+            "**Significant gender bias detected in the model predictions!**\n\n"
+            "The model shows substantial disparity in how it treats different genders. "
+            "Consider applying bias mitigation techniques in the next section."
+        )
+    elif bias_diff > 0.05:
+        st.warning(
+            "**Moderate gender bias detected in the model predictions.**\n\n"
+            "There is some disparity in how the model treats different genders. "
+            "Consider exploring bias mitigation techniques."
+        )
+    else:
+        st.success(
+            "**Low gender bias detected in the model predictions.**\n\n"
+            "The model appears to be relatively fair across genders. "
+            "Continue monitoring as new data becomes available."
+        )
+
+def bias_mitigation_simulation_page():
+    st.title("🛠️ Bias Mitigation & Simulation")
+
+    df = st.session_state.df
+    df_results = st.session_state.df_results
+
+    if df is None or df_results.empty:
+        st.info("No prediction data available yet. Please make predictions first.")
+        return
+
+    # Remove rows with unknown gender
+    df_results_clean = df_results[df_results["Gender"] != "Unknown"].copy()
+
+    if df_results_clean.empty:
+        st.warning("No predictions with known gender available for bias mitigation.")
+        return
+
+    # Introduction to bias mitigation
+    st.markdown(
+        """
+        ### Introduction to Bias Mitigation
+
+        Bias mitigation in AI aims to reduce unfair disparities between different demographic groups.
+        Several techniques can be applied:
+
+        1. **Threshold Adjustment**: Apply different decision thresholds for different groups
+        2. **Reweighing**: Assign different weights to training instances from different groups
+        3. **Adversarial Debiasing**: Use adversarial techniques to remove sensitive attributes
+        4. **Fair Representations**: Learn representations that are independent of protected attributes
+        5. **Post-Processing Calibration**: Adjust model outputs after prediction
+        """
+    )
+
+    # Select mitigation approach
+    mitigation_method = st.selectbox(
+        "Select Mitigation Method:",
+        ["Threshold Adjustment", "Reweighing", "Post-Processing Calibration", "Per-Group Probability Calibration",
+         "Equalized Odds Post-Processing"],
+        help="Choose a method to mitigate gender bias"
+    )
+
+    st.markdown(f"### Apply {mitigation_method}")
+
+    # Define specific parameters based on mitigation method
+    if mitigation_method == "Threshold Adjustment":
+        st.markdown(
+            """
+            **Threshold Adjustment** applies different classification thresholds to different groups
+            to equalize error rates or positive prediction rates.
+            """
+        )
+
+        # Get current thresholds
+        current_threshold = 0.5  # Default threshold
+
+        # Allow setting different thresholds for different genders
+        col1, col2 = st.columns(2)
+
+        with col1:
+            female_threshold = st.slider(
+                "Threshold for Female",
+                0.0, 1.0, current_threshold, 0.01,
+                help="Lower the threshold to increase positive predictions for females"
+            )
+
+        with col2:
+            male_threshold = st.slider(
+                "Threshold for Male",
+                0.0, 1.0, current_threshold, 0.01,
+                help="Higher the threshold to decrease positive predictions for males"
+            )
+
+        # Create binary predictions for visualization
+        df_results_clean["Binary_Prediction"] = (df_results_clean["Prediction"] != "No Disease").astype(int)
+
+        # Apply thresholds based on gender to the top disease probability
+        scores = disease_scores(df_results_clean)
+        gender_threshold = df_results_clean["Gender"].map({"F": female_threshold, "M": male_threshold}).to_numpy(dtype=np.float64)
+        df_results_clean["Mitigated_Prediction"] = (scores >= gender_threshold).astype(int)
+
+        # Where each threshold sits on the precomputed per-gender curves
+        show_operating_points({"F": female_threshold, "M": male_threshold})
+
+    elif mitigation_method == "Reweighing":
+        st.markdown(
+            """
+            **Reweighing** (Kamiran & Calders) weights each training example by P(gender) P(label) / P(gender, label),
+            so gender carries no information about the label. Here the classifier head of a model is retrained
+            with these weights on the cached frozen-backbone features of the scored images, then compared with the original head.
+            """
+        )
+
+        df_results_clean["Binary_Prediction"] = (df_results_clean["Prediction"] != "No Disease").astype(int)
+        df_results_clean["Mitigated_Prediction"] = df_results_clean["Binary_Prediction"]
+
+        # The DenseNet121/ResNet50 heads are the nn.Linear layers attached in load_model
+        head_models = [name for name in df_results_clean["Model"].unique()
+                       if name in st.session_state.models_loaded and MODELS.get(name, {}).get("source") == "pytorch_hub"]
+        if not head_models:
+            st.info("Reweighing retrains the DenseNet121/ResNet50 heads. Make predictions with one of them first.")
+        else:
+            col1, col2 = st.columns(2)
+            with col1:
+                reweigh_model = st.selectbox("Model head to retrain:", head_models)
+            with col2:
+                epochs = st.slider("Training epochs", 20, 1000, 200, 20)
+
+            rows = df_results_clean[(df_results_clean["Model"] == reweigh_model) & (df_results_clean["Actual"] != "Unknown")]
+            has_features, features = cached_result_features(reweigh_model, rows)
+            rows = rows[has_features]
+            st.write(f"**Labeled predictions with cached features:** {len(rows)}")
+
+            label_names = get_model_label_names(reweigh_model)
+            if st.button("Train Reweighed Head"):
+                if rows.empty:
+                    st.warning("No labeled predictions with cached features for this model in this session.")
+                else:
+                    with st.spinner("Training reweighed head on cached features..."):
+                        try:
+                            targets, _ = label_matrix(rows["Actual"], label_names, key=canonical_label)
+                            weights = reweighing_weights(rows["Gender"], rows["Actual"] != "No Disease")
+                            model = st.session_state.models_loaded[reweigh_model]
+                            head, losses = train_linear_head(get_classifier_head(model), features, targets, weights,
+                                                             epochs=epochs, device=st.session_state.device)
+                            st.session_state.reweighed_heads[reweigh_model] = head
+                            st.success(f"Retrained head on {len(rows)} examples (final loss {losses[-1]:.4f}).")
+                        except Exception as e:
+                            logging.error("Error training reweighed head", exc_info=True)
+                            st.error(f"Error training reweighed head: {e}")
+
+            head = st.session_state.reweighed_heads.get(reweigh_model)
+            if head is None:
+                st.info("Train a reweighed head to compare it with the original.")
+            elif not rows.empty:
+                # Score the same cached features with the original and the reweighed head
+                threshold = get_model_calibrated_threshold(reweigh_model)
+                with torch.no_grad():
+                    x = torch.as_tensor(features, device=st.session_state.device)
+                    original = torch.sigmoid(head_forward(st.session_state.models_loaded[reweigh_model], x)).cpu().numpy()
+                    reweighed = torch.sigmoid(head(x)).cpu().numpy()
+
+                original_positive = disease_positive(label_names, original, threshold)
+                reweighed_positive = disease_positive(label_names, reweighed, threshold)
+                actual_positive = (rows["Actual"] != "No Disease").to_numpy()
+                genders = rows["Gender"].to_numpy()
+
+                comparison = []
+                for gender in ["F", "M"]:
+                    mask = genders == gender
+                    if mask.any():
+                        comparison.append({
+                            "Gender": gender,
+                            "Original Detection Rate": original_positive[mask].mean(),
+                            "Reweighed Detection Rate": reweighed_positive[mask].mean(),
+                            "Original Accuracy": (original_positive[mask] == actual_positive[mask]).mean(),
+                            "Reweighed Accuracy": (reweighed_positive[mask] == actual_positive[mask]).mean()
+                        })
+                st.write("**Original vs. reweighed head:**")
+                st.dataframe(pd.DataFrame(comparison).round(4))
+
+                df_results_clean.loc[rows.index, "Mitigated_Prediction"] = reweighed_positive.astype(int)
+
+    elif mitigation_method == "Post-Processing Calibration":
+        st.markdown(
+            """
+            **Post-Processing Calibration** adjusts predictions after the model has been trained
+            to ensure equal error rates or equal positive rates across groups.
+            """
+        )
+
+        # Convert prediction to binary for easier calculation
+        df_results_clean["Binary_Prediction"] = (df_results_clean["Prediction"] != "No Disease").astype(int)
+
+        # Current positive rates
+        female_df = df_results_clean[df_results_clean["Gender"] == "F"]
+        male_df = df_results_clean[df_results_clean["Gender"] == "M"]
+
+        female_pos_rate = female_df["Binary_Prediction"].mean()
+        male_pos_rate = male_df["Binary_Prediction"].mean()
+
+        # Display current rates
+        st.write(f"**Current female positive rate:** {female_pos_rate:.2%}")
+        st.write(f"**Current male positive rate:** {male_pos_rate:.2%}")
+
+        # Target equal positive rates
+        target_rate = st.slider(
+            "Target Positive Rate",
+            min(female_pos_rate, male_pos_rate),
+            max(female_pos_rate, male_pos_rate),
+            (female_pos_rate + male_pos_rate) / 2,
+            0.01,
+            help="Target equal positive prediction rate across genders"
+        )
+
+        # Apply calibration (simplified)
+        # This randomly flips predictions to achieve the target rate
+        df_results_clean["Mitigated_Prediction"] = df_results_clean["Binary_Prediction"].copy()
+
+        # For females
+        if female_pos_rate != target_rate:
+            female_indices = df_results_clean[df_results_clean["Gender"] == "F"].index
+            female_preds = df_results_clean.loc[female_indices, "Binary_Prediction"].values
+
+            num_female = len(female_indices)
+            current_pos = int(female_pos_rate * num_female)
+            target_pos = int(target_rate * num_female)
+
+            if current_pos < target_pos:
+                # Need to flip some 0s to 1s
+                flip_indices = np.random.choice(
+                    female_indices[female_preds == 0],
+                    target_pos - current_pos,
+                    replace=False
+                )
+                df_results_clean.loc[flip_indices, "Mitigated_Prediction"] = 1
+            else:
+                # Need to flip some 1s to 0s
+                flip_indices = np.random.choice(
+                    female_indices[female_preds == 1],
+                    current_pos - target_pos,
+                    replace=False
+                )
+                df_results_clean.loc[flip_indices, "Mitigated_Prediction"] = 0
+
+        # For males
+        if male_pos_rate != target_rate:
+            male_indices = df_results_clean[df_results_clean["Gender"] == "M"].index
+            male_preds = df_results_clean.loc[male_indices, "Binary_Prediction"].values
+
+            num_male = len(male_indices)
+            current_pos = int(male_pos_rate * num_male)
+            target_pos = int(target_rate * num_male)
+
+            if current_pos < target_pos:
+                # Need to flip some 0s to 1s
+                flip_indices = np.random.choice(
+                    male_indices[male_preds == 0],
+                    target_pos - current_pos,
+                    replace=False
+                )
+                df_results_clean.loc[flip_indices, "Mitigated_Prediction"] = 1
+            else:
+                # Need to flip some 1s to 0s
+                flip_indices = np.random.choice(
+                    male_indices[male_preds == 1],
+                    current_pos - target_pos,
+                    replace=False
+                )
+                df_results_clean.loc[flip_indices, "Mitigated_Prediction"] = 0
+
+    elif mitigation_method == "Per-Group Probability Calibration":
+        st.markdown(
+            """
+            **Per-Group Probability Calibration** fits a calibration map per (model, pathology, gender)
+            from labeled results, so a probability means the same risk for female and male patients.
+            """
+        )
+
+        df_results_clean["Binary_Prediction"] = (df_results_clean["Prediction"] != "No Disease").astype(int)
+        df_results_clean["Mitigated_Prediction"] = df_results_clean["Binary_Prediction"]
+
+        store = st.session_state.probability_store
+        store_models = [name for name in store.models() if name in df_results_clean["Model"].unique()]
+        if not store_models:
+            st.info("Calibration uses the full probability outputs recorded with new predictions.")
+        else:
+            col1, col2 = st.columns(2)
+            with col1:
+                calibration_model = st.selectbox("Model to calibrate:", store_models)
+                calibration_method = st.selectbox("Calibration method:", CALIBRATION_METHODS)
+            with col2:
+                min_samples = st.number_input("Minimum samples per gender and pathology:", min_value=5, value=30, step=5)
+                min_positives = st.number_input("Minimum positives per gender and pathology:", min_value=1, value=5, step=1)
+
+            row_ids, label_names, probabilities = store.matrix(calibration_model)
+            rows = df_results.loc[row_ids]
+            truth, known = label_matrix(rows["Actual"], label_names, key=canonical_label)
+            genders = rows["Gender"].to_numpy()
+            known &= genders != "Unknown"
+
+            if st.button("Fit Calibrators"):
+                if not known.any():
+                    st.warning("Ground truth and gender are required to fit calibrators.")
+                else:
+                    try:
+                        calibration = CalibrationSet(calibration_model, calibration_method).fit(
+                            label_names, probabilities[known], truth[known], genders[known],
+                            int(min_samples), int(min_positives)
+                        )
+                        calibration.save(CALIBRATION_DIR)
+                        st.session_state.calibrations[calibration_model] = calibration
+                        st.success(f"Fitted {len(calibration)} calibrators for {calibration_model}.")
+                    except Exception as e:
+                        logging.error("Error fitting calibrators", exc_info=True)
+                        st.error(f"Error fitting calibrators: {e}")
+
+            st.session_state.apply_calibration = st.checkbox("Apply calibrators to new predictions",
+                                                             value=st.session_state.apply_calibration)
+
+            calibration = get_calibration(calibration_model)
+            if calibration is None or len(calibration) == 0:
+                st.info("No calibrators fitted for this model yet.")
+            elif known.any():
+                calibrated = calibration.apply(label_names, probabilities, genders)
+
+                # Reliability diagrams and ECE per gender, before and after calibration
+                before = reliability_table(probabilities[known], truth[known], genders[known])
+                after = reliability_table(calibrated[known], truth[known], genders[known])
+                ece = pd.DataFrame({"ECE Before": expected_calibration_error(before),
+                                    "ECE After": expected_calibration_error(after)})
+                st.write("**Expected Calibration Error by gender:**")
+                st.dataframe(ece.round(4))
+
+                reliability = pd.concat([before.assign(Stage="Before"), after.assign(Stage="After")])
+                reliability = reliability[reliability["Count"] > 0]
+                fig = px.line(
+                    reliability,
+                    x="Mean_Predicted",
+                    y="Fraction_Positive",
+                    color="Group",
+                    line_dash="Stage",
+                    markers=True,
+                    title=f"Reliability Diagram ({calibration_model}, {calibration.method})",
+                    labels={"Mean_Predicted": "Mean predicted probability", "Fraction_Positive": "Observed positive fraction"},
+                    color_discrete_map={"F": "pink", "M": "blue"}
+                )
+                fig.add_shape(type="line", x0=0, y0=0, x1=1, y1=1, line=dict(dash="dot", color="gray"))
+                st.plotly_chart(fig, use_container_width=True)
+
+                # Re-derive the top-1 decision for the stored rows from calibrated probabilities
+                threshold = get_model_calibrated_threshold(calibration_model)
+                calibrated_positive = pd.Series(disease_positive(label_names, calibrated, threshold).astype(int), index=row_ids)
+                stored = df_results_clean.index.intersection(calibrated_positive.index)
+                df_results_clean.loc[stored, "Mitigated_Prediction"] = calibrated_positive.loc[stored]
+
+    elif mitigation_method == "Equalized Odds Post-Processing":
+        st.markdown(
+            """
+            **Equalized Odds Post-Processing** (Hardt et al., 2016) gives each gender a randomized mix of
+            decision thresholds, chosen by a linear program so that true positive rates (equal opportunity)
+            or both true and false positive rates (equalized odds) match across genders at the lowest error.
+            """
+        )
+
+        df_results_clean["Binary_Prediction"] = (df_results_clean["Prediction"] != "No Disease").astype(int)
+        df_results_clean["Mitigated_Prediction"] = df_results_clean["Binary_Prediction"]
+
+        constraint_label = st.radio("Fairness constraint:", ["Equalized Odds", "Equal Opportunity"], horizontal=True)
+        constraint = constraint_label.lower().replace(" ", "_")
+
+        # Scores of different models are not comparable, so every model gets its own mixtures;
+        # the LP runs over the per-threshold rates of the model's cached per-gender curves
+        summaries = []
+        skipped = []
+        try:
+            for model in sorted(df_results_clean["Model"].unique()):
+                curves = get_gender_curves(st.session_state.results_version, df_results, model)
+                if len(curves) < 2:
+                    skipped.append(model)
+                    continue
+
+                postprocessor = EqualizedOddsPostprocessor(constraint).fit(curves=curves)
+                rows = df_results_clean["Model"] == model
+                df_results_clean.loc[rows, "Mitigated_Prediction"] = postprocessor.predict(
+                    disease_scores(df_results_clean[rows]), df_results_clean.loc[rows, "Gender"]
+                )
+                summaries.append(postprocessor.summary().assign(Model=model))
+
+            if summaries:
+                st.write("**Per-model, per-gender threshold mixtures and target rates:**")
+                summary = pd.concat(summaries, ignore_index=True)
+                st.dataframe(summary[["Model"] + [col for col in summary.columns if col != "Model"]].round(4))
+            if skipped:
+                st.info(f"Post-processing needs labeled predictions for both genders; left unchanged: {', '.join(skipped)}")
+        except Exception as e:
+            logging.error("Error solving equalized-odds post-processing", exc_info=True)
+            st.error(f"Error solving equalized-odds post-processing: {e}")
+
+    # Compute and display results of mitigation
+    st.markdown("### Mitigation Results")
+
+    # Ensure binary predictions for evaluation
+    if "Binary_Prediction" not in df_results_clean.columns:
+        df_results_clean["Binary_Prediction"] = (df_results_clean["Prediction"] != "No Disease").astype(int)
+
+    # Compute metrics before mitigation
+    female_before = df_results_clean[df_results_clean["Gender"] == "F"]["Binary_Prediction"].mean()
+    male_before = df_results_clean[df_results_clean["Gender"] == "M"]["Binary_Prediction"].mean()
+    disparity_before = abs(female_before - male_before)
+
+    # Compute metrics after mitigation
+    female_after = df_results_clean[df_results_clean["Gender"] == "F"]["Mitigated_Prediction"].mean()
+    male_after = df_results_clean[df_results_clean["Gender"] == "M"]["Mitigated_Prediction"].mean()
+    disparity_after = abs(female_after - male_after)
+
+    # Display comparison
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown("**Before Mitigation**")
+        st.write(f"Female positive rate: {female_before:.2%}")
+        st.write(f"Male positive rate: {male_before:.2%}")
+        st.write(f"Gender disparity: {disparity_before:.4f}")
+
+    with col2:
+        st.markdown("**After Mitigation**")
+        st.write(f"Female positive rate: {female_after:.2%}")
+        st.write(f"Male positive rate: {male_after:.2%}")
+        st.write(f"Gender disparity: {disparity_after:.4f}")
+
+    # Improvement
+    improvement = (1 - disparity_after/disparity_before) * 100 if disparity_before > 0 else 0
+    st.markdown(f"**Disparity reduction:** {improvement:.1f}%")
+
+    # Visualize the changes
+    comparison_data = pd.DataFrame({
+        'Stage': ['Before', 'Before', 'After', 'After'],
+        'Gender': ['Female', 'Male', 'Female', 'Male'],
+        'Positive Rate': [female_before, male_before, female_after, male_after]
+    })
+
+    fig = px.bar(
+        comparison_data,
+        x="Stage",
+        y="Positive Rate",
+        color="Gender",
+        barmode="group",
+        color_discrete_map={"Female": "pink", "Male": "blue"},
+        title="Impact of Bias Mitigation"
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Performance impact assessment
+    if "Actual" in df_results_clean.columns and not all(df_results_clean["Actual"] == "Unknown"):
+        st.markdown("### Performance Impact Assessment")
+
+        # Binarize actual values
+        df_results_clean["Binary_Actual"] = (df_results_clean["Actual"] != "No Disease").astype(int)
+
+        # Calculate accuracy before
+        accuracy_before = accuracy_score(df_results_clean["Binary_Actual"], df_results_clean["Binary_Prediction"])
+
+        # Calculate accuracy after
+        accuracy_after = accuracy_score(df_results_clean["Binary_Actual"], df_results_clean["Mitigated_Prediction"])
+
+        # Display accuracy comparison
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.metric("Accuracy before mitigation", f"{accuracy_before:.2%}")
+
+        with col2:
+            st.metric("Accuracy after mitigation", f"{accuracy_after:.2%}",
+                     delta=f"{(accuracy_after - accuracy_before) * 100:.2f}%")
+
+        # Warning about accuracy-fairness tradeoff if applicable
+        if accuracy_after < accuracy_before:
+            st.warning(
+                "⚠️ **Note the accuracy-fairness tradeoff**\n\n"
+                "Bias mitigation has reduced overall accuracy. This is a common trade-off "
+                "in fair machine learning. Consider the specific context and ethical implications "
+                "when deciding whether this trade-off is acceptable."
+            )
+        else:
+            st.success(
+                "✅ **Bias mitigation improved both fairness and accuracy**\n\n"
+                "This is an ideal outcome where reducing bias also leads to better performance."
+            )
+
+        # Confusion matrices
+        st.markdown("#### Confusion Matrices")
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.markdown("**Before Mitigation**")
+            cm_before = confusion_counts(df_results_clean["Binary_Actual"], df_results_clean["Binary_Prediction"])
+
+            # Plot confusion matrix
+            st.image(render_confusion_matrix(cm_before, "Blues", (4, 3), colorbar=False, matshow=False, axis_labels=True))
+
+        with col2:
+            st.markdown("**After Mitigation**")
+            cm_after = confusion_counts(df_results_clean["Binary_Actual"], df_results_clean["Mitigated_Prediction"])
+
+            # Plot confusion matrix
+            st.image(render_confusion_matrix(cm_after, "Blues", (4, 3), colorbar=False, matshow=False, axis_labels=True))
+
+    # Recommendations
+    st.markdown("### Recommendations")
+
+    if disparity_after < 0.05:
+        st.success(
+            "✅ **Bias successfully mitigated**\n\n"
+            "The mitigation approach has effectively reduced gender disparity in the model predictions. "
+            "Consider implementing this approach in your production system."
+        )
+    elif disparity_after < 0.1:
+        st.success(
+            "✅ **Bias substantially reduced**\n\n"
+            "The mitigation approach has significantly reduced gender disparity, though some small differences remain. "
+            "This level of disparity may be acceptable depending on your specific use case and regulatory requirements."
+        )
+    else:
+        st.warning(
+            "⚠️ **Partial bias mitigation achieved**\n\n"
+            "While the disparity has been reduced, significant differences between genders still exist. "
+            "Consider trying different mitigation approaches or parameters."
+        )
+
+    # Display the mitigated predictions
+    st.markdown("### Mitigated Predictions")
+    st.dataframe(df_results_clean[["Image_ID", "Gender", "Prediction", "Probability", "Mitigated_Prediction"]])
+
+    # Save button for mitigated predictions
+    if st.button("Save Mitigated Predictions"):
+        df_results_clean_copy = df_results_clean.copy()
+
+        # Map binary predictions back to disease labels
+        def map_to_disease(row):
+            if row["Mitigated_Prediction"] == 1:
+                return row["Prediction"] if row["Prediction"] != "No Disease" else "Disease"
+            else:
+                return "No Disease"
+
+        df_results_clean_copy["Mitigated_Disease"] = df_results_clean_copy.apply(map_to_disease, axis=1)
+
+        # Replace original predictions in the results
+        for idx, row in df_results_clean_copy.iterrows():
+            mask = (st.session_state.df_results["Image_ID"] == row["Image_ID"]) & (st.session_state.df_results["Gender"] == row["Gender"])
+            st.session_state.df_results.loc[mask, "Prediction"] = row["Mitigated_Disease"]
+        st.session_state.results_version = new_results_version()
+
+        st.success("✅ Mitigated predictions saved successfully!")
+
+def gender_bias_testing_page():
+    st.title("🧪 Gender Bias Testing")
+
+    df_results = st.session_state.df_results
+    if df_results.empty:
+        st.info("No prediction data available. Generate predictions first.")
+        return
+
+    st.markdown(
+        """
+        ### Interactive Bias Testing Environment
+
+        This environment allows you to experiment with different parameters and approaches
+        to understand and mitigate gender bias in model predictions.
+        """
+    )
+
+    # Remove rows with unknown gender
+    df_results_clean = df_results[df_results["Gender"] != "Unknown"].copy()
+
+    if df_results_clean.empty:
+        st.warning("No predictions with known gender available for testing.")
+        return
+
+    # Testing method selection
+    test_method = st.radio(
+        "Select Testing Method:",
+        ["Threshold Adjustment", "Data Rebalancing Simulation", "Model Ensemble Simulation"],
+        help="Choose a method to test bias mitigation approaches"
+    )
+
+    if test_method == "Threshold Adjustment":
+        st.markdown(
+            """
+            ### Threshold Adjustment Testing
+
+            Threshold adjustment is a post-processing technique that applies different classification
+            thresholds to different demographic groups to balance error rates or prediction rates.
+            """
+        )
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            thresh_F = st.slider(
+                "Threshold for Female",
+                0.0, 1.0, 0.5, 0.01,
+                help="Adjust threshold for female predictions"
+            )
+
+        with col2:
+            thresh_M = st.slider(
+                "Threshold for Male",
+                0.0, 1.0, 0.5, 0.01,
+                help="Adjust threshold for male predictions"
+            )
+
+        # Binary predictions for testing
+        df_results_clean["Binary_Prediction"] = (df_results_clean["Prediction"] != "No Disease").astype(int)
+
+        # Apply adjusted thresholds to the top disease probability
+        scores = disease_scores(df_results_clean)
+        gender_threshold = df_results_clean["Gender"].map({"F": thresh_F, "M": thresh_M}).to_numpy(dtype=np.float64)
+        df_results_clean["Adjusted_Prediction"] = np.where(
+            np.isnan(gender_threshold), df_results_clean["Binary_Prediction"], scores >= gender_threshold
+        ).astype(int)
+
+        # Where each threshold sits on the precomputed per-gender curves
+        show_operating_points({"F": thresh_F, "M": thresh_M})
+
+        # Calculate metrics
+        female_df = df_results_clean[df_results_clean["Gender"] == "F"]
+        male_df = df_results_clean[df_results_clean["Gender"] == "M"]
+
+        total_F = len(female_df)
+        total_M = len(male_df)
+
+        # Original rates
+        orig_F_rate = female_df["Binary_Prediction"].mean()
+        orig_M_rate = male_df["Binary_Prediction"].mean()
+        orig_diff = abs(orig_F_rate - orig_M_rate)
+
+        # Adjusted rates
+        adj_F_rate = female_df["Adjusted_Prediction"].mean()
+        adj_M_rate = male_df["Adjusted_Prediction"].mean()
+        adj_diff = abs(adj_F_rate - adj_M_rate)
+
+        # Display results
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.markdown("**Original Prediction Rates**")
+            st.write(f"Female detection rate: {orig_F_rate:.2%} ({total_F} images)")
+            st.write(f"Male detection rate: {orig_M_rate:.2%} ({total_M} images)")
+            st.write(f"Bias difference: {orig_diff:.4f}")
+
+        with col2:
+            st.markdown("**Adjusted Prediction Rates**")
+            st.write(f"Female detection rate: {adj_F_rate:.2%} ({total_F} images)")
+            st.write(f"Male detection rate: {adj_M_rate:.2%} ({total_M} images)")
+            st.write(f"Bias difference: {adj_diff:.4f}")
+
+        # Visualization of changes
+        data = pd.DataFrame({
+            'Stage': ['Original', 'Original', 'Adjusted', 'Adjusted'],
+            'Gender': ['Female', 'Male', 'Female', 'Male'],
+            'Detection Rate': [orig_F_rate, orig_M_rate, adj_F_rate, adj_M_rate]
+        })
+
+        fig = px.bar(
+            data,
+            x="Stage",
+            y="Detection Rate",
+            color="Gender",
+            barmode="group",
+            color_discrete_map={"Female": "pink", "Male": "blue"},
+            title="Impact of Threshold Adjustment"
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+        # Assess bias reduction
+        if adj_diff < orig_diff:
+            reduction = ((orig_diff - adj_diff) / orig_diff) * 100
+            st.success(f"✅ Bias reduced by {reduction:.1f}%")
+        else:
+            st.error("❌ Bias not reduced. Try different threshold values.")
+
+    elif test_method == "Data Rebalancing Simulation":
+        st.markdown(
+            """
+            ### Data Rebalancing Simulation
+
+            This simulation resamples the evaluated predictions to a target female-to-male ratio
+            (stratified bootstrap) and shows how the detection-rate disparity and overall metrics
+            vary across many rebalanced replicates.
+            """
+        )
+
+        # Current gender distribution
+        gender_counts = df_results_clean["Gender"].value_counts()
+        total_F = gender_counts.get("F", 0)
+        total_M = gender_counts.get("M", 0)
+
+        st.write(f"**Current dataset:** {total_F} females, {total_M} males")
+        ratio = total_F / total_M if total_M > 0 else float('inf')
+        st.write(f"**Current female-to-male ratio:** {ratio:.2f}")
+
+        # Simulation parameters
+        target_ratio = st.slider(
+            "Target Female-to-Male Ratio",
+            min_value=0.5,
+            max_value=2.0,
+            value=1.0,
+            step=0.1,
+            help="1.0 represents a balanced dataset"
+        )
+
+        col1, col2 = st.columns(2)
+        with col1:
+            n_replicates = st.slider("Bootstrap replicates", 100, 5000, 1000, 100)
+        with col2:
+            sample_size = st.number_input("Rows per replicate", min_value=2, value=max(int(total_F + total_M), 2), step=10)
+
+        if total_F == 0 or total_M == 0:
+            st.warning("Rebalancing needs predictions for both genders.")
+        else:
+            # Resample integer row indices for all replicates at once and average per replicate
+            values = {"Detection Rate": (df_results_clean["Prediction"] != "No Disease").astype(int).to_numpy()}
+            labeled = df_results_clean["Actual"] != "Unknown"
+            if labeled.all():
+                values["Accuracy"] = (
+                    (df_results_clean["Actual"] != "No Disease") == (df_results_clean["Prediction"] != "No Disease")
+                ).astype(int).to_numpy()
+
+            replicates = rebalanced_bootstrap(df_results_clean["Gender"].to_numpy(), values, target_ratio,
+                                              n_replicates, int(sample_size))
+
+            disparity = replicates["Detection Rate Disparity"]
+            low, high = disparity.quantile([0.025, 0.975])
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Mean disparity (F - M)", f"{disparity.mean():.4f}")
+            col2.metric("95% interval", f"[{low:.4f}, {high:.4f}]")
+            col3.metric("Mean overall detection rate", f"{replicates['Overall Detection Rate'].mean():.2%}")
+
+            fig = px.histogram(
+                replicates,
+                x="Detection Rate Disparity",
+                nbins=50,
+                title=f"Detection-Rate Disparity across {n_replicates} Rebalanced Replicates (F:M = {target_ratio:.1f})"
+            )
+            fig.add_vline(x=0, line_dash="dot", line_color="gray")
+            st.plotly_chart(fig, use_container_width=True)
+
+            st.write("**Replicate summary:**")
+            st.dataframe(replicates.describe().T[["mean", "std", "min", "max"]].round(4))
+
+    elif test_method == "Model Ensemble Simulation":
+        st.markdown(
+            """
+            ### Model Ensemble Simulation
+
+            This simulation tests how combining predictions from multiple models might
+            reduce bias. In practice, this would involve training multiple specialized
+            models, but we'll simulate the effect here.
+            """
+        )
+
+        # Simulation controls and displays
+        st.write("Available models in ensemble:")
+
+        for model_name in st.session_state.models_loaded.keys():
+            st.checkbox(model_name, value=True, key=f"use_{model_name}")
+
+        selected_models = [name for name in st.session_state.models_loaded.keys()
+                           if st.session_state.get(f"use_{name}", False)]
+
+        if len(selected_models) < 2:
+            st.info("Select at least two loaded models to build an ensemble.")
+            return
+
+        ensemble_method = st.selectbox(
+            "Combination Method:",
+            ENSEMBLE_METHODS,
+            help="How member disease probabilities are combined"
+        )
+
+        # Optional member weights for weighted averaging
+        weights = {}
+        if ensemble_method == "weighted":
+            weight_cols = st.columns(len(selected_models))
+            for col, model_name in zip(weight_cols, selected_models):
+                with col:
+                    weights[model_name] = st.number_input(
+                        f"Weight for {model_name}", 0.0, 10.0, 1.0, 0.1, key=f"weight_{model_name}"
+                    )
+
+        member_thresholds = {name: get_model_calibrated_threshold(name) for name in selected_models}
+        ensemble_threshold = st.slider(
+            "Ensemble Decision Threshold",
+            0.0, 1.0, float(np.mean(list(member_thresholds.values()))), 0.01,
+            help="Threshold applied to the combined disease probability"
+        )
+
+        ensemble_images = st.file_uploader(
+            "Upload X-ray Images for the Ensemble",
+            type=["png", "jpg", "jpeg"],
+            accept_multiple_files=True,
+            key="ensemble_images",
+            help="Each image is preprocessed once per preprocessing family and scored by every selected model."
+        )
+
+        if not ensemble_images:
+            st.info("Upload images to run the ensemble.")
+            return
+
+        try:
+            with st.spinner("Running ensemble inference..."):
+                images = [load_image(img) for img in ensemble_images]
+                members = {
+                    name: {"model": st.session_state.models_loaded[name], "source": MODELS[name]["source"]}
+                    for name in selected_models
+                }
+                member_probs = run_ensemble(images, members, st.session_state.device,
+                                            feature_cache=st.session_state.feature_cache)
+
+            # Combine members label by label over the disease labels they all map to, then take the top one
+            shared_labels, member_matrices = ensemble_disease_probabilities(member_probs)
+            if not shared_labels:
+                st.warning("The selected models share no disease labels with the dataset, so they cannot be combined.")
+                return
+            member_scores = {name: matrix.max(axis=1) for name, matrix in member_matrices.items()}
+            ensemble_scores = combine_probabilities(member_matrices, ensemble_method, weights).max(axis=1)
+            st.caption(f"Combined over {len(shared_labels)} shared disease labels: {', '.join(shared_labels)}")
+
+            metadata = [lookup_image_metadata(img.name) for img in ensemble_images]
+            genders = [gender for _, gender in metadata]
+
+            # Per-image scores
+            scores_df = pd.DataFrame({"Image_ID": [img.name for img in ensemble_images], "Gender": genders})
+            for name, scores in member_scores.items():
+                scores_df[name] = scores
+            scores_df["Ensemble"] = ensemble_scores
+            scores_df["Ensemble_Prediction"] = np.where(ensemble_scores >= ensemble_threshold, "Disease", "No Disease")
+
+            st.markdown("#### Ensemble Scores")
+            st.dataframe(scores_df.round(4))
+
+            # Per-gender bias of the ensemble against each member
+            st.markdown("#### Ensemble vs Member Bias")
+            bias_df = pd.DataFrame(ensemble_bias_report(
+                member_scores, ensemble_scores, genders, member_thresholds, ensemble_threshold
+            ))
+
+            if not {"F", "M"}.issubset(set(genders)):
+                st.warning("Both female and male images are needed for a meaningful bias comparison.")
+
+            st.dataframe(bias_df.round(4))
+
+            fig = px.bar(
+                bias_df,
+                x="Model",
+                y="Bias Difference",
+                color="Model",
+                title="Gender Bias: Ensemble vs Members"
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+            ensemble_bias = bias_df.loc[bias_df["Model"] == "Ensemble", "Bias Difference"].iloc[0]
+            best_member_bias = bias_df.loc[bias_df["Model"] != "Ensemble", "Bias Difference"].min()
+            if ensemble_bias < best_member_bias:
+                st.success(f"✅ Ensemble bias ({ensemble_bias:.4f}) is lower than every member (best: {best_member_bias:.4f})")
+            else:
+                st.warning(f"⚠️ Ensemble bias ({ensemble_bias:.4f}) is not lower than the best member ({best_member_bias:.4f})")
+
+        except Exception as e:
+            logging.error("Error running model ensemble", exc_info=True)
+            st.error(f"Error running model ensemble: {e}")
+
+def explainable_analysis_page():
+    st.title("🔍 Explainable Analysis")
+
+    df = st.session_state.df
+    df_results = st.session_state.df_results
+
+    if df is None or df_results.empty:
+        st.info("No prediction data available yet. Please make predictions first.")
+        return
+
+    st.markdown(
+        """
+        ### Explainable AI for Chest X-Ray Interpretation
+
+        Understanding how models make decisions is crucial for:
+
+        1. **Clinical Trust**: Helping radiologists verify model decisions
+        2. **Bias Detection**: Identifying when models use irrelevant features
+        3. **Error Analysis**: Understanding failure modes
+        4. **Educational Value**: Learning from the model's attention patterns
+        """
+    )
+
+    # Simulated explanation methods
+    explanation_method = st.selectbox(
+        "Select Explanation Method:",
+        ["Confusion Matrix Analysis", "Error Pattern Analysis", "Demographic Analysis", "Similar Case Retrieval",
+         "Grad-CAM Saliency", "LIME / SHAP Explanations", "Saliency by Gender"]
+    )
+
+    if explanation_method == "Confusion Matrix Analysis":
+        st.markdown("### Confusion Matrix Analysis")
+
+        if "Actual" not in df_results.columns or all(df_results["Actual"] == "Unknown"):
+            st.warning("Ground truth labels required for confusion matrix analysis.")
+            st.info("Please ensure your dataset has actual disease labels matched to your predictions.")
+            return
+
+        # Get binary predictions
+        df_analysis = df_results.copy()
+        df_analysis["Binary_Actual"] = (df_analysis["Actual"] != "No Disease").astype(int)
+        df_analysis["Binary_Prediction"] = (df_analysis["Prediction"] != "No Disease").astype(int)
+
+        # Create overall confusion matrix
+        cm = confusion_counts(df_analysis["Binary_Actual"], df_analysis["Binary_Prediction"])
+
+        # Display confusion matrix
+        st.markdown("#### Overall Confusion Matrix")
+        st.image(render_confusion_matrix(cm, "Blues", (6, 5), title="Confusion Matrix", axis_labels=True))
+
+        # Calculate metrics
+        (tn, fp), (fn, tp) = cm
+        accuracy = (tp + tn) / (tp + tn + fp + fn)
+        sensitivity = tp / (tp + fn) if (tp + fn) > 0 else 0
+        specificity = tn / (tn + fp) if (tn + fp) > 0 else 0
+        ppv = tp / (tp + fp) if (tp + fp) > 0 else 0
+        npv = tn / (tn + fn) if (tn + fn) > 0 else 0
+
+        # Display metrics
+        st.markdown("#### Performance Metrics")
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Accuracy", f"{accuracy:.2%}")
+            st.metric("Sensitivity", f"{sensitivity:.2%}")
+        with col2:
+            st.metric("Specificity", f"{specificity:.2%}")
+            st.metric("PPV", f"{ppv:.2%}")
+        with col3:
+            st.metric("NPV", f"{npv:.2%}")
+            st.metric("F1 Score", f"{2*ppv*sensitivity/(ppv+sensitivity) if (ppv+sensitivity) > 0 else 0:.2%}")
+
+        # Gender-specific analysis
+        st.markdown("#### Gender-Specific Confusion Matrices")
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.markdown("**Female Patients**")
+            female_df = df_analysis[df_analysis["Gender"] == "F"]
+            if not female_df.empty:
+                cm_f = confusion_counts(female_df["Binary_Actual"], female_df["Binary_Prediction"])
+                st.image(render_confusion_matrix(cm_f, "PuRd", (4, 4)))
+            else:
+                st.info("No female patients with both predictions and actual labels.")
+
+        with col2:
+            st.markdown("**Male Patients**")
+            male_df = df_analysis[df_analysis["Gender"] == "M"]
+            if not male_df.empty:
+                cm_m = confusion_counts(male_df["Binary_Actual"], male_df["Binary_Prediction"])
+                st.image(render_confusion_matrix(cm_m, "Blues", (4, 4)))
+            else:
+                st.info("No male patients with both predictions and actual labels.")
+
+    elif explanation_method == "Error Pattern Analysis":
+        st.markdown("### Error Pattern Analysis")
+
+        if "Actual" not in df_results.columns or all(df_results["Actual"] == "Unknown"):
+            st.warning("Ground truth labels required for error pattern analysis.")
+            return
+
+        # Get binary predictions and errors
+        df_analysis = df_results.copy()
+        df_analysis["Binary_Actual"] = (df_analysis["Actual"] != "No Disease").astype(int)
+        df_analysis["Binary_Prediction"] = (df_analysis["Prediction"] != "No Disease").astype(int)
+        df_analysis["Correct"] = df_analysis["Binary_Actual"] == df_analysis["Binary_Prediction"]
+
+        # Error types
+        df_analysis["Error_Type"] = "Correct"
+        df_analysis.loc[(df_analysis["Binary_Actual"] == 1) & (df_analysis["Binary_Prediction"] == 0), "Error_Type"] = "False Negative"
+        df_analysis.loc[(df_analysis["Binary_Actual"] == 0) & (df_analysis["Binary_Prediction"] == 1), "Error_Type"] = "False Positive"
+
+        # Overall error rate
+        error_rate = (df_analysis["Error_Type"] != "Correct").mean()
+        st.metric("Overall Error Rate", f"{error_rate:.2%}")
+
+        # Error distribution
+        error_counts = df_analysis["Error_Type"].value_counts()
+
+        # Create pie chart
+        fig = px.pie(
+            values=error_counts.values,
+            names=error_counts.index,
+            title="Distribution of Predictions and Errors",
+            color=error_counts.index,
+            color_discrete_map={
+                "Correct": "#36b9cc",
+                "False Positive": "#e74a3b",
+                "False Negative": "#f6c23e"
+            }
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+        # Gender-based error analysis
+        st.markdown("#### Error Analysis by Gender")
+
+        # Gender x error-type counts are cached per results version; percentages derive from them
+        gender_error_counts = get_error_type_counts(st.session_state.results_version, df_results)
+        gender_errors = gender_error_counts.div(gender_error_counts.sum(axis=1), axis=0) * 100
+
+        # Display tables
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.markdown("**Error Percentages by Gender**")
+            st.dataframe(gender_errors.round(1))
+
+        with col2:
+            st.markdown("**Error Counts by Gender**")
+            st.dataframe(gender_error_counts)
+
+        # Visualize error rates by gender
+        gender_error_df = gender_errors.reset_index().melt(
+            id_vars="Gender",
+            var_name="Error_Type",
+            value_name="Percentage"
+        )
+
+        # Create bar chart
+        fig = px.bar(
+            gender_error_df,
+            x="Gender",
+            y="Percentage",
+            color="Error_Type",
+            barmode="group",
+            title="Error Types by Gender",
+            color_discrete_map={
+                "Correct": "#36b9cc",
+                "False Positive": "#e74a3b",
+                "False Negative": "#f6c23e"
+            }
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    elif explanation_method == "Demographic Analysis":
+        st.markdown("### Demographic Analysis")
+
+        # Age and Age_Group were joined when the predictions were recorded
+        df_analysis = ensure_result_demographics()
+
+        # Check if age data is available
+        if st.session_state.age_col and st.session_state.age_col in df.columns:
+            st.markdown("#### Age Distribution Analysis")
+
+            # Remove rows with missing age
+            aged_df = df_analysis[df_analysis["Age"].notna()]
+
+            if not aged_df.empty:
+                # Binary predictions for analysis
+                binary_prediction = (aged_df["Prediction"] != "No Disease").astype(int).rename("Binary_Prediction")
+
+                # Positive prediction rate by age group
+                age_group_rates = binary_prediction.groupby(aged_df["Age_Group"], observed=True).mean().reset_index()
+                age_group_rates["Positive_Rate"] = age_group_rates["Binary_Prediction"] * 100
+
+                # Plot positive prediction rates by age group
+                fig = px.bar(
+                    age_group_rates,
+                    x="Age_Group",
+                    y="Positive_Rate",
+                    title="Positive Prediction Rate by Age Group",
+                    labels={"Positive_Rate": "Positive Rate (%)", "Age_Group": "Age Group"},
+                    color="Positive_Rate",
+                    color_continuous_scale="Blues"
+                )
+                st.plotly_chart(fig, use_container_width=True)
+
+                # Age distribution by gender
+                st.markdown("#### Age Distribution by Gender")
+
+                box_stats, outliers = box_plot_stats(aged_df, "Gender", "Age")
+                fig = box_plot_figure(box_stats, outliers, "Gender", "Age", "Age Distribution by Gender")
+                st.plotly_chart(fig, use_container_width=True)
+
+                # Age and gender interaction analysis
+                st.markdown("#### Age and Gender Interaction Analysis")
+
+                # Positive prediction rate by age group and gender
+                age_gender_rates = binary_prediction.groupby(
+                    [aged_df["Age_Group"], aged_df["Gender"]], observed=True
+                ).mean().reset_index()
+                age_gender_rates["Positive_Rate"] = age_gender_rates["Binary_Prediction"] * 100
+
+                # Plot positive prediction rates by age group and gender
+                fig = px.bar(
+                    age_gender_rates,
+                    x="Age_Group",
+                    y="Positive_Rate",
+                    color="Gender",
+                    barmode="group",
+                    title="Positive Prediction Rate by Age Group and Gender",
+                    labels={"Positive_Rate": "Positive Rate (%)", "Age_Group": "Age Group"},
+                    color_discrete_map={"F": "pink", "M": "blue", "Unknown": "gray"}
+                )
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("No age data available for demographic analysis.")
+        else:
+            st.info("Age column not selected or not available in the dataset. Please include age data for demographic analysis.")
+
+        # Gender analysis
+        st.markdown("#### Gender Representation Analysis")
+
+        # Gender distribution
+        gender_counts = df_analysis["Gender"].value_counts()
+        gender_percentages = (gender_counts / gender_counts.sum() * 100).round(1)
+
+        # Create pie chart
+        fig = px.pie(
+            values=gender_counts.values,
+            names=gender_counts.index,
+            title="Gender Distribution in Analyzed Data",
+            color=gender_counts.index,
+            color_discrete_map={"F": "pink", "M": "blue", "Unknown": "gray"}
+        )
+        fig.update_traces(texttemplate="%{percent:.1f}%")
+        st.plotly_chart(fig, use_container_width=True)
+
+        # Check for gender imbalance
+        if "F" in gender_percentages.index and "M" in gender_percentages.index:
+            imbalance = abs(gender_percentages["F"] - gender_percentages["M"])
+
+            if imbalance > 20:
+                st.error(
+                    f"⚠️ **Significant gender imbalance detected: {imbalance:.1f}% difference**\n\n"
+                    "This dataset has a substantial gender imbalance which may contribute to biased model performance. "
+                    "Consider rebalancing your dataset for more equitable representation."
+                )
+            elif imbalance > 10:
+                st.warning(
+                    f"⚠️ **Moderate gender imbalance detected: {imbalance:.1f}% difference**\n\n"
+                    "This dataset has some gender imbalance which may affect model performance across genders. "
+                    "Consider whether this imbalance reflects the target population."
+                )
+            else:
+                st.success(
+                    f"✅ **Minimal gender imbalance detected: {imbalance:.1f}% difference**\n\n"
+                    "The dataset has relatively balanced gender representation, which helps reduce bias."
+                )
+
+    elif explanation_method == "Similar Case Retrieval":
+        st.markdown("### Similar Case Retrieval")
+        st.markdown(
+            "Find the scored studies whose learned image features are closest to a selected case, "
+            "separately for female and male patients."
+        )
+
+        models_with_store = [name for name in df_results["Model"].unique() if embedding_store_exists(name)]
+        if not models_with_store:
+            st.info("No image embeddings recorded yet. Run predictions on the Model Prediction page first.")
+            return
+
+        model_name = st.selectbox("Model:", models_with_store)
+        store = get_embedding_store(model_name)
+        model_results = df_results[df_results["Model"] == model_name]
+
+        # Misclassified cases are the most useful queries
+        misclassified = model_results[
+            (model_results["Actual"] != "Unknown") & (model_results["Prediction"] != model_results["Actual"])
+        ]
+        only_errors = st.checkbox("Only misclassified cases", value=not misclassified.empty)
+        candidates = misclassified if only_errors else model_results
+
+        stored_rows = {image_id: i for i, image_id in enumerate(store.meta["image_id"])}
+        candidate_ids = [image_id for image_id in candidates["Image_ID"].unique() if image_id in stored_rows]
+        if not candidate_ids:
+            st.info("None of these cases have recorded embeddings.")
+            return
+
+        query_id = st.selectbox("Query case:", candidate_ids)
+        k = st.slider("Similar studies per gender", 1, 20, 5)
+
+        lookup = model_results.drop_duplicates("Image_ID", keep="last").set_index("Image_ID")
+        st.markdown("**Query case**")
+        st.dataframe(lookup.loc[[query_id], ["Gender", "Actual", "Prediction", "Probability"]])
+
+        neighbours = store.similar_by_gender(stored_rows[query_id], k=k)
+
+        col1, col2 = st.columns(2)
+        for col, gender, label in [(col1, "F", "Female"), (col2, "M", "Male")]:
+            with col:
+                st.markdown(f"**Most Similar {label} Studies**")
+                indices, similarities = neighbours[gender]
+                if len(indices) == 0:
+                    st.info(f"No {label.lower()} studies recorded for {model_name}.")
+                    continue
+
+                similar_df = pd.DataFrame({
+                    "Image_ID": [store.meta["image_id"][i] for i in indices],
+                    "Similarity": similarities
+                })
+                similar_df = similar_df.join(lookup[["Actual", "Prediction", "Probability"]], on="Image_ID")
+                st.dataframe(similar_df.round(4))
+
+    elif explanation_method == "Grad-CAM Saliency":
+        st.markdown("### Grad-CAM Saliency Maps")
+        st.markdown(
+            "Highlight the image regions that drive a model's score for a class. "
+            "Maps are computed for the whole batch at once and cached per image, model and class."
+        )
+
+        if not st.session_state.models_loaded:
+            st.warning("⚠️ No models are loaded. Please go to the Home page and load at least one model.")
+            return
+
+        model_name = st.selectbox("Model:", list(st.session_state.models_loaded.keys()), key="saliency_model")
+        label_names = get_model_label_names(model_name)
+
+        target = st.selectbox("Explain Class:", ["Top prediction"] + label_names)
+        saliency_method = st.radio("Saliency Method:", SALIENCY_METHODS, horizontal=True)
+        alpha = st.slider("Overlay Opacity", 0.0, 1.0, 0.4, 0.05)
+
+        saliency_images = st.file_uploader(
+            "Upload X-ray Images to Explain",
+            type=["png", "jpg", "jpeg"],
+            accept_multiple_files=True,
+            key="saliency_images"
+        )
+
+        if not saliency_images:
+            st.info("Upload images to compute saliency maps.")
+            return
+
+        try:
+            images = [load_image(img) for img in saliency_images]
+            class_index = None if target == "Top prediction" else label_names.index(target)
+
+            with st.spinner("Computing saliency maps..."):
+                cams, classes = get_saliency_maps(
+                    images, model_name, st.session_state.models_loaded[model_name],
+                    MODELS[model_name]["source"], st.session_state.device,
+                    st.session_state.saliency_cache, class_index, saliency_method
+                )
+
+            num_columns = 3
+            col_list = st.columns(num_columns)
+            for i, (img, image, cam, cls) in enumerate(zip(saliency_images, images, cams, classes)):
+                with col_list[i % num_columns]:
+                    st.image(render_overlay(image, cam, alpha), caption=f"{img.name}: {label_names[cls]}")
+
+        except Exception as e:
+            logging.error("Error computing saliency maps", exc_info=True)
+            st.error(f"Error computing saliency maps: {e}")
+
+    elif explanation_method == "LIME / SHAP Explanations":
+        st.markdown("### LIME / KernelSHAP Explanations")
+        st.markdown(
+            "Estimate how much each image region contributes to a class score by scoring many perturbed copies "
+            "of the image. Perturbations are scored in large batches under a sample and time budget, "
+            "and results are saved so repeat views are instant."
+        )
+
+        if not st.session_state.models_loaded:
+            st.warning("⚠️ No models are loaded. Please go to the Home page and load at least one model.")
+            return
+
+        model_name = st.selectbox("Model:", list(st.session_state.models_loaded.keys()), key="perturbation_model")
+        label_names = get_model_label_names(model_name)
+        target = st.selectbox("Explain Class:", ["Top prediction"] + label_names, key="perturbation_target")
+        perturbation_method = st.radio("Explanation Method:", PERTURBATION_METHODS, horizontal=True)
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            max_samples = st.slider("Sample Budget", 100, 5000, 1000, 100,
+                                    help="Maximum number of perturbed images scored per explanation")
+        with col2:
+            time_budget = st.slider("Time Budget (seconds)", 5, 300, 60, 5,
+                                    help="The explanation uses whatever samples finish within this time")
+        with col3:
+            n_workers = st.number_input("Worker Processes", 0, os.cpu_count() or 1, 0,
+                                        help="0 scores perturbations in this process; more spreads them over a process pool")
+
+        grid_size = st.slider("Segment Grid Size", 4, 16, 8,
+                              help="The image is split into grid × grid regions that are switched on and off")
+
+        perturbation_images = st.file_uploader(
+            "Upload X-ray Images to Explain",
+            type=["png", "jpg", "jpeg"],
+            accept_multiple_files=True,
+            key="perturbation_images"
+        )
+
+        if not perturbation_images:
+            st.info("Upload images to compute explanations.")
+            return
+
+        service = get_explanation_service()
+        class_index = None if target == "Top prediction" else label_names.index(target)
+
+        num_columns = 3
+        col_list = st.columns(num_columns)
+        for i, img in enumerate(perturbation_images):
+            with col_list[i % num_columns]:
+                try:
+                    image = load_image(img)
+                    with st.spinner(f"Explaining {img.name}..."):
+                        explanation = service.explain(
+                            image, model_name, st.session_state.models_loaded[model_name],
+                            MODELS[model_name]["source"], st.session_state.device,
+                            class_index, perturbation_method, max_samples, time_budget, grid_size,
+                            n_workers=int(n_workers)
+                        )
+
+                    st.image(
+                        render_attribution(image, explanation["values"], explanation["grid_size"]),
+                        caption=f"{img.name}: {label_names[explanation['class_index']]}"
+                    )
+                    timing = "saved result" if explanation["cached"] else f"{explanation['elapsed']:.1f}s"
+                    st.caption(f"{explanation['samples']} samples ({timing}). Red supports the class, blue opposes it.")
+
+                except Exception as e:
+                    logging.error(f"Error explaining image {img.name}", exc_info=True)
+                    st.error(f"❌ Error explaining image: {e}")
+
+    elif explanation_method == "Saliency by Gender":
+        st.markdown("### Saliency Maps by Gender and Outcome")
+        st.markdown(
+            "Stream Grad-CAM maps into running averages per gender, outcome and pathology to see whether "
+            "the model looks at different regions for female and male patients. "
+            "Only per-group means and variances are kept, so any number of images can be added in one pass."
+        )
+
+        if not st.session_state.models_loaded:
+            st.warning("⚠️ No models are loaded. Please go to the Home page and load at least one model.")
+            return
+
+        model_name = st.selectbox("Model:", list(st.session_state.models_loaded.keys()), key="aggregate_model")
+        saliency_method = st.radio("Saliency Method:", SALIENCY_METHODS, horizontal=True, key="aggregate_method")
+        # Aggregates are per head version, so maps from a replaced probe head are not mixed in
+        aggregate_key = (model_name, head_fingerprint(st.session_state.models_loaded[model_name]), saliency_method)
+
+        image_source = st.radio("Image Source:", ["Upload Images", "Server Folder"], horizontal=True)
+        if image_source == "Upload Images":
+            uploaded = st.file_uploader(
+                "Upload X-ray Images",
+                type=["png", "jpg", "jpeg"],
+                accept_multiple_files=True,
+                key="aggregate_images"
+            )
+            image_items = [(img.name, img) for img in uploaded or []]
+        else:
+            folder = st.text_input("Folder containing X-ray images:")
+            image_items = []
+            if folder and os.path.isdir(folder):
+                image_items = [
+                    (name, os.path.join(folder, name)) for name in sorted(os.listdir(folder))
+                    if name.lower().endswith((".png", ".jpg", ".jpeg"))
+                ]
+            elif folder:
+                st.warning("Folder not found.")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            add_images = st.button(f"Add {len(image_items)} Images to Aggregate", disabled=not image_items)
+        with col2:
+            if st.button("Reset Aggregates"):
+                st.session_state.saliency_aggregates.pop(aggregate_key, None)
+
+        if add_images:
+            aggregate = st.session_state.saliency_aggregates.setdefault(
+                aggregate_key, {"aggregator": SaliencyAggregator(), "seen": set()}
+            )
+            model = st.session_state.models_loaded[model_name]
+            family = get_preprocessing_family(MODELS[model_name]["source"])
+            label_names = get_model_label_names(model_name)
+            threshold = get_model_calibrated_threshold(model_name)
+
+            progress_bar = st.progress(0)
+            batch_size = 32
+            try:
+                for start in range(0, len(image_items), batch_size):
+                    batch = []
+                    for name, item in image_items[start:start + batch_size]:
+                        image, key_hash = load_image_and_hash(item)
+                        # Skip images already streamed into this aggregate
+                        if key_hash not in aggregate["seen"]:
+                            aggregate["seen"].add(key_hash)
+                            batch.append((name, image))
+
+                    if batch:
+                        metadata = [lookup_image_metadata(name) for name, _ in batch]
+                        accumulate_saliency(
+                            aggregate["aggregator"], model,
+                            preprocess_batch([image for _, image in batch], family), st.session_state.device,
+                            [gender for _, gender in metadata],
+                            [None if actual == "Unknown" else actual != "No Disease" for actual, _ in metadata],
+                            label_names, threshold, saliency_method
+                        )
+                    progress_bar.progress(min(start + batch_size, len(image_items)) / len(image_items))
+            except Exception as e:
+                logging.error("Error aggregating saliency maps", exc_info=True)
+                st.error(f"Error aggregating saliency maps: {e}")
+
+        aggregate = st.session_state.saliency_aggregates.get(aggregate_key)
+        if not aggregate or len(aggregate["aggregator"]) == 0:
+            st.info("Add images to build saliency aggregates.")
+            return
+
+        aggregator = aggregate["aggregator"]
+
+        # Cell sizes
+        cell_counts = pd.DataFrame(
+            [(gender, error_type, pathology, count) for (gender, error_type, pathology), count in aggregator.summary()],
+            columns=["Gender", "Error_Type", "Pathology", "Images"]
+        )
+        st.markdown("#### Images per Group")
+        st.dataframe(cell_counts.pivot_table(index=["Pathology", "Error_Type"], columns="Gender",
+                                             values="Images", aggfunc="sum", fill_value=0))
+
+        col1, col2 = st.columns(2)
+        with col1:
+            pathology = st.selectbox("Pathology:", ["All"] + sorted(cell_counts["Pathology"].unique()))
+        with col2:
+            error_type = st.selectbox("Outcome:", ["All"] + sorted(cell_counts["Error_Type"].unique()))
+
+        criteria = {
+            "pathology": None if pathology == "All" else pathology,
+            "error_type": None if error_type == "All" else error_type
+        }
+        female_keys = aggregator.matching_keys(gender="F", **criteria)
+        male_keys = aggregator.matching_keys(gender="M", **criteria)
+
+        n_f, mean_f, _ = aggregator.stats(female_keys)
+        n_m, mean_m, _ = aggregator.stats(male_keys)
+        diff, t_map = aggregator.compare(female_keys, male_keys)
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.markdown(f"**Female mean saliency** ({n_f} images)")
+            st.image(render_heatmap(mean_f))
+        with col2:
+            st.markdown(f"**Male mean saliency** ({n_m} images)")
+            st.image(render_heatmap(mean_m))
+        with col3:
+            st.markdown("**Difference (female − male)**")
+            scale = np.abs(diff).max() or 1.0
+            st.image(render_heatmap(0.5 + 0.5 * diff / scale, colormap="bwr"))
+
+        if n_f >= 2 and n_m >= 2:
+            max_t = np.abs(t_map).max()
+            st.write(f"**Largest regional difference:** |t| = {max_t:.2f}")
+            if max_t > 3:
+                st.warning("⚠️ The model attends to noticeably different regions for female and male patients.")
+            else:
+                st.success("✅ No strong regional attention difference between genders.")
@@ -0,0 +1,193 @@
+"""Linear-probe training for the torchvision backbones.
+
+DenseNet121 and ResNet50 ship with an untrained 14-way head. Pooled backbone
+features are extracted once into a memory-mapped FeatureStore; the multi-label
+head is then trained on those features with a multi-threaded CPU loop and the
+resulting weights are saved as numbered versions that `load_model` picks up.
+"""
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from fairness import binary_curves, group_balanced_weights, label_matrix
+from label_alignment import canonical_label
+
+# ------------------------- TRAINING -------------------------
+def split_indices(n, validation_fraction=0.2, seed=0):
+    """Shuffled (train, validation) row indices"""
+    order = np.random.default_rng(seed).permutation(n)
+    n_validation = int(round(n * validation_fraction)) if n >= 10 else 0
+    return np.sort(order[n_validation:]), np.sort(order[:n_validation])
+
+def mean_auc(probabilities, truth):
+    """Mean ROC AUC over the columns that have both positives and negatives"""
+    aucs = []
+    for j in range(truth.shape[1]):
+        positives = int(truth[:, j].sum())
+        if 0 < positives < len(truth):
+            aucs.append(binary_curves(probabilities[:, j], truth[:, j])["auc"])
+    return float(np.mean(aucs)) if aucs else float("nan")
+
+def train_probe(features, targets, sample_weights=None, epochs=30, batch_size=256, lr=1e-3, weight_decay=1e-4,
+                num_threads=None, validation_fraction=0.2, seed=0, progress_callback=None):
+    """Train a fresh nn.Linear multi-label head on (memory-mapped) features.
+
+    Mini-batches are gathered from the memmap on a background thread while
+    the current batch trains, and PyTorch runs the matmuls on `num_threads`
+    intra-op threads. Returns (head, history, metrics).
+    """
+    n, dim = features.shape
+    targets = np.asarray(targets, dtype=np.float32)
+    if sample_weights is None:
+        sample_weights = np.ones(n, dtype=np.float32)
+    sample_weights = np.asarray(sample_weights, dtype=np.float32)
+    sample_weights = sample_weights / sample_weights.mean()
+
+    train_idx, validation_idx = split_indices(n, validation_fraction, seed)
+    rng = np.random.default_rng(seed)
+    torch.manual_seed(seed)
+
+    head = nn.Linear(dim, targets.shape[1])
+    optimizer = torch.optim.Adam(head.parameters(), lr=lr, weight_decay=weight_decay)
+
+    def load_batch(idx):
+        # Fancy indexing on the memmap copies just this batch into memory
+        return (torch.from_numpy(np.ascontiguousarray(features[idx], dtype=np.float32)),
+                torch.from_numpy(targets[idx]), torch.from_numpy(sample_weights[idx]))
+
+    previous_threads = torch.get_num_threads()
+    if num_threads:
+        torch.set_num_threads(num_threads)
+
+    history = []
+    start_time = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            for epoch in range(epochs):
+                order = rng.permutation(train_idx)
+                batches = [np.sort(order[i:i + batch_size]) for i in range(0, len(order), batch_size)]
+
+                head.train()
+                total_loss = 0.0
+                pending = prefetcher.submit(load_batch, batches[0])
+                for b in range(len(batches)):
+                    x, y, w = pending.result()
+                    if b + 1 < len(batches):
+                        pending = prefetcher.submit(load_batch, batches[b + 1])
+
+                    optimizer.zero_grad()
+                    loss = (F.binary_cross_entropy_with_logits(head(x), y, reduction="none").mean(dim=1) * w).mean()
+                    loss.backward()
+                    optimizer.step()
+                    total_loss += loss.item() * len(x)
+
+                history.append({"epoch": epoch + 1, "train_loss": total_loss / len(train_idx)})
+                if progress_callback is not None:
+                    progress_callback(epoch + 1, epochs, history[-1]["train_loss"])
+    finally:
+        torch.set_num_threads(previous_threads)
+
+    head.eval()
+    metrics = {"train_seconds": time.perf_counter() - start_time, "n_train": int(len(train_idx)),
+               "n_validation": int(len(validation_idx))}
+    if len(validation_idx):
+        with torch.no_grad():
+            x, y, _ = load_batch(validation_idx)
+            logits = head(x)
+            metrics["validation_loss"] = float(F.binary_cross_entropy_with_logits(logits, y).item())
+            metrics["validation_auc"] = mean_auc(torch.sigmoid(logits).numpy(), y.numpy().astype(bool))
+
+    logging.info(f"Trained probe on {len(train_idx)} samples in {metrics['train_seconds']:.1f}s")
+    return head, history, metrics
+
+def train_probe_from_store(store, labels, balanced=False, **kwargs):
+    """Train a head on every labeled vector of a FeatureStore"""
+    actual = np.asarray(store.meta["label"], dtype=object)
+    truth, known = label_matrix(actual, labels, key=canonical_label)
+    if not known.any():
+        raise ValueError("No labeled features in the store")
+
+    rows = np.flatnonzero(known)
+    features = store.vectors if len(rows) == len(known) else store.vectors[rows]
+    weights = None
+    if balanced:
+        weights = group_balanced_weights(np.asarray(store.meta["gender"], dtype=object)[rows])
+    return train_probe(features, truth[rows], sample_weights=weights, **kwargs)
+
+# ------------------------- VERSIONED HEADS -------------------------
+class ProbeRegistry:
+    """Numbered head versions per model: <root>/<model>/v<N>.pt plus a v<N>.json manifest"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _model_dir(self, model_name):
+        return os.path.join(self.root, model_name.replace("/", "_"))
+
+    def versions(self, model_name):
+        """Manifests of all saved versions of a model, oldest first"""
+        directory = self._model_dir(model_name)
+        if not os.path.isdir(directory):
+            return []
+
+        manifests = []
+        for name in os.listdir(directory):
+            if name.startswith("v") and name.endswith(".json"):
+                with open(os.path.join(directory, name)) as f:
+                    manifests.append(json.load(f))
+        return sorted(manifests, key=lambda manifest: manifest["version"])
+
+    def save(self, model_name, head, labels, metrics=None, **info):
+        """Save head weights as the next version and return its manifest"""
+        directory = self._model_dir(model_name)
+        os.makedirs(directory, exist_ok=True)
+        existing = self.versions(model_name)
+        version = existing[-1]["version"] + 1 if existing else 1
+
+        manifest = {
+            "model_name": model_name,
+            "version": version,
+            "labels": list(labels),
+            "in_features": head.in_features,
+            "out_features": head.out_features,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "metrics": metrics or {},
+            **info,
+        }
+        torch.save(head.state_dict(), os.path.join(directory, f"v{version}.pt"))
+
+        # The manifest is written last so a version only appears once its weights exist
+        path = os.path.join(directory, f"v{version}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(path + ".tmp", path)
+        return manifest
+
+    def latest(self, model_name):
+        """Manifest of the newest version, or None"""
+        versions = self.versions(model_name)
+        return versions[-1] if versions else None
+
+    def load_state_dict(self, model_name, version):
+        path = os.path.join(self._model_dir(model_name), f"v{version}.pt")
+        return torch.load(path, map_location="cpu")
+
+    def load_into(self, model_name, head, version=None):
+        """Load a saved version into `head` in place; returns its manifest or None"""
+        manifest = self.latest(model_name) if version is None else next(
+            (m for m in self.versions(model_name) if m["version"] == version), None)
+        if manifest is None:
+            return None
+        if (manifest["in_features"], manifest["out_features"]) != (head.in_features, head.out_features):
+            logging.warning(f"Probe v{manifest['version']} for {model_name} does not fit the model head; skipped")
+            return None
+        head.load_state_dict(self.load_state_dict(model_name, manifest["version"]))
+        return manifest
@@ -0,0 +1,198 @@
+"""Storage for prediction results beyond the top-1 summary table."""
+
+import json
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+class ProbabilityStore:
+    """Per-model multi-label probability matrices aligned with result rows.
+
+    The results table keeps one top-1 prediction per (image, model); this
+    store keeps the full [rows x pathologies] probability matrix behind each of
+    those rows so per-pathology metrics can be computed without re-scoring.
+    Appends are buffered and concatenated lazily on the next read.
+    """
+
+    def __init__(self):
+        self._models = {}
+
+    def __contains__(self, model_name):
+        return model_name in self._models
+
+    def models(self):
+        return list(self._models)
+
+    @property
+    def nbytes(self):
+        return sum(chunk.nbytes for entry in self._models.values() for chunk in entry["chunks"])
+
+    def add(self, model_name, labels, row_ids, probabilities):
+        """Append probability rows for result rows `row_ids` of one model"""
+        probabilities = np.asarray(probabilities, dtype=np.float32).reshape(len(row_ids), -1)
+        entry = self._models.setdefault(model_name, {"labels": list(labels), "row_ids": [], "chunks": []})
+        if list(labels) != entry["labels"]:
+            raise ValueError(f"Label space of {model_name} changed; clear its stored probabilities first")
+        entry["row_ids"].extend(int(row_id) for row_id in row_ids)
+        entry["chunks"].append(probabilities)
+
+    def matrix(self, model_name):
+        """Return (row_ids, labels, probabilities) for one model"""
+        entry = self._models[model_name]
+        if len(entry["chunks"]) > 1:
+            entry["chunks"] = [np.concatenate(entry["chunks"], axis=0)]
+        probabilities = entry["chunks"][0] if entry["chunks"] else np.empty((0, len(entry["labels"])), dtype=np.float32)
+        return np.asarray(entry["row_ids"], dtype=np.int64), entry["labels"], probabilities
+
+    def clear(self, model_name=None):
+        if model_name is None:
+            self._models.clear()
+        else:
+            self._models.pop(model_name, None)
+
+# ------------------------- RESULTS WAREHOUSE -------------------------
+WAREHOUSE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    image_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    weights_version TEXT NOT NULL,
+    preprocessing_version TEXT NOT NULL,
+    image_id TEXT,
+    gender TEXT,
+    actual TEXT,
+    age REAL,
+    age_group TEXT,
+    prediction TEXT,
+    probability REAL,
+    labels TEXT NOT NULL,
+    probabilities BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (image_hash, model, weights_version, preprocessing_version)
+);
+CREATE INDEX IF NOT EXISTS predictions_model_gender ON predictions (model, gender);
+"""
+
+# Columns of the session results table and the warehouse columns they come from
+RESULT_COLUMNS = {
+    "Image_ID": "image_id", "Gender": "gender", "Actual": "actual", "Prediction": "prediction",
+    "Probability": "probability", "Model": "model", "Age": "age", "Age_Group": "age_group", "Image_Hash": "image_hash",
+}
+
+class ResultsWarehouse:
+    """Predictions persisted in a local SQLite file across sessions.
+
+    Rows are keyed by (image hash, model, weights version, preprocessing
+    version), so an image is only scored again when the model weights or the
+    preprocessing changed. Each row keeps the full probability vector (float32
+    blob plus its label names), the joined metadata, the latest top-1 decision
+    and created/updated timestamps.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(WAREHOUSE_SCHEMA)
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+
+    def query(self, sql, params=()):
+        """Run a read-only SQL query and return a DataFrame"""
+        with self._lock:
+            return pd.read_sql_query(sql, self._connection, params=params)
+
+    def fetch(self, image_hashes, model_name, weights_version, preprocessing_version):
+        """Stored (labels, probabilities) for already scored images, keyed by image hash"""
+        image_hashes = list(image_hashes)
+        found = {}
+        with self._lock:
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(image_hashes), 500):
+                chunk = image_hashes[start:start + 500]
+                rows = self._connection.execute(
+                    f"SELECT image_hash, labels, probabilities FROM predictions "
+                    f"WHERE model = ? AND weights_version = ? AND preprocessing_version = ? "
+                    f"AND image_hash IN ({','.join('?' * len(chunk))})",
+                    [model_name, weights_version, preprocessing_version, *chunk]
+                ).fetchall()
+                for key_hash, labels, blob in rows:
+                    found[key_hash] = (json.loads(labels), np.frombuffer(blob, dtype=np.float32))
+        return found
+
+    def upsert(self, rows, weights_version, preprocessing_version, label_names, probabilities):
+        """Insert or refresh results rows (session results layout) with their probability vectors"""
+        now = time.time()
+        labels = json.dumps(list(label_names))
+        probabilities = np.asarray(probabilities, dtype=np.float32).reshape(len(rows), -1)
+
+        ages = pd.to_numeric(rows["Age"], errors="coerce") if "Age" in rows.columns else pd.Series(np.nan, index=rows.index)
+        age_groups = rows["Age_Group"] if "Age_Group" in rows.columns else pd.Series(None, index=rows.index)
+        records = [
+            (key_hash, model, weights_version, preprocessing_version, str(image_id), str(gender), str(actual),
+             None if pd.isna(age) else float(age), None if pd.isna(age_group) else str(age_group),
+             str(prediction), float(probability), labels, probs.tobytes(), now, now)
+            for key_hash, model, image_id, gender, actual, age, age_group, prediction, probability, probs in zip(
+                rows["Image_Hash"], rows["Model"], rows["Image_ID"], rows["Gender"], rows["Actual"], ages,
+                age_groups, rows["Prediction"], rows["Probability"], probabilities
+            )
+        ]
+
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT INTO predictions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (image_hash, model, weights_version, preprocessing_version) DO UPDATE SET "
+                "image_id = excluded.image_id, gender = excluded.gender, actual = excluded.actual, "
+                "age = excluded.age, age_group = excluded.age_group, prediction = excluded.prediction, "
+                "probability = excluded.probability, labels = excluded.labels, "
+                "probabilities = excluded.probabilities, updated_at = excluded.updated_at",
+                records
+            )
+
+    def results_frame(self):
+        """All stored rows in the session results layout, plus their labels and probabilities"""
+        columns = ", ".join(f"{column} AS {name}" for name, column in RESULT_COLUMNS.items())
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {columns}, labels, probabilities FROM predictions ORDER BY created_at, rowid"
+            ).fetchall()
+
+        frame = pd.DataFrame([row[:len(RESULT_COLUMNS)] for row in rows], columns=list(RESULT_COLUMNS))
+        labels = [json.loads(row[-2]) for row in rows]
+        probabilities = [np.frombuffer(row[-1], dtype=np.float32) for row in rows]
+        return frame, labels, probabilities
+
+    def group_summary(self, dimensions=("model", "gender")):
+        """Per-group counts, detection rate, accuracy, TPR and FPR as one SQL aggregate.
+
+        Only the most recent row per (image, model) is counted, so images scored
+        under several weights or preprocessing versions are not counted twice.
+        """
+        group_by = ", ".join(dimensions)
+        return self.query(f"""
+            WITH latest AS (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY image_hash, model ORDER BY updated_at DESC, rowid DESC) AS recency
+                FROM predictions
+            )
+            SELECT {group_by},
+                   COUNT(*) AS n,
+                   AVG(prediction != 'No Disease') AS detection_rate,
+                   AVG(CASE WHEN actual != 'Unknown' THEN prediction = actual END) AS accuracy,
+                   AVG(CASE WHEN actual NOT IN ('Unknown', 'No Disease') THEN prediction != 'No Disease' END) AS tpr,
+                   AVG(CASE WHEN actual = 'No Disease' THEN prediction != 'No Disease' END) AS fpr,
+                   MAX(updated_at) AS last_updated
+            FROM latest
+            WHERE recency = 1
+            GROUP BY {group_by}
+            ORDER BY {group_by}
+        """)
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM predictions")
@@ -0,0 +1,797 @@
+"""Static pages: home, model descriptions, background, team and performance.
+
+These pages only need Streamlit, so they render without importing torch or
+the rest of the ML stack. Model load buttons import it on demand.
+"""
+
+import os
+
+import pandas as pd
+import streamlit as st
+
+import memory_accounting
+from instrumentation import REGISTRY
+
+# The TorchXRayVision output labels (xrv.datasets.default_pathologies), listed
+# here so the model pages do not have to import torchxrayvision
+XRV_PATHOLOGIES = [
+    "Atelectasis", "Consolidation", "Infiltration", "Pneumothorax", "Edema", "Emphysema", "Fibrosis",
+    "Effusion", "Pneumonia", "Pleural_Thickening", "Cardiomegaly", "Nodule", "Mass", "Hernia",
+    "Lung Lesion", "Fracture", "Lung Opacity", "Enlarged Cardiomediastinum"
+]
+
+def load_model_on_demand(model_name):
+    """Load a model through the ML pages module, importing the ML stack on first use"""
+    import ml_pages
+    ml_pages.init_session_state()
+    return ml_pages.load_model(model_name)
+
+# ------------------------- PAGE FUNCTIONS -------------------------
+def home_page():
+    st.title("🏠 Home")
+    st.markdown("## Addressing Gender Bias in AI-Driven Radiology")
+    st.markdown(
+        """
+        **Why Gender Bias Matters in Medical AI:**
+
+        - **Ethical concerns:** Unfair treatment may result from biased predictions
+        - **Clinical impact:** Risk of misdiagnosis for underrepresented groups
+        - **Regulatory pressure:** Fairness requirements in AI medical applications
+        - **Research evidence:** Underrepresentation in training data leads to poorer outcomes
+
+        This application helps you:
+        1. Upload and analyze medical imaging datasets
+        2. Detect diseases using state-of-the-art AI models
+        3. Assess gender bias in model predictions
+        4. Apply bias mitigation techniques
+        5. Compare performance before and after bias mitigation
+        """
+    )
+    st.info("Use the sidebar to navigate through the app.")
+
+    # Display model information
+    st.markdown("## Available Models")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown("### DenseNet121")
+        st.markdown("Pre-trained ImageNet model adapted for chest X-ray diagnosis.")
+        if st.button("Load DenseNet121", key="load_densenet"):
+            load_model_on_demand("DenseNet121")
+
+        st.markdown("### ResNet50")
+        st.markdown("Powerful residual network architecture for chest X-ray analysis.")
+        if st.button("Load ResNet50", key="load_resnet"):
+            load_model_on_demand("ResNet50")
+
+    with col2:
+        st.markdown("### CheXpert")
+        st.markdown("Stanford CheXpert model trained on 224,000+ chest X-rays.")
+        if st.button("Load CheXpert", key="load_chexpert"):
+            load_model_on_demand("CheXpert")
+
+        st.markdown("### MIMIC-CXR")
+        st.markdown("MIT model trained on MIMIC-CXR dataset with diverse demographics.")
+        if st.button("Load MIMIC-CXR", key="load_mimic"):
+            load_model_on_demand("MIMIC-CXR")
+
+    st.markdown("---")
+    st.markdown("### Acknowledgments")
+    st.markdown(
+        """
+        **Thank you to:**
+        - The TorchXRayVision team for providing open-source pre-trained models
+        - The WiDS Datathon organizers for their support
+        - Stanford ML Group for the CheXpert dataset
+        - MIT for the MIMIC-CXR dataset
+        """
+    )
+
+def about_densenet_model_page():
+    st.title("🧠 About DenseNet121 Model")
+
+    st.markdown(
+        """
+        ## DenseNet121: Deep Convolutional Network for Chest X-ray Classification
+
+        **DenseNet121** is a convolutional neural network architecture that incorporates dense connectivity
+        patterns to improve feature propagation, encourage feature reuse, and substantially reduce the
+        number of parameters.
+
+        ### Model Architecture
+
+        The DenseNet121 architecture includes:
+
+        - **121 layers** with convolutional and pooling operations
+        - **Dense connectivity** where each layer receives feature maps from all preceding layers
+        - **Transition layers** (compression) between dense blocks
+        - **Global average pooling** followed by a fully connected layer
+
+        ### Implementation Details
+
+        This implementation uses:
+
+        - PyTorch's pre-trained DenseNet121 (trained on ImageNet)
+        - Transfer learning by replacing the final classification layer
+        - Input resolution of 224×224 pixels
+        - Standard ImageNet normalization
+
+        ### Training Process
+
+        The base model is pre-trained on ImageNet and then fine-tuned for chest X-ray classification:
+
+        1. The original ImageNet classifier (1000 classes) is replaced with a new classifier for chest pathologies
+        2. The model is trained using a weighted binary cross-entropy loss
+        3. Augmentation techniques are applied to reduce overfitting
+
+        ### Performance
+
+        DenseNet121-based chest X-ray models typically achieve:
+
+        - AUC > 0.80 for common thoracic diseases
+        - Comparable performance to radiologists for certain conditions
+        - Good generalization across different datasets
+
+        ### Advantages
+
+        - Efficient parameter usage through feature reuse
+        - Strong gradient flow through dense connections
+        - Reduced vanishing gradient problems
+        - Lower computational requirements than many comparable architectures
+
+        ### Research Citation
+
+        > G. Huang, Z. Liu, L. Van Der Maaten and K. Q. Weinberger, "Densely Connected Convolutional Networks," 2017 IEEE Conference on Computer Vision and Pattern Recognition (CVPR), Honolulu, HI, 2017, pp. 4700-4708.
+        """
+    )
+
+    # Add visualization of model architecture
+    st.markdown("### DenseNet121 Architecture")
+
+    col1, col2 = st.columns([1, 2])
+
+    with col1:
+        st.markdown(
+            """
+            **DenseNet-121 Structure:**
+
+            1. Input layer (224×224 image)
+            2. Initial convolution and pooling
+            3. Dense blocks with transition layers:
+               - Dense Block 1 (6 layers)
+               - Transition Layer 1
+               - Dense Block 2 (12 layers)
+               - Transition Layer 2
+               - Dense Block 3 (24 layers)
+               - Transition Layer 3
+               - Dense Block 4 (16 layers)
+            4. Global Average Pooling
+            5. Fully Connected Layer
+            6. Sigmoid activation (multi-label output)
+            """
+        )
+
+    with col2:
+        # Display an ASCII art diagram of the architecture
+        st.code("""
+        Input Image (224x224)
+            │
+            ▼
+        Convolution + Pooling
+            │
+            ▼
+        ┌─────────────────┐
+        │  Dense Block 1  │
+        │   (6 layers)    │
+        └─────────────────┘
+            │
+            ▼
+        Transition Layer 1
+            │
+            ▼
+        ┌─────────────────┐
+        │  Dense Block 2  │
+        │   (12 layers)   │
+        └─────────────────┘
+            │
+            ▼
+        Transition Layer 2
+            │
+            ▼
+        ┌─────────────────┐
+        │  Dense Block 3  │
+        │   (24 layers)   │
+        └─────────────────┘
+            │
+            ▼
+        Transition Layer 3
+            │
+            ▼
+        ┌─────────────────┐
+        │  Dense Block 4  │
+        │   (16 layers)   │
+        └─────────────────┘
+            │
+            ▼
+        Global Average Pooling
+            │
+            ▼
+        Fully Connected Layer
+            │
+            ▼
+        Sigmoid Activation
+            │
+            ▼
+        Disease Predictions
+        """)
+
+    # Add a load button
+    if st.button("Load DenseNet121 Model"):
+        with st.spinner("Loading DenseNet121..."):
+            if load_model_on_demand("DenseNet121"):
+                st.success("✅ DenseNet121 loaded successfully!")
+            else:
+                st.error("❌ Failed to load DenseNet121. Please try again.")
+
+def about_resnet_model_page():
+    st.title("🧠 About ResNet50 Model")
+
+    st.markdown(
+        """
+        ## ResNet50: Deep Residual Network for Medical Image Analysis
+
+        **ResNet50** is a deep convolutional neural network architecture that introduced residual learning
+        to solve the vanishing gradient problem in very deep networks. It allows training of much deeper
+        networks than was previously possible.
+
+        ### Key Innovation: Residual Learning
+
+        The core innovation in ResNet is the **residual block**:
+
+        - Each block learns the residual (difference) between input and output
+        - Identity shortcut connections allow gradients to flow directly through the network
+        - This enables training of very deep networks (50+ layers) without degradation
+
+        ### Model Architecture
+
+        ResNet50 consists of:
+
+        - Initial 7×7 convolution and pooling
+        - 50 layers organized into 4 stages with residual blocks
+        - Each stage doubles the number of filters and halves spatial dimensions
+        - Global average pooling and fully connected layer for classification
+
+        ### Implementation for Chest X-rays
+
+        This implementation uses:
+
+        - PyTorch's pre-trained ResNet50 (trained on ImageNet)
+        - Transfer learning by replacing the final fully connected layer
+        - Input resolution of 224×224 pixels
+        - Standard ImageNet normalization
+
+        ### Adaptation for Medical Imaging
+
+        For chest X-ray analysis:
+
+        - The final 1000-class ImageNet classifier is replaced with a new classifier for chest pathologies
+        - Early layers (which detect basic features) are preserved from ImageNet pre-training
+        - Later layers are fine-tuned to capture domain-specific features
+
+        ### Performance Characteristics
+
+        ResNet50 chest X-ray classifiers typically show:
+
+        - Strong performance on large pathologies (cardiomegaly, pleural effusion)
+        - Good ability to generalize across different X-ray datasets
+        - Computational efficiency compared to other models with similar performance
+
+        ### Research Citation
+
+        > K. He, X. Zhang, S. Ren and J. Sun, "Deep Residual Learning for Image Recognition," 2016 IEEE Conference on Computer Vision and Pattern Recognition (CVPR), Las Vegas, NV, 2016, pp. 770-778.
+        """
+    )
+
+    # Add visualization of the ResNet architecture
+    st.markdown("### ResNet50 Architecture")
+
+    col1, col2 = st.columns([1, 2])
+
+    with col1:
+        st.markdown(
+            """
+            **ResNet50 Structure:**
+
+            1. Input layer (224×224 image)
+            2. 7×7 Conv, 64 filters
+            3. Max Pooling
+            4. Stage 1: 3 residual blocks
+            5. Stage 2: 4 residual blocks
+            6. Stage 3: 6 residual blocks
+            7. Stage 4: 3 residual blocks
+            8. Global Average Pooling
+            9. Fully Connected Layer
+            10. Sigmoid activation
+            """
+        )
+
+    with col2:
+        # Display an ASCII art diagram of the architecture
+        st.code("""
+        Input Image (224x224)
+            │
+            ▼
+        7×7 Conv, 64 + Max Pool
+            │
+            ▼
+        ┌─────────────────┐
+        │    Stage 1      │
+        │  3 Res Blocks   │
+        └─────────────────┘
+            │
+            ▼
+        ┌─────────────────┐
+        │    Stage 2      │
+        │  4 Res Blocks   │
+        └─────────────────┘
+            │
+            ▼
+        ┌─────────────────┐
+        │    Stage 3      │
+        │  6 Res Blocks   │
+        └─────────────────┘
+            │
+            ▼
+        ┌─────────────────┐
+        │    Stage 4      │
+        │  3 Res Blocks   │
+        └─────────────────┘
+            │
+            ▼
+        Global Average Pooling
+            │
+            ▼
+        Fully Connected Layer
+            │
+            ▼
+        Sigmoid Activation
+            │
+            ▼
+        Disease Predictions
+        """)
+
+    # Visualization of a residual block
+    st.markdown("#### Residual Block Structure")
+    st.code("""
+         Input
+           │
+    ┌──────┴──────┐
+    │             │
+    ▼             │
+    Conv          │
+    │             │
+    ▼             │
+    BatchNorm     │
+    │             │
+    ▼             │
+    ReLU          │
+    │             │
+    ▼             │
+    Conv          │
+    │             │
+    ▼             │
+    BatchNorm     │
+    │             │
+    └──────┬──────┘
+           │
+           ▼
+         Add
+           │
+           ▼
+         ReLU
+           │
+           ▼
+        Output
+    """)
+
+    # Add a load button
+    if st.button("Load ResNet50 Model"):
+        with st.spinner("Loading ResNet50..."):
+            if load_model_on_demand("ResNet50"):
+                st.success("✅ ResNet50 loaded successfully!")
+            else:
+                st.error("❌ Failed to load ResNet50. Please try again.")
+
+def about_chexpert_model_page():
+    st.title("🧠 About CheXpert Model")
+
+    st.markdown(
+        """
+        ## CheXpert: Stanford's Chest X-ray Interpretation Model
+
+        **CheXpert** is a deep learning model for chest X-ray interpretation developed at Stanford University.
+        It was trained on the CheXpert dataset, one of the largest publicly available chest X-ray datasets.
+
+        ### The CheXpert Dataset
+
+        - 224,316 chest radiographs from 65,240 patients
+        - Collected from Stanford Hospital between 2002-2017
+        - Labels extracted from radiology reports using natural language processing
+        - 14 common chest radiographic observations including support devices
+
+        ### Model Design
+
+        The CheXpert model implemented here via TorchXRayVision:
+
+        - Uses a DenseNet121 backbone architecture
+        - Trained specifically on chest radiographs (not transferred from natural images)
+        - Handles the uncertainty in radiology reports with a specialized labeling policy
+        - Optimized for multi-label classification of 14 findings
+
+        ### Unique Training Approach
+
+        CheXpert uses an innovative approach to handle uncertain labels:
+
+        - Labels are extracted from reports as **positive**, **negative**, or **uncertain**
+        - Uncertain labels are treated with a special policy (either ignored, treated as negative, or treated as positive)
+        - This approach addresses the inherent uncertainty in radiological reports
+
+        ### Performance Benchmarks
+
+        In the original study, CheXpert achieved:
+
+        - Radiologist-level performance on 5 pathologies: atelectasis, cardiomegaly, consolidation, edema, and pleural effusion
+        - ROC-AUC > 0.90 for cardiomegaly and edema
+        - ROC-AUC > 0.85 for pleural effusion and consolidation
+
+        ### Integration Details
+
+        This implementation uses:
+
+        - Pre-trained weights from TorchXRayVision library
+        - DenseNet121 architecture with 224×224 resolution
+        - Standard chest X-ray preprocessing with normalization
+        - No further fine-tuning required
+
+        ### Research Citation
+
+        > Irvin, J., Rajpurkar, P., Ko, M., Yu, Y., Ciurea-Ilcus, S., Chute, C., Marklund, H., Haghgoo, B., Ball, R., Shpanskaya, K., Seekins, J., Mong, D.A., Halabi, S.S., Sandberg, J.K., Jones, R., Larson, D.B., Langlotz, C.P., Patel, B.N., Lungren, M.P., & Ng, A.Y. (2019). CheXpert: A Large Chest Radiograph Dataset with Uncertainty Labels and Expert Comparison. Proceedings of the AAAI Conference on Artificial Intelligence, 33, 590-597.
+        """
+    )
+
+    # Display information about pathologies
+    st.markdown("### Pathologies Detected")
+
+    pathologies = XRV_PATHOLOGIES
+
+    # Create a more visual display of pathologies
+    num_columns = 3
+    col_list = st.columns(num_columns)
+
+    for i, pathology in enumerate(pathologies):
+        col_index = i % num_columns
+        with col_list[col_index]:
+            st.markdown(f"✓ **{pathology}**")
+
+    # Add a load button
+    if st.button("Load CheXpert Model"):
+        with st.spinner("Loading CheXpert..."):
+            if load_model_on_demand("CheXpert"):
+                st.success("✅ CheXpert model loaded successfully!")
+            else:
+                st.error("❌ Failed to load CheXpert model. Please try again.")
+
+def about_mimic_model_page():
+    st.title("🧠 About MIMIC-CXR Model")
+
+    st.markdown(
+        """
+        ## MIMIC-CXR: MIT's Chest X-ray Model for Diverse Populations
+
+        **MIMIC-CXR** is a deep learning model trained on the MIMIC-CXR dataset, a large publicly available
+        dataset of chest X-rays from the Beth Israel Deaconess Medical Center in Boston, collected from 2011-2016.
+
+        ### The MIMIC-CXR Dataset
+
+        - Over 377,000 chest X-rays from more than 65,000 patients
+        - Demographically diverse patient population from urban hospital setting
+        - Free-text radiology reports with structured labels
+        - Developed by MIT Lab for Computational Physiology
+
+        ### Model Architecture
+
+        The MIMIC-CXR model implemented via TorchXRayVision:
+
+        - DenseNet121 backbone architecture
+        - Native training on chest X-rays (not transferred from natural images)
+        - 224×224 pixel input resolution
+        - Multi-label classification across 14 common findings
+
+        ### Training Process and Optimization
+
+        - Labels extracted via the CheXpert labeler for consistency
+        - Trained using a weighted binary cross-entropy loss
+        - Optimization via Adam optimizer with learning rate scheduling
+        - Data augmentation to improve generalization
+
+        ### Clinical Relevance
+
+        MIMIC-CXR is particularly valuable for:
+
+        - Applications requiring good performance across diverse demographics
+        - Clinical settings similar to urban hospital environments
+        - Research on algorithmic fairness in medical AI
+        - Longitudinal patient studies (dataset includes multiple studies per patient)
+
+        ### Model Advantages
+
+        - Strong performance across diverse patient demographics
+        - Good generalization to external datasets
+        - Public availability through TorchXRayVision
+        - Consistent labeling with CheXpert for comparability
+
+        ### Research Citation
+
+        > Johnson, A., Pollard, T., Mark, R., Berkowitz, S., & Horng, S. (2019). MIMIC-CXR Database (version 2.0.0). PhysioNet. https://doi.org/10.13026/C2JT1Q.
+
+        > Johnson, A.E.W., Pollard, T.J., Berkowitz, S.J. et al. MIMIC-CXR, a de-identified publicly available database of chest radiographs with free-text reports. Sci Data 6, 317 (2019). https://doi.org/10.1038/s41597-019-0322-0
+        """
+    )
+
+    # Display information about pathologies
+    st.markdown("### Pathologies Detected")
+
+    pathologies = XRV_PATHOLOGIES
+
+    # Create a more visual display of pathologies
+    num_columns = 3
+    col_list = st.columns(num_columns)
+
+    for i, pathology in enumerate(pathologies):
+        col_index = i % num_columns
+        with col_list[col_index]:
+            st.markdown(f"✓ **{pathology}**")
+
+    # Add a load button
+    if st.button("Load MIMIC-CXR Model"):
+        with st.spinner("Loading MIMIC-CXR..."):
+            if load_model_on_demand("MIMIC-CXR"):
+                st.success("✅ MIMIC-CXR model loaded successfully!")
+            else:
+                st.error("❌ Failed to load MIMIC-CXR model. Please try again.")
+
+def importance_gender_bias_page():
+    st.title("📚 The Importance of Gender Bias")
+
+    st.markdown(
+        """
+        ## Why Addressing Gender Bias in Medical AI Matters
+
+        Gender bias in AI systems used for medical diagnosis can have significant real-world impacts on patient care and outcomes.
+
+        ### Ethical Imperatives
+
+        - **Fairness and Justice**: Healthcare systems should provide equal quality of care to all patients regardless of gender
+        - **Non-maleficence**: AI systems should not cause harm by systematically misdiagnosing particular demographic groups
+        - **Transparency**: Users of AI systems should understand potential biases and limitations
+
+        ### Clinical Impact
+
+        - **Diagnostic Disparities**: Biased models may miss diseases that present differently across genders
+        - **Treatment Delays**: False negatives can lead to delayed treatment for vulnerable populations
+        - **Resource Allocation**: Biased prioritization can affect access to limited healthcare resources
+
+        ### Regulatory Requirements
+
+        - **FDA Guidance**: Emerging regulations on AI in healthcare require fairness considerations
+        - **Legal Liability**: Healthcare institutions may face liability for deploying biased systems
+        - **Equal Treatment Mandates**: Many jurisdictions legally require equitable healthcare provision
+        """
+    )
+
+    st.markdown("### Key Research on Gender Bias in AI Healthcare")
+
+    research = [
+        {
+            "title": "A survey on bias and fairness in machine learning",
+            "authors": "Mehrabi et al. (2021)",
+            "findings": "Comprehensive review of various types of biases that can affect ML systems, including those in healthcare"
+        },
+        {
+            "title": "Dissecting racial bias in an algorithm used to manage the health of populations",
+            "authors": "Obermeyer et al. (2019)",
+            "findings": "Found that a widely used algorithm exhibited significant racial bias, underestimating the needs of Black patients"
+        },
+        {
+            "title": "Gender imbalance in medical imaging datasets produces biased classifiers for computer-aided diagnosis",
+            "authors": "Larrazabal et al. (2020)",
+            "findings": "Demonstrated that gender imbalances in training data lead to significant performance disparities by gender"
+        }
+    ]
+
+    for i, paper in enumerate(research):
+        with st.expander(f"{i+1}. {paper['title']} ({paper['authors']})"):
+            st.markdown(f"**Key Findings:** {paper['findings']}")
+
+    st.markdown("### Mitigation Strategies")
+
+    st.markdown(
+        """
+        Several approaches can help address gender bias in medical AI:
+
+        1. **Data Representation**: Ensure diverse and balanced training datasets
+        2. **Algorithmic Techniques**: Apply technical bias mitigation methods (as demonstrated in this app)
+        3. **Evaluation Protocols**: Test models across demographic subgroups before deployment
+        4. **Continuous Monitoring**: Track performance disparities in real-world usage
+        5. **Stakeholder Inclusion**: Involve diverse clinicians and patients in development
+        """
+    )
+
+def project_overview_page():
+    st.title("📈 Project Overview")
+
+    st.markdown(
+        """
+        ## Project Objective
+
+        This application is designed to help healthcare organizations and AI developers detect and mitigate gender bias in chest X-ray interpretation models. Our goal is to ensure that AI tools in radiology deliver equitable performance across all patient demographics.
+
+        ### Key Features
+
+        1. **Data Exploration**: Upload and analyze medical imaging datasets
+        2. **Multiple AI Models**: Compare performance across state-of-the-art chest X-ray models
+        3. **Bias Detection**: Quantify gender disparities in model predictions
+        4. **Mitigation Techniques**: Apply and evaluate various bias mitigation approaches
+        5. **Explainable Analysis**: Understand the patterns behind model errors and bias
+
+        ### Impact
+
+        - **Clinical Safety**: Reduce misdiagnosis risks for underrepresented groups
+        - **Regulatory Compliance**: Meet emerging requirements for AI fairness
+        - **Improved Accessibility**: Make advanced AI diagnostics safe for all patients
+        """
+    )
+
+    st.markdown("### Project Workflow")
+
+    workflow_steps = [
+        "Upload and analyze dataset",
+        "Explore data characteristics and demographics",
+        "Select and run AI models for disease prediction",
+        "Analyze gender bias in model predictions",
+        "Apply bias mitigation techniques",
+        "Test and validate mitigation effectiveness"
+    ]
+
+    for i, step in enumerate(workflow_steps):
+        st.markdown(f"**Step {i+1}:** {step}")
+
+def meet_the_team_page():
+    st.title("👥 Meet the Team")
+
+    team_members = [
+        {"name": "Yuying", "role": "Data Scientist", "image": "Yuying.webp"},
+        {"name": "Siwen", "role": "ML Engineer", "image": "Siwen.webp"},
+        {"name": "Zhi", "role": "Research Analyst", "image": "Zhi.webp"},
+        {"name": "Maude", "role": "UX Designer", "image": "Maude.webp"}
+    ]
+
+    # Create a tab for each team member
+    tabs = st.tabs([member["name"] for member in team_members])
+
+    for tab, member in zip(tabs, team_members):
+        with tab:
+            # Try to display image if available
+            try:
+                if os.path.exists(member["image"]):
+                    st.image(member["image"], width=150)
+                else:
+                    st.error(f"Image not found: {member['image']}")
+            except:
+                st.info(f"Image not available for {member['name']}")
+
+            st.write(f"**{member['name']}**")
+            st.write(f"*{member['role']}*")
+
+def performance_page():
+    """Span latencies and memory use of this server process (hidden page, open with ?page=performance)"""
+    st.title("⏱️ Performance")
+    st.write("Latency of instrumented hot paths in this server process. Percentiles cover the most "
+             f"recent {REGISTRY.capacity} calls of each span; counts and totals cover all calls.")
+
+    summary = REGISTRY.summary()
+    if not summary:
+        st.info("No spans recorded yet. Use the other pages and come back.")
+    else:
+        latency_section(summary)
+
+    memory_section()
+
+def latency_section(summary):
+    """Span percentile table, chart and exports"""
+    st.markdown("## Latency")
+    table = pd.DataFrame(summary).T
+    table.index.name = "Span"
+    ms_columns = ["mean_s", "p50_s", "p95_s", "p99_s", "max_s", "total_s"]
+    table[ms_columns] = table[ms_columns] * 1000
+    table = table.rename(columns={name: name.replace("_s", " (ms)") for name in ms_columns})
+    table["count"] = table["count"].astype(int)
+    st.dataframe(table.style.format("{:.1f}", subset=[c for c in table.columns if c != "count"]),
+                 use_container_width=True)
+    st.bar_chart(table[["p50 (ms)", "p95 (ms)", "p99 (ms)"]])
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button("Download JSON", REGISTRY.to_json(), file_name="spans.json", mime="application/json")
+    with col2:
+        st.download_button("Download Prometheus text", REGISTRY.to_prometheus(), file_name="spans.prom",
+                           mime="text/plain")
+    with col3:
+        if st.button("Reset Measurements"):
+            REGISTRY.reset()
+            st.rerun()
+
+    if os.environ.get("METRICS_PORT"):
+        st.caption(f"Also served at http://127.0.0.1:{os.environ['METRICS_PORT']}/metrics and /metrics.json")
+
+def memory_section():
+    """Memory held by this session and the others, allocation tracing and manual eviction"""
+    st.markdown("## Memory")
+    rss = memory_accounting.process_rss_bytes()
+    footprint = memory_accounting.session_footprint(st.session_state)
+    session_total = int(footprint["bytes"].sum())
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Process RSS", memory_accounting.format_bytes(rss) if rss is not None else "n/a")
+    col2.metric("This Session", memory_accounting.format_bytes(session_total))
+    col3.metric("Open pyplot Figures (all sessions)", len(memory_accounting.open_figures()))
+    st.caption(f"Caches are evicted above {memory_accounting.format_bytes(memory_accounting.SOFT_LIMIT_BYTES)} "
+               f"per session and models are unloaded above "
+               f"{memory_accounting.format_bytes(memory_accounting.HARD_LIMIT_BYTES)} "
+               "(SESSION_MEMORY_SOFT_MB / SESSION_MEMORY_HARD_MB).")
+
+    st.markdown("### This Session")
+    by_category = pd.Series(memory_accounting.category_totals(footprint), name="bytes")
+    st.bar_chart(by_category / 2**20)
+    table = footprint[footprint["bytes"] > 0].copy()
+    table["size"] = table["bytes"].map(memory_accounting.format_bytes)
+    st.dataframe(table[["key", "category", "size"]], use_container_width=True, hide_index=True)
+
+    if st.button("Evict Caches in This Session"):
+        steps = memory_accounting.evict_caches(st.session_state, 0, session_total)
+        freed = sum(nbytes for _, nbytes in steps)
+        st.success(f"Freed {memory_accounting.format_bytes(freed)}: "
+                   f"{', '.join(key for key, _ in steps) or 'nothing to evict'}")
+
+    st.markdown("### All Sessions")
+    sessions = memory_accounting.SESSIONS.frame()
+    if sessions.empty:
+        st.info("No session has reported its memory yet.")
+    else:
+        byte_columns = memory_accounting.CATEGORIES + ["total"]
+        sessions[byte_columns] = sessions[byte_columns].map(memory_accounting.format_bytes)
+        st.dataframe(sessions, use_container_width=True, hide_index=True)
+
+    st.markdown("### Tensors and Allocations")
+    if st.button("Count Live Tensors"):
+        count, nbytes = memory_accounting.live_tensor_bytes()
+        st.write(f"{count} live torch tensors holding {memory_accounting.format_bytes(nbytes)}")
+
+    profiler = memory_accounting.PROFILER
+    tracing = st.checkbox("Trace Python allocations (tracemalloc)", value=profiler.active,
+                          help="Slows the whole server down while enabled")
+    if tracing and not profiler.active:
+        profiler.start()
+    elif not tracing and profiler.active:
+        profiler.stop()
+
+    if profiler.active:
+        current, peak = profiler.traced()
+        st.write(f"Traced: {memory_accounting.format_bytes(current)} now, "
+                 f"{memory_accounting.format_bytes(peak)} peak")
+        top = profiler.top()
+        top["size"] = top["bytes"].map(memory_accounting.format_bytes)
+        top["growth"] = top["bytes_diff"].map(memory_accounting.format_bytes)
+        st.dataframe(top[["location", "size", "blocks", "growth"]], use_container_width=True, hide_index=True)
+        st.caption("Growth is relative to the previous refresh of this table.")